@@ -5,6 +5,7 @@ import sys
 import os
 from datetime import datetime
 from fnmatch import fnmatch
+from collections import Counter
 
 # استيراد الدوال المشتركة
 from common_functions import *
@@ -20,8 +21,7 @@ def search_domain_across_servers(domain, servers):
         print(f"🖥️  Checking Server {server_name} ({server['ip']})...")
         
         if test_server_connection(server):
-            accounts = list_accounts(server)
-            for acct in accounts:
+            for acct in find_accounts(server, domain=domain, fields=ACCOUNT_SUMMARY_FIELDS + ("email",)):
                 if acct["domain"].lower() == domain.lower():
                     print(f"✅ Domain found on Server {server_name}!")
                     print(f"📋 Account Details:")
@@ -56,7 +56,7 @@ def list_all_domains(servers):
         
         if test_server_connection(server):
             online_servers += 1
-            accounts = list_accounts(server)
+            accounts = list_accounts(server, fields=ACCOUNT_SUMMARY_FIELDS + ("email",))
             server_accounts = len(accounts)
             total_accounts += server_accounts
             
@@ -68,15 +68,16 @@ def list_all_domains(servers):
                 for acct in accounts:
                     status = "🔴 Suspended" if acct.get('suspended', 0) == 1 else "🟢 Active"
                     print(f"      {acct['domain']} ({acct['user']}) - {status}")
-                    all_domains.append({
-                        'domain': acct['domain'],
-                        'user': acct['user'],
-                        'server': server_name,
-                        'status': status,
-                        'email': acct.get('email', 'N/A'),
-                        'package': acct.get('plan', 'N/A'),
-                        'creation_date': datetime.fromtimestamp(int(acct.get('unix_startdate', 0))).strftime('%Y-%m-%d')
-                    })
+                    # صف التصدير مباشرة كـ tuple بدلاً من dict لكل دومين
+                    all_domains.append((
+                        acct['domain'],
+                        acct['user'],
+                        server_name,
+                        status,
+                        acct.get('email', 'N/A'),
+                        acct.get('plan', 'N/A'),
+                        datetime.fromtimestamp(int(acct.get('unix_startdate', 0))).strftime('%Y-%m-%d')
+                    ))
         else:
             print(f"   Status: 🔴 Offline")
     
@@ -90,19 +91,8 @@ def list_all_domains(servers):
         export_format = input("Export format (1=Excel, 2=CSV, 3=Both): ").strip()
         
         headers = ["Domain", "cPanel User", "Server", "Status", "Email", "Package", "Creation Date", "Export Date"]
-        data_rows = []
-        
-        for domain in all_domains:
-            data_rows.append([
-                domain['domain'],
-                domain['user'],
-                domain['server'],
-                domain['status'],
-                domain['email'],
-                domain['package'],
-                domain['creation_date'],
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            ])
+        export_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        data_rows = [list(row) + [export_date] for row in all_domains]
         
         if export_format in ["1", "3"]:
             export_to_excel(data_rows, headers, "all_domains", "All Domains")
@@ -114,66 +104,54 @@ def advanced_domain_search(servers, pattern=None, date_range=None, min_disk_usag
     print("\n🔍 Searching domains with specified criteria...")
     found_domains = []
     
-    for server_name, server in servers.items():
-        if test_server_connection(server):
-            print(f"Checking Server {server_name}...")
-            accounts = list_accounts(server)
-            
-            for account in accounts:
-                match = True
-                
-                # فحص نمط الدومين (يدعم substring + wildcard)
-                if pattern:
-                    domain = account['domain'].lower()
-                    pat = pattern.lower()
-                    if not (pat in domain or fnmatch(domain, pat)):
-                        match = False
-                
-                # فحص نطاق التاريخ
-                if date_range and match:
-                    try:
-                        start_date, end_date = date_range.split(',')
-                        start_date = datetime.strptime(start_date.strip(), '%Y-%m-%d')
-                        end_date = datetime.strptime(end_date.strip(), '%Y-%m-%d')
-                        account_date = datetime.fromtimestamp(int(account.get('unix_startdate', 0)))
-                        if not (start_date <= account_date <= end_date):
-                            match = False
-                    except:
-                        match = False
-                
-                # فحص استخدام القرص
-                if min_disk_usage and match:
-                    try:
-                        if float(account.get('diskused', 0)) < float(min_disk_usage):
-                            match = False
-                    except:
-                        match = False
-                
-                # فحص الباقة
-                if package and match:
-                    if account.get('plan', '').lower() != package.lower():
-                        match = False
-                
-                # فحص الحالة
-                if status and match:
-                    is_suspended = account.get('suspended', 0) == 1
-                    if status.lower() == 'active' and is_suspended:
-                        match = False
-                    elif status.lower() == 'suspended' and not is_suspended:
-                        match = False
-                
-                # لو كل الشروط متحققة
-                if match:
-                    found_domains.append({
-                        'domain': account['domain'],
-                        'server': server_name,
-                        'status': '🔴 Suspended' if account.get('suspended', 0) == 1 else '🟢 Active',
-                        'user': account['user'],
-                        'email': account.get('email', 'N/A'),
-                        'package': account.get('plan', 'N/A'),
-                        'disk_used': account.get('diskused', 'N/A'),
-                        'creation_date': datetime.fromtimestamp(int(account.get('unix_startdate', 0))).strftime('%Y-%m-%d')
-                    })
+    # جدول الحسابات العمودي: الأنواع محولة مرة واحدة والفلترة على كل الصفوف معاً
+    table, online = get_account_table(servers)
+    print(f"📋 Filtering {table['size']} accounts from {len(online)} server(s)...")
+    
+    date_from = date_to = None
+    if date_range:
+        try:
+            start_date, end_date = date_range.split(',')
+            date_from = datetime.strptime(start_date.strip(), '%Y-%m-%d')
+            date_to = datetime.strptime(end_date.strip(), '%Y-%m-%d')
+        except ValueError:
+            print("❌ Invalid date range format (expected YYYY-MM-DD,YYYY-MM-DD)")
+            return found_domains
+    
+    if min_disk_usage:
+        try:
+            min_disk_usage = float(min_disk_usage)
+        except ValueError:
+            print("❌ Invalid disk usage value")
+            return found_domains
+    
+    suspended = None
+    if status and status.lower() in ("active", "suspended"):
+        suspended = status.lower() == "suspended"
+    
+    mask = filter_account_table(table, date_from=date_from, date_to=date_to,
+                                min_disk_mb=min_disk_usage or None, plan=package, suspended=suspended)
+    
+    # نمط الدومين يُحل من فهرس trigram: الحسابات المطابقة لكل سيرفر
+    matched_accounts = None
+    if pattern:
+        matched_accounts = {(entry['server'], entry['user']) for entry in search_domain_index(servers, pattern)
+                            if entry['type'] == 'main'}
+    
+    for index in table_indices(mask):
+        account = account_table_row(table, index)
+        if matched_accounts is not None and (account['server'], account['user']) not in matched_accounts:
+            continue
+        found_domains.append({
+            'domain': account['domain'],
+            'server': account['server'],
+            'status': '🔴 Suspended' if account['suspended'] else '🟢 Active',
+            'user': account['user'],
+            'email': account['email'] or 'N/A',
+            'package': account['plan'] or 'N/A',
+            'disk_used': f"{account['diskused']:g}M",
+            'creation_date': datetime.fromtimestamp(account['unix_startdate']).strftime('%Y-%m-%d')
+        })
     
     return found_domains
 
@@ -582,41 +560,39 @@ def domain_statistics_report(servers):
     print("\n📊 Domain Statistics Report")
     print("=" * 50)
     
-    total_domains = 0
-    total_active = 0
-    total_suspended = 0
+    # group by على جدول الحسابات العمودي بدلاً من المرور على كل حساب
+    table, online = get_account_table(servers)
+    failed = get_account_table_failures(servers)
+    status_counts = count_account_table(table, ("server", "suspended"))
+    package_stats = count_account_table(table, "plan")
+    
+    total_domains = table["size"]
+    total_suspended = sum(count for (_, is_suspended), count in status_counts.items() if is_suspended)
+    total_active = total_domains - total_suspended
     server_stats = {}
-    package_stats = {}
     
     for server_name, server in servers.items():
         print(f"🖥️  Checking Server {server_name}...")
         
-        if test_server_connection(server):
-            accounts = list_accounts(server)
-            server_domains = len(accounts)
-            total_domains += server_domains
-            
-            active_count = sum(1 for acct in accounts if acct.get('suspended', 0) == 0)
-            suspended_count = server_domains - active_count
-            
-            total_active += active_count
-            total_suspended += suspended_count
-            
+        if server_name in online:
+            active_count = status_counts.get((server_name, False), 0)
+            suspended_count = status_counts.get((server_name, True), 0)
             server_stats[server_name] = {
-                'total': server_domains,
+                'total': active_count + suspended_count,
                 'active': active_count,
                 'suspended': suspended_count,
                 'ip': server['ip']
             }
-            
-            # إحصائيات الباقات
-            for acct in accounts:
-                package = acct.get('plan', 'Unknown')
-                if package not in package_stats:
-                    package_stats[package] = 0
-                package_stats[package] += 1
-            
-            print(f"   ✅ {server_domains} domains ({active_count} active, {suspended_count} suspended)")
+            print(f"   ✅ {active_count + suspended_count} domains ({active_count} active, {suspended_count} suspended)")
+        elif server_name in failed:
+            print(f"   ❌ Could not load accounts: {failed[server_name]}")
+            server_stats[server_name] = {
+                'total': 0,
+                'active': 0,
+                'suspended': 0,
+                'ip': server['ip'],
+                'error': failed[server_name]
+            }
         else:
             print(f"   🔴 Server offline")
             server_stats[server_name] = {
@@ -633,12 +609,16 @@ def domain_statistics_report(servers):
     print(f"Total Domains: {total_domains}")
     print(f"Active Domains: {total_active} ({(total_active/total_domains)*100:.1f}%)" if total_domains > 0 else "Active Domains: 0")
     print(f"Suspended Domains: {total_suspended} ({(total_suspended/total_domains)*100:.1f}%)" if total_domains > 0 else "Suspended Domains: 0")
+    if failed:
+        print(f"⚠️  Totals exclude {len(failed)} server(s) that failed to load: {', '.join(failed)}")
     
     print(f"\n🖥️  Server Breakdown:")
     print("-" * 60)
     for server_name, stats in server_stats.items():
         if stats.get('offline'):
             print(f"{server_name} ({stats['ip']}): 🔴 OFFLINE")
+        elif stats.get('error'):
+            print(f"{server_name} ({stats['ip']}): ❌ ERROR - {stats['error']}")
         else:
             percentage = (stats['total']/total_domains)*100 if total_domains > 0 else 0
             print(f"{server_name} ({stats['ip']}): {stats['total']} domains ({percentage:.1f}%)")
@@ -649,7 +629,7 @@ def domain_statistics_report(servers):
     sorted_packages = sorted(package_stats.items(), key=lambda x: x[1], reverse=True)
     for package, count in sorted_packages:
         percentage = (count/total_domains)*100 if total_domains > 0 else 0
-        print(f"{package}: {count} domains ({percentage:.1f}%)")
+        print(f"{package or 'Unknown'}: {count} domains ({percentage:.1f}%)")
 
 # === دوال إدارة SSH ===
 def manage_ssh_menu(domain, servers):
@@ -1197,7 +1177,7 @@ def get_available_php_versions(server):
     """الحصول على النسخ المتاحة من PHP"""
     try:
         # محاولة الحصول على النسخ المتاحة
-        result = whm_api_call(server, "php_get_system_versions")
+        result = whm_api_call_capable(server, "php_get_system_versions")
         
         if "error" not in result and "versions" in result:
             return result["versions"]
@@ -1227,105 +1207,58 @@ def change_php_version_for_account(server, cpanel_user, php_version):
 
 def find_account_by_domain(domain, servers):
     """البحث عن حساب بواسطة الدومين مع اختيار السيرفر"""
-    found_servers = []
-    
-    # البحث في جميع السيرفرات المتصلة
-    for server_name, server in servers.items():
-        if test_server_connection(server):
-            try:
-                accounts = list_accounts(server)
-                for acct in accounts:
-                    if acct["domain"].lower() == domain.lower():
-                        found_servers.append({
-                            'server': server,
-                            'server_name': server_name,
-                            'user': acct['user'],
-                            'domain': acct['domain'],
-                            'status': 'online'
-                        })
-            except Exception as e:
-                # إذا فشل في جلب الحسابات، السيرفر مش شغال
-                found_servers.append({
-                    'server': server,
-                    'server_name': server_name,
-                    'user': acct['user'] if 'acct' in locals() else 'Unknown',
-                    'domain': domain,
-                    'status': 'error',
-                    'error': str(e)
-                })
+    # البحث في فهرس الجلسة (listaccts واحد لكل سيرفر لكل الجلسة)
+    found_servers = lookup_account_domain(domain, servers)
     
     if not found_servers:
+        # الدومين قد يكون على سيرفر فشل تحميل حساباته
+        failed = get_account_domain_index_failures(servers)
+        if failed:
+            print(f"⚠️  Domain not found, but {len(failed)} server(s) could not be searched:")
+            for name, error in failed.items():
+                print(f"   Server {name} ({servers[name]['ip']}): {error}")
         return None
     
+    def _selected(server_info):
+        return {
+            'server': server_info['server'],
+            'server_name': server_info['server_name'],
+            'user': server_info['user'],
+            'domain': server_info['domain']
+        }
+    
     # إذا وجد سيرفر واحد فقط
     if len(found_servers) == 1:
-        server_info = found_servers[0]
-        if server_info["status"] == "online":
-            return {
-                'server': server_info['server'],
-                'server_name': server_info['server_name'],
-                'user': server_info['user'],
-                'domain': server_info['domain']
-            }
-        else:
-            print(f"⚠️  Domain found on Server {server_info['server_name']} but server has issues: {server_info.get('error', 'Unknown error')}")
-            return None
+        return _selected(found_servers[0])
     
     # إذا وجد أكثر من سيرفر، اعرض خيارات للمستخدم
-    online_servers = [s for s in found_servers if s["status"] == "online"]
-    if online_servers:
-        if len(online_servers) > 1:
-            print(f"🔍 Domain found on multiple servers:")
-            for i, s in enumerate(online_servers, 1):
-                print(f"   {i}. Server {s['server_name']} ({s['server']['ip']}) - {s['status']}")
-            
-            # عرض السيرفر المختار تلقائياً
-            best_server = max(online_servers, key=lambda x: int(x["server_name"]) if x["server_name"].isdigit() else 0)
-            best_index = next(i for i, s in enumerate(online_servers, 1) if s["server_name"] == best_server["server_name"])
-            print(f"✅ Auto-selected: Server {best_server['server_name']} (option {best_index})")
-            
-            # إعطاء خيار للمستخدم
-            while True:
-                choice = input(f"\n🌐 Choose server (1-{len(online_servers)}) or press Enter for auto-selected: ").strip()
-                
-                if not choice:  # إذا ضغط Enter، استخدم السيرفر المختار تلقائياً
-                    print(f"✅ Using auto-selected Server {best_server['server_name']}")
-                    return {
-                        'server': best_server['server'],
-                        'server_name': best_server['server_name'],
-                        'user': best_server['user'],
-                        'domain': best_server['domain']
-                    }
-                
-                try:
-                    choice_num = int(choice)
-                    if 1 <= choice_num <= len(online_servers):
-                        selected_server = online_servers[choice_num - 1]
-                        print(f"✅ Selected Server {selected_server['server_name']} manually")
-                        return {
-                            'server': selected_server['server'],
-                            'server_name': selected_server['server_name'],
-                            'user': selected_server['user'],
-                            'domain': selected_server['domain']
-                        }
-                    else:
-                        print(f"❌ Invalid choice. Please enter 1-{len(online_servers)}")
-                except ValueError:
-                    print("❌ Invalid input. Please enter a number or press Enter for auto-selection")
+    print(f"🔍 Domain found on multiple servers:")
+    for i, s in enumerate(found_servers, 1):
+        print(f"   {i}. Server {s['server_name']} ({s['server']['ip']}) - online")
+    
+    # عرض السيرفر المختار تلقائياً
+    best_server = _preferred_server_entry(found_servers)
+    best_index = next(i for i, s in enumerate(found_servers, 1) if s["server_name"] == best_server["server_name"])
+    print(f"✅ Auto-selected: Server {best_server['server_name']} (option {best_index})")
+    
+    # إعطاء خيار للمستخدم
+    while True:
+        choice = input(f"\n🌐 Choose server (1-{len(found_servers)}) or press Enter for auto-selected: ").strip()
         
-        # إذا كان هناك سيرفر واحد فقط، استخدمه
-        return {
-            'server': online_servers[0]['server'],
-            'server_name': online_servers[0]['server_name'],
-            'user': online_servers[0]['user'],
-            'domain': online_servers[0]['domain']
-        }
-    else:
-        # جميع السيرفرات لديها مشاكل
-        print(f"⚠️  Domain found on {len(found_servers)} servers but all have issues:")
-        for s in found_servers:
-            print(f"   Server {s['server_name']} ({s['server']['ip']}): {s.get('error', 'Unknown error')}")
-        return None
+        if not choice:  # إذا ضغط Enter، استخدم السيرفر المختار تلقائياً
+            print(f"✅ Using auto-selected Server {best_server['server_name']}")
+            return _selected(best_server)
+        
+        try:
+            choice_num = int(choice)
+            if 1 <= choice_num <= len(found_servers):
+                selected_server = found_servers[choice_num - 1]
+                print(f"✅ Selected Server {selected_server['server_name']} manually")
+                return _selected(selected_server)
+            else:
+                print(f"❌ Invalid choice. Please enter 1-{len(found_servers)}")
+        except ValueError:
+            print("❌ Invalid input. Please enter a number or press Enter for auto-selection")
 
 # === دوال إدارة الأكونتات المتعددة ===
 def bulk_ssh_management_menu(servers):
@@ -1561,92 +1494,20 @@ def debug_check_single_account_ssh(servers):
 
 def enable_ssh_all_accounts_server(server, server_name):
     """تفعيل SSH لجميع الحسابات على سيرفر محدد"""
-    print(f"\n🔓 Enable SSH for All Accounts on Server {server_name}")
-    print("=" * 70)
-    
-    # الحصول على جميع الحسابات
-    accounts = list_accounts(server)
-    if not accounts:
-        print(f"❌ No accounts found on Server {server_name}")
-        return
-    
-    print(f"📋 Found {len(accounts)} accounts on Server {server_name}")
-    
-    # تأكيد العملية
-    confirm = input(f"\n⚠️  Enable SSH for ALL {len(accounts)} accounts on Server {server_name}? (y/N): ").strip().lower()
-    if confirm != 'y':
-        print("❌ Operation cancelled")
-        return
-    
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
-    
-    print(f"\n🔄 Processing {len(accounts)} accounts...")
-    print("-" * 70)
-    
-    for i, account in enumerate(accounts, 1):
-        print(f"[{i}/{len(accounts)}] Processing {account['domain']} ({account['user']})...")
-        
-        try:
-            result = whm_api_call(server, "modifyacct", {
-                "user": account['user'],
-                "HASSHELL": 1
-            })
-            
-            # فحص النجاح
-            success = False
-            error_msg = "Unknown error"
-            
-            if isinstance(result, dict):
-                metadata = result.get("metadata")
-                if metadata and metadata.get("result") == 1:
-                    success = True
-                    error_msg = metadata.get("reason", "SSH enabled successfully")
-                elif metadata:
-                    error_msg = metadata.get("reason", "Operation failed")
-                elif "cpanelresult" in result:
-                    cpanel_result = result["cpanelresult"]
-                    if cpanel_result.get("event", {}).get("result") == 1:
-                        success = True
-                        error_msg = "SSH enabled successfully"
-                    else:
-                        error_msg = cpanel_result.get("event", {}).get("reason", "Operation failed")
-                elif "error" in result:
-                    error_msg = result["error"]
-            
-            if success:
-                print(f"   ✅ SSH enabled for {account['domain']}")
-                success_count += 1
-                results.append({"domain": account['domain'], "user": account['user'], "status": "Success"})
-            else:
-                print(f"   ❌ Failed to enable SSH: {error_msg}")
-                failed_count += 1
-                results.append({"domain": account['domain'], "user": account['user'], "status": "Failed", "error": error_msg})
-                
-        except Exception as e:
-            print(f"   ❌ Error enabling SSH: {str(e)}")
-            failed_count += 1
-            results.append({"domain": account['domain'], "user": account['user'], "status": "Error", "error": str(e)})
-    
-    # عرض النتائج
-    print(f"\n📊 SSH Enable Results for Server {server_name}:")
-    print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
-    print(f"   📋 Total: {len(accounts)}")
-    
-    # تصدير النتائج
-    if results and confirm_action("\nExport results to file?"):
-        export_bulk_results(results, f"ssh_enable_all_{server_name}")
+    _set_ssh_all_accounts_server(server, server_name, enable=True)
 
 def disable_ssh_all_accounts_server(server, server_name):
     """إلغاء SSH لجميع الحسابات على سيرفر محدد"""
-    print(f"\n🔒 Disable SSH for All Accounts on Server {server_name}")
+    _set_ssh_all_accounts_server(server, server_name, enable=False)
+
+def _set_ssh_all_accounts_server(server, server_name, enable):
+    """تفعيل أو إلغاء SSH لجميع الحسابات على سيرفر محدد عبر منفذ العمليات الجماعية"""
+    action_name = "enable" if enable else "disable"
+    print(f"\n{'🔓' if enable else '🔒'} {action_name.title()} SSH for All Accounts on Server {server_name}")
     print("=" * 70)
     
     # الحصول على جميع الحسابات
-    accounts = list_accounts(server)
+    accounts = list_accounts(server, fields=("user", "domain"))
     if not accounts:
         print(f"❌ No accounts found on Server {server_name}")
         return
@@ -1654,72 +1515,28 @@ def disable_ssh_all_accounts_server(server, server_name):
     print(f"📋 Found {len(accounts)} accounts on Server {server_name}")
     
     # تأكيد العملية
-    confirm = input(f"\n⚠️  Disable SSH for ALL {len(accounts)} accounts on Server {server_name}? (y/N): ").strip().lower()
+    confirm = input(f"\n⚠️  {action_name.title()} SSH for ALL {len(accounts)} accounts on Server {server_name}? (y/N): ").strip().lower()
     if confirm != 'y':
         print("❌ Operation cancelled")
         return
     
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
+    targets = [{"domain": account['domain'], "user": account['user'], "server": server, "server_name": server_name}
+               for account in accounts]
     
     print(f"\n🔄 Processing {len(accounts)} accounts...")
     print("-" * 70)
-    
-    for i, account in enumerate(accounts, 1):
-        print(f"[{i}/{len(accounts)}] Processing {account['domain']} ({account['user']})...")
-        
-        try:
-            result = whm_api_call(server, "modifyacct", {
-                "user": account['user'],
-                "HASSHELL": 0
-            })
-            
-            # فحص النجاح
-            success = False
-            error_msg = "Unknown error"
-            
-            if isinstance(result, dict):
-                metadata = result.get("metadata")
-                if metadata and metadata.get("result") == 1:
-                    success = True
-                    error_msg = metadata.get("reason", "SSH disabled successfully")
-                elif metadata:
-                    error_msg = metadata.get("reason", "Operation failed")
-                elif "cpanelresult" in result:
-                    cpanel_result = result["cpanelresult"]
-                    if cpanel_result.get("event", {}).get("result") == 1:
-                        success = True
-                        error_msg = "SSH disabled successfully"
-                    else:
-                        error_msg = cpanel_result.get("event", {}).get("reason", "Operation failed")
-                elif "error" in result:
-                    error_msg = result["error"]
-            
-            if success:
-                print(f"   ✅ SSH disabled for {account['domain']}")
-                success_count += 1
-                results.append({"domain": account['domain'], "user": account['user'], "status": "Success"})
-            else:
-                print(f"   ❌ Failed to disable SSH: {error_msg}")
-                failed_count += 1
-                results.append({"domain": account['domain'], "user": account['user'], "status": "Failed", "error": error_msg})
-                
-        except Exception as e:
-            print(f"   ❌ Error disabling SSH: {str(e)}")
-            failed_count += 1
-            results.append({"domain": account['domain'], "user": account['user'], "status": "Error", "error": str(e)})
+    results = run_bulk_operation(targets, _ssh_modify_action(enable), batch_size=WHM_BATCH_SIZE)
+    success_count = sum(1 for result in results if result["status"] == "Success")
     
     # عرض النتائج
-    print(f"\n📊 SSH Disable Results for Server {server_name}:")
+    print(f"\n📊 SSH {action_name.title()} Results for Server {server_name}:")
     print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
+    print(f"   ❌ Failed: {len(results) - success_count}")
     print(f"   📋 Total: {len(accounts)}")
     
     # تصدير النتائج
     if results and confirm_action("\nExport results to file?"):
-        export_bulk_results(results, f"ssh_disable_all_{server_name}")
+        export_bulk_results(results, f"ssh_{action_name}_all_{server_name}")
 
 def diagnose_ssh_api_issues(server, server_name, accounts):
     """تشخيص مشاكل SSH API قبل الفحص الشامل"""
@@ -1737,7 +1554,7 @@ def diagnose_ssh_api_issues(server, server_name, accounts):
     # اختبار WHM API العام
     print(f"2. 🔍 Testing WHM API...")
     try:
-        test_result = whm_api_call(server, "version", {})
+        test_result = whm_api_call(server, "version", {}, use_cache=False)
         if "error" in test_result:
             print(f"   ❌ WHM API test failed: {test_result.get('error', 'Unknown error')}")
             return False
@@ -1818,12 +1635,11 @@ def check_ssh_all_accounts_server(server, server_name):
     print(f"{'Domain':<30} {'User':<20} {'SSH Status':<15} {'Account Status':<15} {'Shell Details'}")
     print("-" * 100)
     
-    for account in accounts:
+    # جلب accountsummary لكل الحسابات في طلبات batch قليلة بدلاً من طلب لكل حساب
+    summaries = whm_batch_call(server, [("accountsummary", {"user": account['user']}) for account in accounts])
+    
+    for account, result in zip(accounts, summaries):
         try:
-            result = whm_api_call(server, "accountsummary", {
-                "user": account['user']
-            })
-            
             # تشخيص مفصل للاستجابة
             if "error" in result:
                 error_msg = result.get('error', 'Unknown API error')
@@ -1936,12 +1752,11 @@ def ssh_status_report_single_server(server, server_name):
     
     print(f"\n🔄 Checking SSH status for {len(accounts)} accounts...")
     
-    for account in accounts:
+    # جلب accountsummary لكل الحسابات في طلبات batch قليلة بدلاً من طلب لكل حساب
+    summaries = whm_batch_call(server, [("accountsummary", {"user": account['user']}) for account in accounts])
+    
+    for account, result in zip(accounts, summaries):
         try:
-            result = whm_api_call(server, "accountsummary", {
-                "user": account['user']
-            })
-            
             if "error" not in result and "data" in result and "acct" in result["data"]:
                 account_data = result["data"]["acct"]
                 
@@ -2048,140 +1863,16 @@ def restart_ssh_service_single_server(server, server_name):
 
 def enable_ssh_specific_accounts_server(server, server_name):
     """تفعيل SSH لحسابات محددة على سيرفر محدد"""
-    print(f"\n🎯 Enable SSH for Specific Accounts on Server {server_name}")
-    print("=" * 70)
-    
-    # الحصول على جميع الحسابات
-    accounts = list_accounts(server)
-    if not accounts:
-        print(f"❌ No accounts found on Server {server_name}")
-        return
-    
-    print(f"📋 Available accounts on Server {server_name}:")
-    for i, account in enumerate(accounts[:10], 1):
-        print(f"   {i}. {account['domain']} ({account['user']})")
-    if len(accounts) > 10:
-        print(f"   ... and {len(accounts) - 10} more")
-    
-    # اختيار الحسابات
-    print(f"\nSelect accounts to enable SSH:")
-    print("1. 📋 Enter domains manually")
-    print("2. 📂 Load from file")
-    print("3. 📦 All accounts with specific package")
-    
-    method = input("\nChoose method (1-3): ").strip()
-    
-    if method == "1":
-        domains = get_domains_manually()
-    elif method == "2":
-        domains = get_domains_from_file()
-    elif method == "3":
-        domains = get_domains_by_package({server_name: server})
-    else:
-        print("❌ Invalid method")
-        return
-    
-    if not domains:
-        print("❌ No domains selected")
-        return
-    
-    # فلترة الحسابات للسيرفر المحدد
-    server_domains = [account['domain'] for account in accounts]
-    valid_domains = [domain for domain in domains if domain in server_domains]
-    
-    if not valid_domains:
-        print("❌ No valid domains found on this server")
-        return
-    
-    print(f"\n📋 Selected {len(valid_domains)} valid domains on Server {server_name}:")
-    for i, domain in enumerate(valid_domains[:5], 1):
-        print(f"   {i}. {domain}")
-    if len(valid_domains) > 5:
-        print(f"   ... and {len(valid_domains) - 5} more")
-    
-    # تأكيد العملية
-    confirm = input(f"\n⚠️  Enable SSH for {len(valid_domains)} accounts on Server {server_name}? (y/N): ").strip().lower()
-    if confirm != 'y':
-        print("❌ Operation cancelled")
-        return
-    
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
-    
-    print(f"\n🔄 Processing {len(valid_domains)} accounts...")
-    print("-" * 70)
-    
-    for i, domain in enumerate(valid_domains, 1):
-        # البحث عن الحساب في السيرفر
-        account = None
-        for acc in accounts:
-            if acc['domain'] == domain:
-                account = acc
-                break
-        
-        if not account:
-            print(f"[{i}/{len(valid_domains)}] ❌ Account not found: {domain}")
-            failed_count += 1
-            continue
-        
-        print(f"[{i}/{len(valid_domains)}] Processing {domain} ({account['user']})...")
-        
-        try:
-            result = whm_api_call(server, "modifyacct", {
-                "user": account['user'],
-                "HASSHELL": 1
-            })
-            
-            # فحص النجاح
-            success = False
-            error_msg = "Unknown error"
-            
-            if isinstance(result, dict):
-                metadata = result.get("metadata")
-                if metadata and metadata.get("result") == 1:
-                    success = True
-                    error_msg = metadata.get("reason", "SSH enabled successfully")
-                elif metadata:
-                    error_msg = metadata.get("reason", "Operation failed")
-                elif "cpanelresult" in result:
-                    cpanel_result = result["cpanelresult"]
-                    if cpanel_result.get("event", {}).get("result") == 1:
-                        success = True
-                        error_msg = "SSH enabled successfully"
-                    else:
-                        error_msg = cpanel_result.get("event", {}).get("reason", "Operation failed")
-                elif "error" in result:
-                    error_msg = result["error"]
-            
-            if success:
-                print(f"   ✅ SSH enabled for {domain}")
-                success_count += 1
-                results.append({"domain": domain, "user": account['user'], "status": "Success"})
-            else:
-                print(f"   ❌ Failed to enable SSH: {error_msg}")
-                failed_count += 1
-                results.append({"domain": domain, "user": account['user'], "status": "Failed", "error": error_msg})
-                
-        except Exception as e:
-            print(f"   ❌ Error enabling SSH: {str(e)}")
-            failed_count += 1
-            results.append({"domain": domain, "user": account['user'], "status": "Error", "error": str(e)})
-    
-    # عرض النتائج
-    print(f"\n📊 SSH Enable Results for Server {server_name}:")
-    print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
-    print(f"   📋 Total: {len(valid_domains)}")
-    
-    # تصدير النتائج
-    if results and confirm_action("\nExport results to file?"):
-        export_bulk_results(results, f"ssh_enable_specific_{server_name}")
+    _set_ssh_specific_accounts_server(server, server_name, enable=True)
 
 def disable_ssh_specific_accounts_server(server, server_name):
     """إلغاء SSH لحسابات محددة على سيرفر محدد"""
-    print(f"\n🎯 Disable SSH for Specific Accounts on Server {server_name}")
+    _set_ssh_specific_accounts_server(server, server_name, enable=False)
+
+def _set_ssh_specific_accounts_server(server, server_name, enable):
+    """تفعيل أو إلغاء SSH لحسابات محددة على سيرفر محدد عبر منفذ العمليات الجماعية"""
+    action_name = "enable" if enable else "disable"
+    print(f"\n🎯 {action_name.title()} SSH for Specific Accounts on Server {server_name}")
     print("=" * 70)
     
     # الحصول على جميع الحسابات
@@ -2197,7 +1888,7 @@ def disable_ssh_specific_accounts_server(server, server_name):
         print(f"   ... and {len(accounts) - 10} more")
     
     # اختيار الحسابات
-    print(f"\nSelect accounts to disable SSH:")
+    print(f"\nSelect accounts to {action_name} SSH:")
     print("1. 📋 Enter domains manually")
     print("2. 📂 Load from file")
     print("3. 📦 All accounts with specific package")
@@ -2219,8 +1910,8 @@ def disable_ssh_specific_accounts_server(server, server_name):
         return
     
     # فلترة الحسابات للسيرفر المحدد
-    server_domains = [account['domain'] for account in accounts]
-    valid_domains = [domain for domain in domains if domain in server_domains]
+    accounts_by_domain = {account['domain']: account for account in accounts}
+    valid_domains = [domain for domain in domains if domain in accounts_by_domain]
     
     if not valid_domains:
         print("❌ No valid domains found on this server")
@@ -2233,84 +1924,28 @@ def disable_ssh_specific_accounts_server(server, server_name):
         print(f"   ... and {len(valid_domains) - 5} more")
     
     # تأكيد العملية
-    confirm = input(f"\n⚠️  Disable SSH for {len(valid_domains)} accounts on Server {server_name}? (y/N): ").strip().lower()
+    confirm = input(f"\n⚠️  {action_name.title()} SSH for {len(valid_domains)} accounts on Server {server_name}? (y/N): ").strip().lower()
     if confirm != 'y':
         print("❌ Operation cancelled")
         return
     
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
+    targets = [{"domain": domain, "user": accounts_by_domain[domain]['user'], "server": server, "server_name": server_name}
+               for domain in valid_domains]
     
     print(f"\n🔄 Processing {len(valid_domains)} accounts...")
     print("-" * 70)
-    
-    for i, domain in enumerate(valid_domains, 1):
-        # البحث عن الحساب في السيرفر
-        account = None
-        for acc in accounts:
-            if acc['domain'] == domain:
-                account = acc
-                break
-        
-        if not account:
-            print(f"[{i}/{len(valid_domains)}] ❌ Account not found: {domain}")
-            failed_count += 1
-            continue
-        
-        print(f"[{i}/{len(valid_domains)}] Processing {domain} ({account['user']})...")
-        
-        try:
-            result = whm_api_call(server, "modifyacct", {
-                "user": account['user'],
-                "HASSHELL": 0
-            })
-            
-            # فحص النجاح
-            success = False
-            error_msg = "Unknown error"
-            
-            if isinstance(result, dict):
-                metadata = result.get("metadata")
-                if metadata and metadata.get("result") == 1:
-                    success = True
-                    error_msg = metadata.get("reason", "SSH disabled successfully")
-                elif metadata:
-                    error_msg = metadata.get("reason", "Operation failed")
-                elif "cpanelresult" in result:
-                    cpanel_result = result["cpanelresult"]
-                    if cpanel_result.get("event", {}).get("result") == 1:
-                        success = True
-                        error_msg = "SSH disabled successfully"
-                    else:
-                        error_msg = cpanel_result.get("event", {}).get("reason", "Operation failed")
-                elif "error" in result:
-                    error_msg = result["error"]
-            
-            if success:
-                print(f"   ✅ SSH disabled for {domain}")
-                success_count += 1
-                results.append({"domain": domain, "user": account['user'], "status": "Success"})
-            else:
-                print(f"   ❌ Failed to disable SSH: {error_msg}")
-                failed_count += 1
-                results.append({"domain": domain, "user": account['user'], "status": "Failed", "error": error_msg})
-                
-        except Exception as e:
-            print(f"   ❌ Error disabling SSH: {str(e)}")
-            failed_count += 1
-            results.append({"domain": domain, "user": account['user'], "status": "Error", "error": str(e)})
+    results = run_bulk_operation(targets, _ssh_modify_action(enable), batch_size=WHM_BATCH_SIZE)
+    success_count = sum(1 for result in results if result["status"] == "Success")
     
     # عرض النتائج
-    print(f"\n📊 SSH Disable Results for Server {server_name}:")
+    print(f"\n📊 SSH {action_name.title()} Results for Server {server_name}:")
     print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
+    print(f"   ❌ Failed: {len(results) - success_count}")
     print(f"   📋 Total: {len(valid_domains)}")
     
     # تصدير النتائج
     if results and confirm_action("\nExport results to file?"):
-        export_bulk_results(results, f"ssh_disable_specific_{server_name}")
+        export_bulk_results(results, f"ssh_{action_name}_specific_{server_name}")
 
 def force_ssh_service_restart(servers):
     """إجبار إعادة تشغيل SSH service على جميع السيرفرات"""
@@ -2325,36 +1960,32 @@ def force_ssh_service_restart(servers):
         print("❌ Operation cancelled")
         return
     
-    success_count = 0
-    failed_count = 0
-    
+    # هدف واحد لكل سيرفر، والسيرفرات غير المتصلة تُسجل بدون تنفيذ
+    targets = []
     for server_name, server in servers.items():
-        print(f"\n🖥️  Server {server_name} ({server['ip']}):")
-        
-        if not test_server_connection(server):
-            print(f"   🔴 Server offline")
-            failed_count += 1
-            continue
-        
-        try:
-            # محاولة إعادة تشغيل SSH service
-            print(f"   🔄 Restarting SSH service...")
-            
-            restart_result = whm_api_call(server, "restartservice", {
-                "service": "sshd"
-            })
-            
-            if "error" not in restart_result:
-                print(f"   ✅ SSH service restarted successfully")
-                success_count += 1
-                logging.info(f"SSH service restarted on {server_name} ({server['ip']})")
-            else:
-                print(f"   ❌ SSH service restart failed: {restart_result.get('error', 'Unknown error')}")
-                failed_count += 1
-                
-        except Exception as e:
-            print(f"   ❌ Error restarting SSH service: {str(e)}")
-            failed_count += 1
+        online = test_server_connection(server)
+        targets.append({"domain": server['ip'], "server": server if online else None, "server_name": server_name,
+                        "status": "Offline", "error": "Server offline"})
+    
+    def restart(target):
+        restarted, message = restart_sshd(target['server'])
+        if not restarted:
+            return bulk_result(target, "Failed", error=message)
+        logging.info(f"SSH service restarted on {target['server_name']} ({target['domain']})")
+        return bulk_result(target, "Success")
+    
+    def show_row(done, total, result):
+        if result["status"] == "Success":
+            print(f"🖥️  Server {result['server']} ({result['domain']}): ✅ SSH service restarted successfully")
+        elif result["status"] == "Offline":
+            print(f"🖥️  Server {result['server']} ({result['domain']}): 🔴 Server offline")
+        else:
+            print(f"🖥️  Server {result['server']} ({result['domain']}): ❌ SSH service restart failed: {result.get('error', 'Unknown error')}")
+    
+    print(f"\n🔄 Restarting SSH service...")
+    results = run_bulk_operation(targets, restart, on_result=show_row)
+    success_count = sum(1 for result in results if result["status"] == "Success")
+    failed_count = len(results) - success_count
     
     print(f"\n📊 SSH Service Restart Results:")
     print(f"   ✅ Success: {success_count}")
@@ -2368,359 +1999,87 @@ def force_ssh_service_restart(servers):
 
 def bulk_enable_ssh(servers):
     """تفعيل SSH لأكونتات متعددة"""
-    print(f"\n🔓 Bulk Enable SSH Access")
+    _bulk_set_ssh(servers, enable=True)
+
+def bulk_disable_ssh(servers):
+    """إلغاء SSH لأكونتات متعددة"""
+    _bulk_set_ssh(servers, enable=False)
+
+def _bulk_set_ssh(servers, enable):
+    """تفعيل أو إلغاء SSH لأكونتات متعددة عبر منفذ العمليات الجماعية"""
+    action_name = "enable" if enable else "disable"
+    print(f"\n{'🔓' if enable else '🔒'} Bulk {action_name.title()} SSH Access")
     print("=" * 50)
     
-    # اختيار طريقة تحديد الحسابات
-    print("Select accounts method:")
-    print("1. 📋 Enter domains manually")
-    print("2. 📂 Load from file")
-    print("3. 🖥️  All accounts on a server")
-    print("4. 📦 All accounts with specific package")
-    
-    method = input("\nChoose method (1-4): ").strip()
-    
-    if method == "1":
-        domains = get_domains_manually()
-    elif method == "2":
-        domains = get_domains_from_file()
-    elif method == "3":
-        domains = get_all_domains_from_server(servers)
-    elif method == "4":
-        domains = get_domains_by_package(servers)
-    else:
-        print("❌ Invalid method")
-        return
-    
+    domains = select_bulk_domains(servers)
     if not domains:
-        print("❌ No domains selected")
         return
     
-    print(f"\n📋 Selected {len(domains)} domains:")
-    for i, domain in enumerate(domains[:5], 1):
-        print(f"   {i}. {domain}")
-    if len(domains) > 5:
-        print(f"   ... and {len(domains) - 5} more")
-    
-    # تأكيد العملية
-    confirm = input(f"\n⚠️  Enable SSH for {len(domains)} accounts? (y/N): ").strip().lower()
-    if confirm != 'y':
-        print("❌ Operation cancelled")
+    targets = plan_bulk_targets(domains, servers)
+    runnable = sum(1 for target in targets if target.get("server"))
+    if not runnable:
+        print("❌ No accounts to process")
         return
     
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
-    
-    print(f"\n🔄 Processing {len(domains)} accounts...")
-    print("-" * 60)
-    
-    for i, domain in enumerate(domains, 1):
-        print(f"[{i}/{len(domains)}] Processing {domain}...")
-        
-        # البحث عن الحساب
-        account_info = find_account_by_domain(domain, servers)
-        if not account_info:
-            print(f"   ❌ Account not found for {domain}")
-            failed_count += 1
-            results.append({"domain": domain, "status": "Not Found", "error": "Account not found"})
-            continue
-        
-        # تفعيل SSH
-        try:
-            result = whm_api_call(account_info['server'], "modifyacct", {
-                "user": account_info['user'],
-                "HASSHELL": 1  # استخدام HASSHELL المحسن
-            })
-            
-            # فحص النجاح بطريقة محسنة مثل السكريبت القديم
-            success = False
-            error_msg = "Unknown error"
-            
-            if isinstance(result, dict):
-                # فحص metadata أولاً
-                metadata = result.get("metadata")
-                if metadata and metadata.get("result") == 1:
-                    success = True
-                    error_msg = metadata.get("reason", "SSH enabled successfully")
-                elif metadata:
-                    error_msg = metadata.get("reason", "Operation failed")
-                # فحص cpanelresult كبديل
-                elif "cpanelresult" in result:
-                    cpanel_result = result["cpanelresult"]
-                    if cpanel_result.get("event", {}).get("result") == 1:
-                        success = True
-                        error_msg = "SSH enabled successfully"
-                    else:
-                        error_msg = cpanel_result.get("event", {}).get("reason", "Operation failed")
-                # فحص الأخطاء المباشرة
-                elif "error" in result:
-                    error_msg = result["error"]
-                else:
-                    error_msg = "Unexpected response format"
-            
-            if success:
-                print(f"   ✅ SSH enabled for {domain}")
-                
-                # محاولة تطبيق التغيير فعلياً
-                print(f"      🔄 Applying changes to system...")
-                apply_result = apply_ssh_changes_to_system(account_info['server'], account_info['user'])
-                
-                if apply_result:
-                    print(f"      ✅ System changes applied successfully")
-                    results.append({"domain": domain, "status": "Success", "user": account_info['user'], "system_applied": True})
-                else:
-                    print(f"      ⚠️  SSH enabled but system changes may need manual restart")
-                    results.append({"domain": domain, "status": "Success", "user": account_info['user'], "system_applied": False})
-                
-                success_count += 1
-                logging.info(f"Bulk SSH enabled for {domain} ({account_info['user']}) on {account_info['server']['ip']}")
-            else:
-                print(f"   ❌ Failed to enable SSH: {error_msg}")
-                failed_count += 1
-                results.append({"domain": domain, "status": "Failed", "error": error_msg})
-                
-        except Exception as e:
-            print(f"   ❌ Error enabling SSH: {str(e)}")
-            failed_count += 1
-            results.append({"domain": domain, "status": "Error", "error": str(e)})
-    
-    # عرض النتائج
-    print(f"\n📊 Bulk SSH Enable Results:")
-    print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
-    print(f"   📋 Total: {len(domains)}")
-    
-    # تصدير النتائج
-    if results and confirm_action("\nExport results to file?"):
-        export_bulk_results(results, "bulk_ssh_enable")
-
-def bulk_disable_ssh(servers):
-    """إلغاء SSH لأكونتات متعددة"""
-    print(f"\n🔒 Bulk Disable SSH Access")
-    print("=" * 50)
-    
-    # اختيار طريقة تحديد الحسابات
-    print("Select accounts method:")
-    print("1. 📋 Enter domains manually")
-    print("2. 📂 Load from file")
-    print("3. 🖥️  All accounts on a server")
-    print("4. 📦 All accounts with specific package")
-    
-    method = input("\nChoose method (1-4): ").strip()
-    
-    if method == "1":
-        domains = get_domains_manually()
-    elif method == "2":
-        domains = get_domains_from_file()
-    elif method == "3":
-        domains = get_all_domains_from_server(servers)
-    elif method == "4":
-        domains = get_domains_by_package(servers)
-    else:
-        print("❌ Invalid method")
-        return
-    
-    if not domains:
-        print("❌ No domains selected")
-        return
-    
-    print(f"\n📋 Selected {len(domains)} domains:")
-    for i, domain in enumerate(domains[:5], 1):
-        print(f"   {i}. {domain}")
-    if len(domains) > 5:
-        print(f"   ... and {len(domains) - 5} more")
-    
     # تأكيد العملية
-    confirm = input(f"\n⚠️  Disable SSH for {len(domains)} accounts? (y/N): ").strip().lower()
+    confirm = input(f"\n⚠️  {action_name.title()} SSH for {runnable} accounts? (y/N): ").strip().lower()
     if confirm != 'y':
         print("❌ Operation cancelled")
         return
     
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
-    
-    print(f"\n🔄 Processing {len(domains)} accounts...")
+    print(f"\n🔄 Processing {len(targets)} accounts...")
     print("-" * 60)
+    results = run_bulk_operation(targets, _ssh_modify_action(enable), batch_size=WHM_BATCH_SIZE)
+    success_count = sum(1 for result in results if result["status"] == "Success")
     
-    for i, domain in enumerate(domains, 1):
-        print(f"[{i}/{len(domains)}] Processing {domain}...")
-        
-        # البحث عن الحساب
-        account_info = find_account_by_domain(domain, servers)
-        if not account_info:
-            print(f"   ❌ Account not found for {domain}")
-            failed_count += 1
-            results.append({"domain": domain, "status": "Not Found", "error": "Account not found"})
-            continue
-        
-        # إلغاء SSH
-        try:
-            result = whm_api_call(account_info['server'], "modifyacct", {
-                "user": account_info['user'],
-                "HASSHELL": 0  # استخدام HASSHELL المحسن
-            })
-            
-            # فحص النجاح بطريقة محسنة مثل السكريبت القديم
-            success = False
-            error_msg = "Unknown error"
-            
-            if isinstance(result, dict):
-                # فحص metadata أولاً
-                metadata = result.get("metadata")
-                if metadata and metadata.get("result") == 1:
-                    success = True
-                    error_msg = metadata.get("reason", "SSH disabled successfully")
-                elif metadata:
-                    error_msg = metadata.get("reason", "Operation failed")
-                # فحص cpanelresult كبديل
-                elif "cpanelresult" in result:
-                    cpanel_result = result["cpanelresult"]
-                    if cpanel_result.get("event", {}).get("result") == 1:
-                        success = True
-                        error_msg = "SSH disabled successfully"
-                    else:
-                        error_msg = cpanel_result.get("event", {}).get("reason", "Operation failed")
-                # فحص الأخطاء المباشرة
-                elif "error" in result:
-                    error_msg = result["error"]
-                else:
-                    error_msg = "Unexpected response format"
-            
-            if success:
-                print(f"   ✅ SSH disabled for {domain}")
-                
-                # محاولة تطبيق التغيير فعلياً
-                print(f"      🔄 Applying changes to system...")
-                apply_result = apply_ssh_changes_to_system(account_info['server'], account_info['user'])
-                
-                if apply_result:
-                    print(f"      ✅ System changes applied successfully")
-                    results.append({"domain": domain, "status": "Success", "user": account_info['user'], "system_applied": True})
-                else:
-                    print(f"      ⚠️  SSH disabled but system changes may need manual restart")
-                    results.append({"domain": domain, "status": "Success", "user": account_info['user'], "system_applied": False})
-                
-                success_count += 1
-                logging.info(f"Bulk SSH disabled for {domain} ({account_info['user']}) on {account_info['server']['ip']}")
-            else:
-                print(f"   ❌ Failed to disable SSH: {error_msg}")
-                failed_count += 1
-                results.append({"domain": domain, "status": "Failed", "error": error_msg})
-                
-        except Exception as e:
-            print(f"   ❌ Error disabling SSH: {str(e)}")
-            failed_count += 1
-            results.append({"domain": domain, "status": "Error", "error": str(e)})
+    # كل تغييرات modifyacct أولاً، ثم تحقق وإعادة تشغيل sshd مرة واحدة لكل سيرفر
+    if success_count:
+        print(f"\n🔄 Applying changes to system...")
+        apply_ssh_changes_to_system(servers, results, enable)
     
     # عرض النتائج
-    print(f"\n📊 Bulk SSH Disable Results:")
+    print(f"\n📊 Bulk SSH {action_name.title()} Results:")
     print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
-    print(f"   📋 Total: {len(domains)}")
+    print(f"   ❌ Failed: {len(results) - success_count}")
+    print(f"   🔍 Verified: {sum(1 for result in results if result.get('verified'))}")
+    print(f"   📋 Total: {len(targets)}")
     
     # تصدير النتائج
     if results and confirm_action("\nExport results to file?"):
-        export_bulk_results(results, "bulk_ssh_disable")
+        export_bulk_results(results, f"bulk_ssh_{action_name}")
 
 def bulk_check_ssh_status(servers):
     """فحص حالة SSH لأكونتات متعددة"""
     print(f"\n📋 Bulk Check SSH Status")
     print("=" * 50)
     
-    # اختيار طريقة تحديد الحسابات
-    print("Select accounts method:")
-    print("1. 📋 Enter domains manually")
-    print("2. 📂 Load from file")
-    print("3. 🖥️  All accounts on a server")
-    print("4. 📦 All accounts with specific package")
-    
-    method = input("\nChoose method (1-4): ").strip()
-    
-    if method == "1":
-        domains = get_domains_manually()
-    elif method == "2":
-        domains = get_domains_from_file()
-    elif method == "3":
-        domains = get_all_domains_from_server(servers)
-    elif method == "4":
-        domains = get_domains_by_package(servers)
-    else:
-        print("❌ Invalid method")
-        return
-    
+    domains = select_bulk_domains(servers)
     if not domains:
-        print("❌ No domains selected")
         return
     
-    # فحص الحالة
-    enabled_count = 0
-    disabled_count = 0
-    error_count = 0
-    results = []
+    targets = plan_bulk_targets(domains, servers)
+    
+    def show_row(done, total, result):
+        ssh_status = {"Enabled": "🔓 Enabled", "Disabled": "🔒 Disabled", "Not Found": "❌ Not Found", "Skipped": "⏭️  Skipped"}.get(
+            result.get("ssh_status", result["status"]), "❌ Error")
+        account_status = {"Suspended": "🔴 Suspended", "Active": "🟢 Active"}.get(result.get("account_status"), "N/A")
+        print(f"{result['domain']:<30} {result['user']:<15} {ssh_status:<15} {account_status}")
     
-    print(f"\n🔄 Checking SSH status for {len(domains)} accounts...")
+    print(f"\n🔄 Checking SSH status for {len(targets)} accounts...")
     print("-" * 80)
     print(f"{'Domain':<30} {'User':<15} {'SSH Status':<15} {'Account Status'}")
     print("-" * 80)
-    
-    for domain in domains:
-        # البحث عن الحساب
-        account_info = find_account_by_domain(domain, servers)
-        if not account_info:
-            print(f"{domain:<30} {'N/A':<15} {'❌ Not Found':<15} {'N/A'}")
-            error_count += 1
-            results.append({"domain": domain, "user": "N/A", "ssh_status": "Not Found", "account_status": "N/A"})
-            continue
-        
-        try:
-            # الحصول على معلومات الحساب
-            result = whm_api_call(account_info['server'], "accountsummary", {
-                "user": account_info['user']
-            })
-            
-            if "error" not in result:
-                account_data = result.get("acct", {})
-                has_shell = account_data.get("hasshell", 0)
-                is_suspended = account_data.get("suspended", 0)
-                
-                ssh_status = "🔓 Enabled" if has_shell else "🔒 Disabled"
-                account_status = "🔴 Suspended" if is_suspended else "🟢 Active"
-                
-                print(f"{domain:<30} {account_info['user']:<15} {ssh_status:<15} {account_status}")
-                
-                if has_shell:
-                    enabled_count += 1
-                else:
-                    disabled_count += 1
-                
-                results.append({
-                    "domain": domain,
-                    "user": account_info['user'],
-                    "ssh_status": "Enabled" if has_shell else "Disabled",
-                    "account_status": "Suspended" if is_suspended else "Active",
-                    "server": account_info['server_name']
-                })
-            else:
-                print(f"{domain:<30} {account_info['user']:<15} {'❌ Error':<15} {'N/A'}")
-                error_count += 1
-                results.append({"domain": domain, "user": account_info['user'], "ssh_status": "Error", "account_status": "N/A"})
-                
-        except Exception as e:
-            print(f"{domain:<30} {account_info['user']:<15} {'❌ Error':<15} {'N/A'}")
-            error_count += 1
-            results.append({"domain": domain, "user": account_info['user'], "ssh_status": "Error", "account_status": "N/A"})
+    results = run_bulk_operation(targets, _ssh_status_batch_action, on_result=show_row, batch_size=WHM_BATCH_SIZE)
     
     # عرض النتائج
+    enabled_count = sum(1 for result in results if result.get("ssh_status") == "Enabled")
+    disabled_count = sum(1 for result in results if result.get("ssh_status") == "Disabled")
     print("-" * 80)
     print(f"\n📊 SSH Status Summary:")
     print(f"   🔓 SSH Enabled: {enabled_count}")
     print(f"   🔒 SSH Disabled: {disabled_count}")
-    print(f"   ❌ Errors: {error_count}")
-    print(f"   📋 Total: {len(domains)}")
+    print(f"   ❌ Errors: {len(results) - enabled_count - disabled_count}")
+    print(f"   📋 Total: {len(targets)}")
     
     # تصدير النتائج
     if results and confirm_action("\nExport results to file?"):
@@ -2731,96 +2090,52 @@ def ssh_status_report_all_servers(servers):
     print(f"\n📊 SSH Status Report - All Servers")
     print("=" * 80)
     
-    all_results = []
-    total_enabled = 0
-    total_disabled = 0
-    total_error = 0
-    
+    # كل حسابات السيرفرات المتصلة كأهداف لمنفذ العمليات الجماعية
+    targets = []
+    checked_servers = []
     for server_name, server in servers.items():
-        print(f"\n🖥️  Server {server_name} ({server['ip']}):")
-        
         if not test_server_connection(server):
-            print(f"   🔴 Server offline")
+            print(f"🖥️  Server {server_name} ({server['ip']}): 🔴 Server offline")
             continue
-        
-        accounts = list_accounts(server)
-        if not accounts:
-            print(f"   📋 No accounts found")
+        accounts, error = list_accounts_checked(server, ("user", "domain"))
+        if error:
+            print(f"🖥️  Server {server_name} ({server['ip']}): ❌ Could not list accounts: {error}")
             continue
-        
-        print(f"   📋 Checking {len(accounts)} accounts...")
-        server_enabled = 0
-        server_disabled = 0
-        server_error = 0
-        
-        for account in accounts:
-            try:
-                result = whm_api_call(server, "accountsummary", {
-                    "user": account['user']
-                })
-                
-                if "error" not in result:
-                    account_data = result.get("acct", {})
-                    
-                    # معالجة acct field - قد يكون list أو dict
-                    if isinstance(account_data, list) and len(account_data) > 0:
-                        account_data = account_data[0]
-                    
-                    # فحص شامل لحالة SSH
-                    shell_status = account_data.get("shell", "0")
-                    has_shell = account_data.get("hasshell", 0)
-                    HASSHELL = account_data.get("HASSHELL", 0)
-                    
-                    # تحديد حالة SSH
-                    ssh_enabled = False
-                    if str(shell_status) == "1" or str(has_shell) == "1" or HASSHELL == 1:
-                        ssh_enabled = True
-                    
-                    is_suspended = account_data.get("suspended", 0)
-                    
-                    if ssh_enabled:
-                        server_enabled += 1
-                        total_enabled += 1
-                    else:
-                        server_disabled += 1
-                        total_disabled += 1
-                    
-                    all_results.append({
-                        "domain": account['domain'],
-                        "user": account['user'],
-                        "server": server_name,
-                        "ssh_status": "Enabled" if ssh_enabled else "Disabled",
-                        "account_status": "Suspended" if is_suspended else "Active",
-                        "shell_details": f"shell={shell_status}, hasshell={has_shell}, HASSHELL={HASSHELL}"
-                    })
-                else:
-                    server_error += 1
-                    total_error += 1
-                    
-            except Exception as e:
-                server_error += 1
-                total_error += 1
-        
-        print(f"   🔓 SSH Enabled: {server_enabled}")
-        print(f"   🔒 SSH Disabled: {server_disabled}")
-        print(f"   ❌ Errors: {server_error}")
-        
-        # عرض تفاصيل إضافية للتصحيح
-        if server_enabled > 0:
+        print(f"🖥️  Server {server_name} ({server['ip']}): 📋 {len(accounts)} accounts")
+        checked_servers.append(server_name)
+        targets.extend({"domain": account['domain'], "user": account['user'], "server": server, "server_name": server_name}
+                       for account in accounts)
+    
+    if not targets:
+        print("❌ No accounts to check")
+        return
+    
+    print(f"\n🔄 Checking SSH status for {len(targets)} accounts...")
+    all_results = run_bulk_operation(targets, _ssh_status_batch_action, on_result=lambda done, total, result: None,
+                                     batch_size=WHM_BATCH_SIZE)
+    
+    for server_name in checked_servers:
+        server_results = [result for result in all_results if result['server'] == server_name]
+        enabled = [result for result in server_results if result.get('ssh_status') == "Enabled"]
+        disabled = sum(1 for result in server_results if result.get('ssh_status') == "Disabled")
+        print(f"\n🖥️  Server {server_name}:")
+        print(f"   🔓 SSH Enabled: {len(enabled)}")
+        print(f"   🔒 SSH Disabled: {disabled}")
+        print(f"   ❌ Errors: {len(server_results) - len(enabled) - disabled}")
+        
+        # عرض تفاصيل إضافية للتصحيح (أول 3 حسابات مفعلة)
+        if enabled:
             print(f"   📊 Sample enabled accounts:")
-            enabled_count = 0
-            for result in all_results:
-                if result['server'] == server_name and result['ssh_status'] == "Enabled":
-                    print(f"      - {result['user']} ({result['domain']}) - {result['shell_details']}")
-                    enabled_count += 1
-                    if enabled_count >= 3:  # عرض أول 3 حسابات مفعلة
-                        break
+            for result in enabled[:3]:
+                print(f"      - {result['user']} ({result['domain']}) - {result['shell_details']}")
     
     # عرض النتائج الإجمالية
+    total_enabled = sum(1 for result in all_results if result.get('ssh_status') == "Enabled")
+    total_disabled = sum(1 for result in all_results if result.get('ssh_status') == "Disabled")
     print(f"\n📊 Overall SSH Status Summary:")
     print(f"   🔓 Total SSH Enabled: {total_enabled}")
     print(f"   🔒 Total SSH Disabled: {total_disabled}")
-    print(f"   ❌ Total Errors: {total_error}")
+    print(f"   ❌ Total Errors: {len(all_results) - total_enabled - total_disabled}")
     print(f"   📋 Total Accounts: {len(all_results)}")
     
     # تصدير النتائج
@@ -2878,85 +2193,38 @@ def bulk_change_php_version(servers):
     
     # اختيار طريقة تحديد الحسابات
     print(f"\nSelected PHP version: {selected_version}")
-    print("Select accounts method:")
-    print("1. 📋 Enter domains manually")
-    print("2. 📂 Load from file")
-    print("3. 🖥️  All accounts on a server")
-    print("4. 📦 All accounts with specific package")
-    
-    method = input("\nChoose method (1-4): ").strip()
-    
-    if method == "1":
-        domains = get_domains_manually()
-    elif method == "2":
-        domains = get_domains_from_file()
-    elif method == "3":
-        domains = get_all_domains_from_server(servers)
-    elif method == "4":
-        domains = get_domains_by_package(servers)
-    else:
-        print("❌ Invalid method")
-        return
-    
+    domains = select_bulk_domains(servers)
     if not domains:
-        print("❌ No domains selected")
         return
     
-    print(f"\n📋 Selected {len(domains)} domains:")
-    for i, domain in enumerate(domains[:5], 1):
-        print(f"   {i}. {domain}")
-    if len(domains) > 5:
-        print(f"   ... and {len(domains) - 5} more")
+    targets = plan_bulk_targets(domains, servers)
+    runnable = sum(1 for target in targets if target.get("server"))
+    if not runnable:
+        print("❌ No accounts to process")
+        return
     
     # تأكيد العملية
-    confirm = input(f"\n⚠️  Change PHP version to {selected_version} for {len(domains)} accounts? (y/N): ").strip().lower()
+    confirm = input(f"\n⚠️  Change PHP version to {selected_version} for {runnable} accounts? (y/N): ").strip().lower()
     if confirm != 'y':
         print("❌ Operation cancelled")
         return
     
-    # تنفيذ العملية
-    success_count = 0
-    failed_count = 0
-    results = []
+    def change_php(target):
+        if not change_php_version_for_account(target['server'], target['user'], selected_version):
+            return bulk_result(target, "Failed", error="API call failed")
+        logging.info(f"Bulk PHP version changed to {selected_version} for {target['domain']} ({target['user']}) on {target['server']['ip']}")
+        return bulk_result(target, "Success", php_version=selected_version)
     
-    print(f"\n🔄 Processing {len(domains)} accounts...")
+    print(f"\n🔄 Processing {len(targets)} accounts...")
     print("-" * 60)
-    
-    for i, domain in enumerate(domains, 1):
-        print(f"[{i}/{len(domains)}] Processing {domain}...")
-        
-        # البحث عن الحساب
-        account_info = find_account_by_domain(domain, servers)
-        if not account_info:
-            print(f"   ❌ Account not found for {domain}")
-            failed_count += 1
-            results.append({"domain": domain, "status": "Not Found", "error": "Account not found"})
-            continue
-        
-        # تغيير نسخة PHP
-        try:
-            result = change_php_version_for_account(account_info['server'], account_info['user'], selected_version)
-            
-            if result:
-                print(f"   ✅ PHP version changed to {selected_version} for {domain}")
-                success_count += 1
-                results.append({"domain": domain, "status": "Success", "user": account_info['user'], "php_version": selected_version})
-                logging.info(f"Bulk PHP version changed to {selected_version} for {domain} ({account_info['user']}) on {account_info['server']['ip']}")
-            else:
-                print(f"   ❌ Failed to change PHP version for {domain}")
-                failed_count += 1
-                results.append({"domain": domain, "status": "Failed", "error": "API call failed"})
-                
-        except Exception as e:
-            print(f"   ❌ Error changing PHP version for {domain}: {str(e)}")
-            failed_count += 1
-            results.append({"domain": domain, "status": "Error", "error": str(e)})
+    results = run_bulk_operation(targets, change_php)
+    success_count = sum(1 for result in results if result["status"] == "Success")
     
     # عرض النتائج
     print(f"\n📊 Bulk PHP Version Change Results:")
     print(f"   ✅ Success: {success_count}")
-    print(f"   ❌ Failed: {failed_count}")
-    print(f"   📋 Total: {len(domains)}")
+    print(f"   ❌ Failed: {len(results) - success_count}")
+    print(f"   📋 Total: {len(targets)}")
     print(f"   🐘 Target Version: PHP {selected_version}")
     
     # تصدير النتائج
@@ -2968,102 +2236,53 @@ def bulk_check_php_version(servers):
     print(f"\n📋 Bulk Check PHP Version")
     print("=" * 50)
     
-    # اختيار طريقة تحديد الحسابات
-    print("Select accounts method:")
-    print("1. 📋 Enter domains manually")
-    print("2. 📂 Load from file")
-    print("3. 🖥️  All accounts on a server")
-    print("4. 📦 All accounts with specific package")
-    
-    method = input("\nChoose method (1-4): ").strip()
-    
-    if method == "1":
-        domains = get_domains_manually()
-    elif method == "2":
-        domains = get_domains_from_file()
-    elif method == "3":
-        domains = get_all_domains_from_server(servers)
-    elif method == "4":
-        domains = get_domains_by_package(servers)
-    else:
-        print("❌ Invalid method")
-        return
-    
+    domains = select_bulk_domains(servers)
     if not domains:
-        print("❌ No domains selected")
         return
     
-    # فحص نسخة PHP
-    version_count = {}
-    error_count = 0
-    results = []
+    targets = plan_bulk_targets(domains, servers)
+    
+    def check_php(target):
+        # محاولة الحصول على معلومات PHP
+        result = cpanel_api_call(target['server'], target['user'], "PHP", "get_php_info")
+        if not result or "cpanelresult" not in result:
+            return bulk_result(target, "Error", php_version="Unknown", account_status="N/A")
+        current_version = result["cpanelresult"].get("data", {}).get("version", "Unknown")
+        
+        # فحص حالة الحساب
+        account_status = "N/A"
+        account_result = whm_api_call(target['server'], "accountsummary", {
+            "user": target['user']
+        })
+        account_data = accountsummary_data(account_result) if "error" not in account_result else None
+        if account_data is not None:
+            account_status = "Suspended" if account_data.get("suspended", 0) else "Active"
+        return bulk_result(target, "Success", php_version=current_version, account_status=account_status)
+    
+    def show_row(done, total, result):
+        if result["status"] == "Success":
+            php_version = f"PHP {result['php_version']}"
+        else:
+            php_version = {"Not Found": "❌ Not Found", "Skipped": "⏭️  Skipped"}.get(result["status"], "❌ Unknown")
+        account_status = {"Suspended": "🔴 Suspended", "Active": "🟢 Active"}.get(result.get("account_status"), "N/A")
+        print(f"{result['domain']:<30} {result['user']:<15} {php_version:<15} {account_status}")
     
-    print(f"\n🔄 Checking PHP version for {len(domains)} accounts...")
+    print(f"\n🔄 Checking PHP version for {len(targets)} accounts...")
     print("-" * 80)
     print(f"{'Domain':<30} {'User':<15} {'PHP Version':<15} {'Account Status'}")
     print("-" * 80)
+    results = run_bulk_operation(targets, check_php, on_result=show_row)
     
-    for domain in domains:
-        # البحث عن الحساب
-        account_info = find_account_by_domain(domain, servers)
-        if not account_info:
-            print(f"{domain:<30} {'N/A':<15} {'❌ Not Found':<15} {'N/A'}")
-            error_count += 1
-            results.append({"domain": domain, "user": "N/A", "php_version": "Not Found", "account_status": "N/A"})
-            continue
-        
-        try:
-            # محاولة الحصول على معلومات PHP
-            result = cpanel_api_call(account_info['server'], account_info['user'], "PHP", "get_php_info")
-            
-            if result and "cpanelresult" in result:
-                php_info = result["cpanelresult"].get("data", {})
-                current_version = php_info.get("version", "Unknown")
-                
-                # فحص حالة الحساب
-                account_result = whm_api_call(account_info['server'], "accountsummary", {
-                    "user": account_info['user']
-                })
-                
-                if "error" not in account_result:
-                    account_data = account_result.get("acct", {})
-                    is_suspended = account_data.get("suspended", 0)
-                    account_status = "🔴 Suspended" if is_suspended else "🟢 Active"
-                else:
-                    account_status = "N/A"
-                
-                print(f"{domain:<30} {account_info['user']:<15} {'PHP ' + current_version:<15} {account_status}")
-                
-                # عد النسخ
-                if current_version in version_count:
-                    version_count[current_version] += 1
-                else:
-                    version_count[current_version] = 1
-                
-                results.append({
-                    "domain": domain,
-                    "user": account_info['user'],
-                    "php_version": current_version,
-                    "account_status": "Suspended" if is_suspended else "Active",
-                    "server": account_info['server_name']
-                })
-            else:
-                print(f"{domain:<30} {account_info['user']:<15} {'❌ Unknown':<15} {'N/A'}")
-                error_count += 1
-                results.append({"domain": domain, "user": account_info['user'], "php_version": "Unknown", "account_status": "N/A"})
-                
-        except Exception as e:
-            print(f"{domain:<30} {account_info['user']:<15} {'❌ Error':<15} {'N/A'}")
-            error_count += 1
-            results.append({"domain": domain, "user": account_info['user'], "php_version": "Error", "account_status": "N/A"})
+    # عد النسخ
+    version_count = Counter(result["php_version"] for result in results if result["status"] == "Success")
     
     # عرض النتائج
     print("-" * 80)
     print(f"\n📊 PHP Version Summary:")
     for version, count in sorted(version_count.items()):
         print(f"   🐘 PHP {version}: {count} accounts")
-    print(f"   ❌ Errors: {error_count}")
-    print(f"   📋 Total: {len(domains)}")
+    print(f"   ❌ Errors: {len(results) - sum(version_count.values())}")
+    print(f"   📋 Total: {len(targets)}")
     
     # تصدير النتائج
     if results and confirm_action("\nExport results to file?"):
@@ -3085,7 +2304,7 @@ def php_version_report_all_servers(servers):
             print(f"   🔴 Server offline")
             continue
         
-        accounts = list_accounts(server)
+        accounts = list_accounts(server, fields=ACCOUNT_SUMMARY_FIELDS)
         if not accounts:
             print(f"   📋 No accounts found")
             continue
@@ -3094,10 +2313,14 @@ def php_version_report_all_servers(servers):
         server_version_count = {}
         server_error = 0
         
-        for account in accounts:
+        # جلب نسخ PHP لجميع الحسابات بالتوازي
+        php_results = run_api_calls_parallel([
+            ("cpanel", server, account['user'], "PHP", "get_php_info", None)
+            for account in accounts
+        ])
+        
+        for account, result in zip(accounts, php_results):
             try:
-                result = cpanel_api_call(server, account['user'], "PHP", "get_php_info")
-                
                 if result and "cpanelresult" in result:
                     php_info = result["cpanelresult"].get("data", {})
                     current_version = php_info.get("version", "Unknown")
@@ -3114,16 +2337,8 @@ def php_version_report_all_servers(servers):
                     else:
                         all_version_count[current_version] = 1
                     
-                    # فحص حالة الحساب
-                    account_result = whm_api_call(server, "accountsummary", {
-                        "user": account['user']
-                    })
-                    
-                    if "error" not in account_result:
-                        account_data = account_result.get("acct", {})
-                        is_suspended = account_data.get("suspended", 0)
-                    else:
-                        is_suspended = 0
+                    # حالة الحساب متوفرة في listaccts
+                    is_suspended = account.get('suspended', 0)
                     
                     all_results.append({
                         "domain": account['domain'],
@@ -3210,7 +2425,7 @@ def get_all_domains_from_server(servers):
             server = servers[server_name]
             
             if test_server_connection(server):
-                accounts = list_accounts(server)
+                accounts = list_accounts(server, fields=("user", "domain"))
                 domains = [account['domain'] for account in accounts]
                 print(f"✅ Found {len(domains)} domains on Server {server_name}")
                 return domains
@@ -3234,7 +2449,7 @@ def get_domains_by_package(servers):
     domains = []
     for server_name, server in servers.items():
         if test_server_connection(server):
-            accounts = list_accounts(server)
+            accounts = find_accounts(server, plan=package_name, fields=("domain", "plan"))
             for account in accounts:
                 if account.get('plan', '').lower() == package_name.lower():
                     domains.append(account['domain'])
@@ -3242,95 +2457,265 @@ def get_domains_by_package(servers):
     print(f"✅ Found {len(domains)} domains with package '{package_name}'")
     return domains
 
-def apply_ssh_changes_to_system(server, cpanel_user):
-    """تطبيق تغييرات SSH على النظام - نسخة محسنة من السكريبت القديم"""
-    try:
-        # التحقق من حالة SSH الحالية أولاً
-        print(f"         🔍 Verifying SSH status...")
-        
-        # استخدام accountsummary للتحقق من الحالة
-        check_result = whm_api_call(server, "accountsummary", {
-            "user": cpanel_user
-        })
-        
-        print(f"         📊 Raw API response: {check_result}")
-        
-        if "error" not in check_result and "acct" in check_result:
-            acct_data = check_result["acct"][0] if isinstance(check_result["acct"], list) else check_result["acct"]
-            shell_status = acct_data.get("shell", "0")
-            has_shell = acct_data.get("hasshell", 0)
-            
-            print(f"         📊 Account shell status: shell={shell_status}, hasshell={has_shell}")
-            
-            # فحص شامل لحالة SSH
-            ssh_enabled = False
-            
-            # فحص 1: shell field
-            if str(shell_status) == "1":
-                ssh_enabled = True
-                print(f"         ✅ SSH enabled via shell field")
-            
-            # فحص 2: hasshell field
-            if str(has_shell) == "1":
-                ssh_enabled = True
-                print(f"         ✅ SSH enabled via hasshell field")
-            
-            # فحص 3: HASSHELL field (معامل WHM API)
-            if acct_data.get("HASSHELL", 0) == 1:
-                ssh_enabled = True
-                print(f"         ✅ SSH enabled via HASSHELL field")
-            
-            if ssh_enabled:
-                print(f"         ✅ SSH is properly enabled in account settings")
-                
-                # محاولة إعادة تشغيل SSH service لتطبيق التغييرات
-                print(f"         🔄 Restarting SSH service to apply changes...")
-                
-                restart_result = whm_api_call(server, "restartservice", {
-                    "service": "sshd"
-                })
-                
-                print(f"         📊 Restart result: {restart_result}")
-                
-                if "error" not in restart_result:
-                    if "metadata" in restart_result:
-                        if restart_result["metadata"].get("result") == 1:
-                            print(f"         ✅ SSH service restarted successfully")
-                            return True
-                        else:
-                            print(f"         ⚠️  SSH service restart returned: {restart_result['metadata'].get('reason', 'Unknown')}")
-                    else:
-                        print(f"         ✅ SSH service restart command sent")
-                        return True
-                else:
-                    print(f"         ⚠️  SSH service restart failed: {restart_result.get('error', 'Unknown error')}")
-                    
-                    # محاولة بديلة
-                    print(f"         🔄 Trying alternative restart method...")
-                    alt_result = whm_api_call(server, "restartservice", {
-                        "service": "ssh"
-                    })
-                    
-                    if "error" not in alt_result:
-                        print(f"         ✅ SSH service restarted via alternative method")
-                        return True
-                
-                # حتى لو فشلت إعادة التشغيل، SSH مفعل في الحساب
-                print(f"         ⚠️  SSH is enabled in account but service restart may be needed")
-                return True
+def select_bulk_domains(servers):
+    """اختيار الدومينات للعمليات المتعددة (يدوياً / من ملف / سيرفر / باقة) مع عرض عينة منها"""
+    print("Select accounts method:")
+    print("1. 📋 Enter domains manually")
+    print("2. 📂 Load from file")
+    print("3. 🖥️  All accounts on a server")
+    print("4. 📦 All accounts with specific package")
+    
+    method = input("\nChoose method (1-4): ").strip()
+    
+    if method == "1":
+        domains = get_domains_manually()
+    elif method == "2":
+        domains = get_domains_from_file()
+    elif method == "3":
+        domains = get_all_domains_from_server(servers)
+    elif method == "4":
+        domains = get_domains_by_package(servers)
+    else:
+        print("❌ Invalid method")
+        return []
+    
+    if not domains:
+        print("❌ No domains selected")
+        return []
+    
+    print(f"\n📋 Selected {len(domains)} domains:")
+    for i, domain in enumerate(domains[:5], 1):
+        print(f"   {i}. {domain}")
+    if len(domains) > 5:
+        print(f"   ... and {len(domains) - 5} more")
+    return domains
+
+def _preferred_server_entry(entries):
+    """السيرفر المختار تلقائياً عند وجود الدومين على أكثر من سيرفر (أعلى رقم سيرفر)"""
+    return max(entries, key=lambda x: int(x["server_name"]) if x["server_name"].isdigit() else 0)
+
+def plan_bulk_targets(domains, servers):
+    """تخطيط العملية الجماعية: حل كل الدومينات مرة واحدة من فهرس الحسابات (listaccts واحد لكل سيرفر)
+    
+    يعرض الدومينات غير الموجودة والموجودة على أكثر من سيرفر قبل التنفيذ، ثم خطة التنفيذ لكل
+    سيرفر. يرجع الأهداف بترتيب الدومينات (غير المحلول بدون server) جاهزة لـ run_bulk_operation.
+    """
+    # إزالة التكرار مع الحفاظ على الترتيب
+    unique_domains = []
+    seen = set()
+    for domain in domains:
+        domain = domain.strip()
+        if domain and domain.lower() not in seen:
+            seen.add(domain.lower())
+            unique_domains.append(domain)
+    print(f"\n🗺️  Planning {len(unique_domains)} domain(s)...")
+    if len(unique_domains) < len(domains):
+        print(f"   ♻️  Removed {len(domains) - len(unique_domains)} duplicate/empty entries")
+    
+    index = get_account_domain_index(servers)
+    failed = get_account_domain_index_failures(servers)
+    not_found_error = "Account not found"
+    if failed:
+        not_found_error += f" (not searched: Server {', '.join(failed)})"
+    resolved = {}
+    unresolved = {}
+    ambiguous = []
+    for domain in unique_domains:
+        entries = index.get(domain.lower(), [])
+        if len(entries) == 1:
+            resolved[domain] = entries[0]
+        elif entries:
+            ambiguous.append((domain, entries))
+        else:
+            unresolved[domain] = {"status": "Not Found", "error": not_found_error}
+    
+    if unresolved:
+        print(f"   ❌ {len(unresolved)} domain(s) not found on any online server:")
+        if failed:
+            print(f"      ⚠️  {len(failed)} server(s) could not be searched: {', '.join(failed)}")
+        for domain in list(unresolved)[:10]:
+            print(f"      - {domain}")
+        if len(unresolved) > 10:
+            print(f"      ... and {len(unresolved) - 10} more")
+    
+    if ambiguous:
+        print(f"   ⚠️  {len(ambiguous)} domain(s) found on more than one server:")
+        for domain, entries in ambiguous[:10]:
+            print(f"      - {domain}: " + ", ".join(f"Server {entry['server_name']}" for entry in entries))
+        if len(ambiguous) > 10:
+            print(f"      ... and {len(ambiguous) - 10} more")
+        print("   1. Use the auto-selected server for all (highest server number)")
+        print("   2. Choose the server for each domain")
+        print("   3. Skip these domains")
+        ambiguous_choice = input("   Choose option (1-3, default 1): ").strip()
+        
+        for domain, entries in ambiguous:
+            if ambiguous_choice == "3":
+                unresolved[domain] = {"status": "Skipped", "error": "Found on multiple servers"}
+                continue
+            selected = _preferred_server_entry(entries)
+            if ambiguous_choice == "2":
+                print(f"\n🌐 {domain}:")
+                for i, entry in enumerate(entries, 1):
+                    print(f"   {i}. Server {entry['server_name']} ({entry['server']['ip']}) - user {entry['user']}")
+                choice = input(f"   Choose server (1-{len(entries)}) or press Enter for Server {selected['server_name']}: ").strip()
+                if choice.isdigit() and 1 <= int(choice) <= len(entries):
+                    selected = entries[int(choice) - 1]
+            resolved[domain] = selected
+    
+    # خطة التنفيذ لكل سيرفر
+    per_server = Counter(entry['server_name'] for entry in resolved.values())
+    print(f"\n📋 Execution plan ({len(resolved)} account(s) on {len(per_server)} server(s)):")
+    for server_name, server in servers.items():
+        if per_server[server_name]:
+            print(f"   🖥️  Server {server_name} ({server['ip']}): {per_server[server_name]} account(s)")
+    
+    targets = []
+    for domain in unique_domains:
+        entry = resolved.get(domain)
+        if entry is None:
+            targets.append(dict(unresolved[domain], domain=domain))
+        else:
+            targets.append({"domain": domain, "user": entry['user'], "server": entry['server'],
+                            "server_name": entry['server_name']})
+    return targets
+
+def _modifyacct_outcome(result, success_message):
+    """فحص نتيجة modifyacct (metadata أو cpanelresult) - يرجع (success, message)"""
+    if not isinstance(result, dict):
+        return False, "Unknown error"
+    # فحص metadata أولاً
+    metadata = result.get("metadata")
+    if metadata and metadata.get("result") == 1:
+        return True, metadata.get("reason", success_message)
+    if metadata:
+        return False, metadata.get("reason", "Operation failed")
+    # فحص cpanelresult كبديل
+    if "cpanelresult" in result:
+        event = result["cpanelresult"].get("event", {})
+        if event.get("result") == 1:
+            return True, success_message
+        return False, event.get("reason", "Operation failed")
+    # فحص الأخطاء المباشرة
+    if "error" in result:
+        return False, result["error"]
+    return False, "Unexpected response format"
+
+def _ssh_modify_action(enable):
+    """action لـ run_bulk_operation (مع batch_size) يغير HASSHELL للحسابات في طلب batch واحد"""
+    done_name = "enabled" if enable else "disabled"
+    
+    def set_ssh(batch):
+        server = batch[0]['server']
+        responses = whm_batch_call(server, [
+            ("modifyacct", {"user": target['user'], "HASSHELL": 1 if enable else 0})  # استخدام HASSHELL المحسن
+            for target in batch
+        ])
+        results = []
+        for target, result in zip(batch, responses):
+            success, message = _modifyacct_outcome(result, f"SSH {done_name} successfully")
+            if not success:
+                results.append(bulk_result(target, "Failed", error=message))
+                continue
+            logging.info(f"SSH {done_name} for {target['domain']} ({target['user']}) on {server['ip']}")
+            results.append(bulk_result(target, "Success"))
+        return results
+    
+    return set_ssh
+
+def _shell_enabled(shell):
+    """هل قيمة shell في listaccts تعني أن SSH مفعل (أي shell غير noshell/nologin)"""
+    return bool(shell) and str(shell) != "0" and not str(shell).endswith(("noshell", "nologin"))
+
+def accountsummary_data(result):
+    """بيانات الحساب من استجابة accountsummary (data.acct[0]) - None إذا لم توجد"""
+    account_data = (result.get("data") or {}).get("acct")
+    # معالجة acct field - قد يكون list أو dict
+    if isinstance(account_data, list):
+        account_data = account_data[0] if account_data else None
+    return account_data if isinstance(account_data, dict) else None
+
+def account_ssh_enabled(account_data):
+    """حالة SSH من بيانات accountsummary: مسار shell أو hasshell / HASSHELL"""
+    return (_shell_enabled(account_data.get("shell"))
+            or str(account_data.get("hasshell", 0)) == "1" or str(account_data.get("HASSHELL", 0)) == "1")
+
+def _ssh_status_result(target, result):
+    """نتيجة فحص SSH لحساب واحد من استجابة accountsummary"""
+    if "error" in result:
+        return bulk_result(target, "Error", ssh_status="Error", account_status="N/A", error=result["error"])
+    
+    account_data = accountsummary_data(result)
+    if account_data is None:
+        return bulk_result(target, "Error", ssh_status="Error", account_status="N/A", error="No 'acct' field in 'data'")
+    is_suspended = account_data.get("suspended", 0)
+    shell_details = (f"shell={account_data.get('shell', '0')}, hasshell={account_data.get('hasshell', 0)}, "
+                     f"HASSHELL={account_data.get('HASSHELL', 0)}")
+    return bulk_result(target, "Success",
+                       ssh_status="Enabled" if account_ssh_enabled(account_data) else "Disabled",
+                       account_status="Suspended" if is_suspended else "Active",
+                       shell_details=shell_details)
+
+def _ssh_status_batch_action(batch):
+    """action لـ run_bulk_operation (مع batch_size): accountsummary للحسابات في طلب batch واحد"""
+    responses = whm_batch_call(batch[0]['server'], [
+        ("accountsummary", {"user": target['user']}) for target in batch
+    ])
+    return [_ssh_status_result(target, result) for target, result in zip(batch, responses)]
+
+def restart_sshd(server):
+    """إعادة تشغيل SSH service (sshd ثم ssh كبديل) - يرجع (success, message)"""
+    result = whm_api_call(server, "restartservice", {"service": "sshd"})
+    if "error" in result:
+        logging.warning(f"sshd restart failed on {server['ip']}: {result['error']}, trying ssh")
+        result = whm_api_call(server, "restartservice", {"service": "ssh"})
+        if "error" in result:
+            return False, result["error"]
+    metadata = result.get("metadata")
+    if metadata and metadata.get("result") != 1:
+        return False, metadata.get("reason", "Unknown error")
+    return True, "SSH service restarted"
+
+def apply_ssh_changes_to_system(servers, results, enable):
+    """تطبيق تغييرات SSH بعد انتهاء modifyacct لكل الحسابات
+    
+    لكل سيرفر تغيرت فيه حسابات: تحقق من الـ shell لكل الحسابات في listaccts واحد، ثم
+    إعادة تشغيل sshd مرة واحدة فقط. تضيف verified و sshd_restarted لكل نتيجة ناجحة.
+    """
+    changed = {}
+    for result in results:
+        if result["status"] == "Success":
+            changed.setdefault(result["server"], []).append(result)
+    
+    for server_name, server_results in changed.items():
+        server = servers[server_name]
+        print(f"\n🖥️  Server {server_name} ({server['ip']}): applying {len(server_results)} SSH change(s)...")
+        
+        # التحقق من كل الحسابات في طلب واحد (بدون كاش لأن الحسابات تغيرت للتو)
+        data = whm_api_call(server, "listaccts", whm_columns_params(("user", "shell")), use_cache=False)
+        if "error" in data:
+            print(f"   ⚠️  Could not verify SSH status: {data['error']}")
+            for result in server_results:
+                result["verified"] = None
+        else:
+            shells = {acct["user"]: acct.get("shell") for acct in data.get("data", {}).get("acct", [])}
+            for result in server_results:
+                result["verified"] = result["user"] in shells and _shell_enabled(shells[result["user"]]) == enable
+            unverified = [result["user"] for result in server_results if not result["verified"]]
+            if unverified:
+                print(f"   ⚠️  {len(unverified)} account(s) do not show the expected shell yet: {', '.join(unverified[:10])}")
             else:
-                print(f"         ❌ SSH is not properly enabled in account settings")
-                print(f"         🔍 All SSH fields are disabled: shell={shell_status}, hasshell={has_shell}")
-                return False
+                print(f"   ✅ All {len(server_results)} change(s) verified in account settings")
+        
+        # إعادة تشغيل واحدة لكل سيرفر بدلاً من واحدة لكل حساب
+        restarted, message = restart_sshd(server)
+        if restarted:
+            print(f"   ✅ {message}")
+            logging.info(f"SSH service restarted on {server_name} ({server['ip']}) after {len(server_results)} bulk SSH change(s)")
         else:
-            print(f"         ❌ Could not verify account status")
-            if "error" in check_result:
-                print(f"         📊 Error details: {check_result['error']}")
-            return False
-                
-    except Exception as e:
-        print(f"         ❌ Error applying SSH changes: {str(e)}")
-        return False
+            print(f"   ⚠️  SSH service restart failed: {message} - changes may need manual restart")
+        for result in server_results:
+            result["sshd_restarted"] = restarted
 
 def export_bulk_results(results, operation_name):
     """تصدير نتائج العمليات المتعددة"""
@@ -3344,8 +2729,8 @@ def export_bulk_results(results, operation_name):
         
         # تحديد العناوين والبيانات
         if results:
-            # استخراج العناوين من أول عنصر
-            headers = list(results[0].keys())
+            # العناوين من كل النتائج بترتيب ظهورها (النتائج قد تختلف في الحقول)
+            headers = list(dict.fromkeys(header for result in results for header in result))
             # تحويل البيانات إلى قائمة من القوائم
             data_rows = []
             for result in results:
@@ -3376,6 +2761,8 @@ def main():
         servers = initialize_script("WHM Accounts & Domains Management")
         
         while True:
+            show_api_metrics_after_action()
+            
             print(f"\n{'='*20} ACCOUNTS & DOMAINS MANAGEMENT {'='*20}")
             print("🔍 Domain Search & Management:")
             print("1.  🌐 Search domain across all servers")
@@ -3383,7 +2770,7 @@ def main():
             print("3.  🎯 Advanced domain search")
             print("4.  📊 Domain statistics report")
             print("5.  🔍 List all available domains (Main + Subdomains)")
-            print("6.  🔎 Search domains by keyword")
+            print("6.  🔎 Search domains by keyword (interactive)")
             print("7.  🧪 Test subdomain loading for specific domain")
             
             print("\n👥 Account Management:")
@@ -3407,6 +2794,9 @@ def main():
             print("19. 🔑 Bulk SSH management")
             print("20. 🐘 Bulk PHP management")
             
+            print("\n🗄️  Inventory:")
+            print("21. 🗄️  Fleet inventory (local SQLite cache)")
+            
             print("\n0.  🚪 Exit")
             print("=" * 75)
             
@@ -3478,21 +2868,18 @@ def main():
                 list_all_available_domains(servers)
 
             elif choice == "6":
-                keyword = input("\n🔍 Enter keyword to search for domains: ").strip()
-                if keyword:
-                    from common_functions import search_domains_by_keyword
-                    search_domains_by_keyword(servers, keyword)
-                else:
-                    print("❌ Keyword cannot be empty")
+                interactive_domain_search(servers)
 
             elif choice == "7":
                 domain = input("\n🧪 Enter domain to test subdomain loading: ").strip()
                 if domain:
-                    from common_functions import test_subdomain_loading
-                    # البحث عن السيرفر أولاً
-                    server, acct, server_name = find_server_by_domain(domain, servers, include_subdomains=False)
+                    # البحث عن السيرفر أولاً ثم تحميل دومينات الحساب عبر DomainInfo::list_domains
+                    server, acct, server_name = find_server_by_domain(domain, servers, search_mode="fast", first_match=True)
                     if server:
-                        test_subdomain_loading(server, domain)
+                        account_domains = list_account_domains(server, acct["user"])
+                        print(f"\n📋 {len(account_domains)} addon/parked/sub domain(s) for {acct['user']} on Server {server_name}:")
+                        for record in account_domains:
+                            print(f"   • {record.domain} ({record.type})")
                     else:
                         print(f"❌ Domain {domain} not found on any server")
                 else:
@@ -3570,6 +2957,9 @@ def main():
             elif choice == "20":
                 bulk_php_management_menu(servers)
 
+            elif choice == "21":
+                inventory_management_menu(servers)
+
             elif choice == "0":
                 print("👋 Goodbye!")
                 logging.info("Accounts & Domains Manager closed")
@@ -2,6 +2,7 @@
 # === الدوال المشتركة لجميع سكريبتات WHM ===
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import urllib3
 from openpyxl import Workbook
@@ -12,12 +13,28 @@ import csv
 import getpass
 import sys
 import time
+import re
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlencode
 from fnmatch import fnmatch
 import string
 import secrets
+import atexit
+import sqlite3
+import copy
+from collections import OrderedDict
+import asyncio
+import bisect
+from array import array
+import operator
+from collections import Counter
+
+# numpy اختياري: جدول الحسابات العمودي يعمل بقوائم Python إذا لم يكن مثبتاً
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -42,22 +59,434 @@ def load_servers_config():
         print("Please create servers_config.py with your server configuration.")
         sys.exit(1)
 
+# === جلسات HTTP المشتركة (keep-alive) ===
+# عدد الاتصالات المفتوحة لكل سيرفر (يمكن تغييره لكل سيرفر عبر pool_size في servers_config)
+API_POOL_MAXSIZE = 16
+API_POOL_CONNECTIONS = 1
+
+_server_sessions = {}
+_server_sessions_lock = threading.Lock()
+
+def get_server_session(server):
+    """جلب جلسة HTTP مشتركة لكل سيرفر لإعادة استخدام اتصالات TCP/TLS"""
+    key = (server['ip'], server['token'])
+    with _server_sessions_lock:
+        session = _server_sessions.get(key)
+        if session is None:
+            pool_size = int(server.get('pool_size', API_POOL_MAXSIZE))
+            adapter = HTTPAdapter(
+                pool_connections=API_POOL_CONNECTIONS,
+                pool_maxsize=pool_size,
+                max_retries=0
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.headers.update({"Authorization": f"WHM root:{server['token']}"})
+            _server_sessions[key] = session
+            logging.info(f"Opened HTTP session pool for {server['ip']} (size {pool_size})")
+        return session
+
+def close_server_sessions():
+    """إغلاق جميع جلسات HTTP المفتوحة"""
+    with _server_sessions_lock:
+        for session in _server_sessions.values():
+            try:
+                session.close()
+            except Exception:
+                pass
+        _server_sessions.clear()
+
+atexit.register(close_server_sessions)
+
+# === مقاييس استدعاءات API (عدد / أخطاء / حجم / زمن) ===
+# حدود الـ histogram بالمللي ثانية
+API_METRICS_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# WHM_API_METRICS=1 لعرض الملخص بعد كل عملية، أو export لحفظه أيضاً في reports
+API_METRICS_MODE = os.environ.get("WHM_API_METRICS", "").lower()
+
+_api_metrics = {}
+_api_metrics_lock = threading.Lock()
+
+def _get_api_metric(server, label):
+    """جلب سجل المقاييس لـ (السيرفر، الدالة) - يجب استدعاؤها داخل القفل"""
+    key = (server['ip'], label)
+    metric = _api_metrics.get(key)
+    if metric is None:
+        metric = {"calls": 0, "errors": 0, "bytes": 0, "total_time": 0.0, "max_time": 0.0,
+                  "buckets": [0] * (len(API_METRICS_BUCKETS_MS) + 1)}
+        _api_metrics[key] = metric
+    return metric
+
+def record_api_call(server, label, elapsed, is_error):
+    """تسجيل استدعاء API في المقاييس"""
+    elapsed_ms = elapsed * 1000
+    bucket = len(API_METRICS_BUCKETS_MS)
+    for i, bound in enumerate(API_METRICS_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            bucket = i
+            break
+    with _api_metrics_lock:
+        metric = _get_api_metric(server, label)
+        metric["calls"] += 1
+        if is_error:
+            metric["errors"] += 1
+        metric["total_time"] += elapsed
+        metric["max_time"] = max(metric["max_time"], elapsed)
+        metric["buckets"][bucket] += 1
+
+def record_api_bytes(server, label, size):
+    """تسجيل حجم الاستجابة المستلمة"""
+    with _api_metrics_lock:
+        _get_api_metric(server, label)["bytes"] += size
+
+def _metric_percentile(metric, percentile):
+    """تقدير النسبة المئوية للزمن (بالمللي ثانية) من الـ histogram"""
+    if not metric["calls"]:
+        return 0
+    target = metric["calls"] * percentile / 100
+    cumulative = 0
+    for i, count in enumerate(metric["buckets"]):
+        cumulative += count
+        if cumulative >= target:
+            if i < len(API_METRICS_BUCKETS_MS):
+                return min(API_METRICS_BUCKETS_MS[i], metric["max_time"] * 1000)
+            break
+    return metric["max_time"] * 1000
+
+def get_api_metrics_rows():
+    """صفوف المقاييس مرتبة حسب إجمالي الزمن"""
+    with _api_metrics_lock:
+        items = [(key, dict(metric, buckets=list(metric["buckets"]))) for key, metric in _api_metrics.items()]
+    
+    rows = []
+    for (ip, label), metric in sorted(items, key=lambda item: item[1]["total_time"], reverse=True):
+        rows.append([
+            ip, label, metric["calls"], metric["errors"],
+            round(metric["bytes"] / 1024, 1),
+            round(metric["total_time"], 2),
+            round(_metric_percentile(metric, 50)),
+            round(_metric_percentile(metric, 95)),
+            round(_metric_percentile(metric, 99)),
+            round(metric["max_time"] * 1000)
+        ])
+    return rows
+
+API_METRICS_HEADERS = ["Server", "Function", "Calls", "Errors", "KB Received", "Total Time (s)",
+                       "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)"]
+
+def print_api_metrics_summary():
+    """عرض ملخص مقاييس استدعاءات API"""
+    rows = get_api_metrics_rows()
+    if not rows:
+        return
+    
+    print(f"\n📈 API Calls Summary:")
+    print("-" * 110)
+    print(f"{'Server':<16} {'Function':<36} {'Calls':>6} {'Errors':>6} {'KB':>9} {'Total s':>8} {'p50':>6} {'p95':>6} {'p99':>6}")
+    print("-" * 110)
+    for row in rows:
+        print(f"{row[0]:<16} {row[1][:36]:<36} {row[2]:>6} {row[3]:>6} {row[4]:>9} {row[5]:>8} {row[6]:>6} {row[7]:>6} {row[8]:>6}")
+    print("-" * 110)
+
+def export_api_metrics(format_type="csv"):
+    """تصدير مقاييس استدعاءات API إلى مجلد reports"""
+    rows = get_api_metrics_rows()
+    if not rows:
+        print("ℹ️  No API calls recorded yet")
+        return None
+    if format_type == "excel":
+        return export_to_excel(rows, API_METRICS_HEADERS, "api_metrics", "API Metrics")
+    return export_to_csv(rows, API_METRICS_HEADERS, "api_metrics")
+
+def reset_api_metrics():
+    """مسح جميع المقاييس المسجلة"""
+    with _api_metrics_lock:
+        _api_metrics.clear()
+
+def show_api_metrics_after_action():
+    """عرض (وتصدير) المقاييس بعد كل عملية من القائمة إذا كان WHM_API_METRICS مفعلاً"""
+    if API_METRICS_MODE not in ("1", "export"):
+        return
+    print_api_metrics_summary()
+    if API_METRICS_MODE == "export" and _api_metrics:
+        export_api_metrics()
+    reset_api_metrics()
+
+# === قاطع الدائرة لكل سيرفر (circuit breaker) ===
+# عدد الأخطاء المتتالية قبل فتح الدائرة، ومدة الانتظار قبل إعادة المحاولة (تتضاعف حتى الحد الأقصى)
+CIRCUIT_FAILURE_THRESHOLD = 2
+CIRCUIT_BASE_BACKOFF = 30
+CIRCUIT_MAX_BACKOFF = 600
+CIRCUIT_OPEN_ERROR = "Server unavailable (circuit open)"
+
+_server_circuits = {}
+_server_circuits_lock = threading.Lock()
+
+def _get_circuit(server):
+    """جلب حالة الدائرة للسيرفر (يجب استدعاؤها داخل القفل)"""
+    circuit = _server_circuits.get(server['ip'])
+    if circuit is None:
+        circuit = {"state": "closed", "failures": 0, "retry_at": 0, "backoff": CIRCUIT_BASE_BACKOFF, "probing": False}
+        _server_circuits[server['ip']] = circuit
+    return circuit
+
+def circuit_allows_request(server):
+    """هل يُسمح بإرسال طلب للسيرفر؟ (مغلقة أو حان وقت محاولة نصف مفتوحة)"""
+    with _server_circuits_lock:
+        circuit = _get_circuit(server)
+        if circuit["state"] == "closed":
+            return True
+        if circuit["state"] == "open" and time.time() >= circuit["retry_at"]:
+            circuit["state"] = "half_open"
+        if circuit["state"] == "half_open" and not circuit["probing"]:
+            # طلب تجريبي واحد فقط في نفس الوقت
+            circuit["probing"] = True
+            logging.info(f"Circuit half-open for {server['ip']}, sending probe request")
+            return True
+        return False
+
+def record_server_success(server):
+    """تسجيل نجاح الاتصال وإغلاق الدائرة"""
+    with _server_circuits_lock:
+        circuit = _get_circuit(server)
+        if circuit["state"] != "closed":
+            logging.info(f"Circuit closed for {server['ip']}")
+        circuit.update(state="closed", failures=0, backoff=CIRCUIT_BASE_BACKOFF, probing=False)
+
+def record_server_failure(server):
+    """تسجيل فشل الاتصال وفتح الدائرة عند تجاوز الحد"""
+    with _server_circuits_lock:
+        circuit = _get_circuit(server)
+        circuit["failures"] += 1
+        if circuit["state"] == "half_open":
+            # فشل الطلب التجريبي: مضاعفة مدة الانتظار
+            circuit["backoff"] = min(circuit["backoff"] * 2, CIRCUIT_MAX_BACKOFF)
+        elif circuit["failures"] < CIRCUIT_FAILURE_THRESHOLD:
+            return
+        circuit.update(state="open", retry_at=time.time() + circuit["backoff"], probing=False)
+        logging.warning(f"Circuit open for {server['ip']} after {circuit['failures']} failures, retry in {circuit['backoff']}s")
+
+def get_server_circuit_state(server):
+    """حالة الدائرة الحالية للسيرفر: closed / open / half_open"""
+    with _server_circuits_lock:
+        return _get_circuit(server)["state"]
+
+def reset_server_circuit(server=None):
+    """إعادة ضبط الدائرة لسيرفر معين أو لجميع السيرفرات"""
+    with _server_circuits_lock:
+        if server is None:
+            _server_circuits.clear()
+        else:
+            _server_circuits.pop(server['ip'], None)
+
+def _api_http_get(server, url, params, timeout, label):
+    """تنفيذ طلب GET عبر الجلسة المشتركة مع تسجيل النتيجة في قاطع الدائرة"""
+    session = get_server_session(server)
+    try:
+        response = session.get(url, params=params, verify=False, timeout=timeout)
+    except Exception:
+        # أي خطأ (مهلة، اتصال، SSL، ترميز...) يُسجل فشلاً حتى لا يبقى الطلب التجريبي معلقاً
+        record_server_failure(server)
+        raise
+    if response.status_code >= 500:
+        record_server_failure(server)
+    else:
+        record_server_success(server)
+    record_api_bytes(server, label, len(response.content))
+    response.raise_for_status()
+    return response.json()
+
+# === كاش الاستجابات لدوال WHM القرائية ===
+# مدة صلاحية الكاش بالثواني لكل دالة (الدوال غير المذكورة لا يتم تخزينها)
+API_CACHE_TTLS = {
+    "listaccts": 60,
+    "get_domain_info": 60,
+    "version": 300,
+    "loadavg": 15,
+    "gethostname": 3600,
+}
+API_CACHE_MAX_ENTRIES = 256
+# الدوال التي تغير بيانات الحسابات وتلغي كاش السيرفر
+API_CACHE_INVALIDATING_FUNCTIONS = {
+    "suspendacct", "unsuspendacct", "modifyacct", "createacct", "removeacct", "changepackage",
+}
+
+_api_cache = OrderedDict()
+_api_cache_lock = threading.Lock()
+
+def _readonly_cached_result(self, *args, **kwargs):
+    raise TypeError("Cached API results are read-only - use copy.deepcopy() before modifying")
+
+class _FrozenDict(dict):
+    """dict للقراءة فقط - نتائج الكاش تُشارك بين المستدعين بدون نسخ"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _readonly_cached_result
+    clear = pop = popitem = setdefault = update = _readonly_cached_result
+    
+    def __copy__(self):
+        return dict(self)
+    
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+class _FrozenList(list):
+    """list للقراءة فقط - نتائج الكاش تُشارك بين المستدعين بدون نسخ"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly_cached_result
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly_cached_result
+    
+    def __copy__(self):
+        return list(self)
+    
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(value, memo) for value in self]
+
+def _freeze_result(value):
+    """تحويل الاستجابة لنسخة للقراءة فقط مرة واحدة عند الحفظ في الكاش"""
+    if isinstance(value, dict):
+        return _FrozenDict((key, _freeze_result(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return _FrozenList(_freeze_result(item) for item in value)
+    return value
+
+def _api_cache_key(server, function, params):
+    """مفتاح الكاش: السيرفر + الدالة + المعاملات"""
+    return (server['ip'], function, tuple(sorted((str(k), str(v)) for k, v in params.items())))
+
+def _api_cache_get(key):
+    """جلب نتيجة من الكاش إذا كانت صالحة (نفس الكائن المجمد بدون نسخ)"""
+    with _api_cache_lock:
+        entry = _api_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            del _api_cache[key]
+            return None
+        _api_cache.move_to_end(key)
+    return value
+
+def _api_cache_put(key, ttl, value):
+    """حفظ نتيجة مجمدة في الكاش مع حذف الأقدم عند تجاوز الحد - يرجع النسخة المجمدة"""
+    value = _freeze_result(value)
+    with _api_cache_lock:
+        _api_cache[key] = (time.time() + ttl, value)
+        _api_cache.move_to_end(key)
+        while len(_api_cache) > API_CACHE_MAX_ENTRIES:
+            _api_cache.popitem(last=False)
+    return value
+
+def clear_api_cache(server=None):
+    """مسح الكاش لسيرفر معين أو لجميع السيرفرات"""
+    with _api_cache_lock:
+        if server is None:
+            _api_cache.clear()
+            return
+        for key in [k for k in _api_cache if k[0] == server['ip']]:
+            del _api_cache[key]
+    logging.info(f"API cache cleared for {server['ip']}")
+
+# === دمج الطلبات المتطابقة المتزامنة (single-flight) ===
+# بادئات الدوال القرائية الآمنة للدمج (WHM و cPanel)
+SINGLE_FLIGHT_READ_PREFIXES = ("list", "get", "show")
+SINGLE_FLIGHT_WHM_FUNCTIONS = {"accountsummary", "version", "loadavg", "gethostname", "servicestatus"}
+
+_inflight_calls = {}
+_inflight_lock = threading.Lock()
+
+def _is_single_flight_call(function):
+    """هل الدالة قرائية ويمكن دمج طلباتها المتزامنة؟"""
+    return (function in SINGLE_FLIGHT_WHM_FUNCTIONS
+            or function in API_CACHE_TTLS
+            or function.startswith(SINGLE_FLIGHT_READ_PREFIXES))
+
+def _single_flight(key, func):
+    """تنفيذ func مرة واحدة لجميع الطلبات المتطابقة الجارية في نفس الوقت"""
+    with _inflight_lock:
+        call = _inflight_calls.get(key)
+        leader = call is None
+        if leader:
+            call = {"event": threading.Event(), "result": None, "waiters": 0}
+            _inflight_calls[key] = call
+        else:
+            call["waiters"] += 1
+    
+    if not leader:
+        call["event"].wait()
+        return copy.deepcopy(call["result"])
+    
+    try:
+        call["result"] = func()
+    except Exception as e:
+        call["result"] = {"error": str(e)}
+    finally:
+        with _inflight_lock:
+            del _inflight_calls[key]
+            shared = call["waiters"] > 0
+        call["event"].set()
+    
+    # نسخة منفصلة للطلب الأول حتى لا يتأثر الباقون بأي تعديل
+    return copy.deepcopy(call["result"]) if shared else call["result"]
+
 # === دوال WHM الأساسية ===
-def whm_api_call(server, function, params=None, timeout=30):
-    """استدعاء WHM API مع معالجة الأخطاء"""
+def whm_api_call(server, function, params=None, timeout=30, use_cache=True):
+    """استدعاء WHM API مع معالجة الأخطاء والكاش للدوال القرائية"""
     if params is None:
         params = {}
     
+    _invalidate_for_call(server, function, params)
+    
+    ttl = API_CACHE_TTLS.get(function) if use_cache else None
+    if ttl:
+        cache_key = _api_cache_key(server, function, params)
+        cached = _api_cache_get(cache_key)
+        if cached is not None:
+            logging.info(f"WHM API cache hit: {function} on {server['ip']}")
+            return cached
+    
+    if _is_single_flight_call(function):
+        flight_key = ("whm",) + _api_cache_key(server, function, params)
+        result = _single_flight(flight_key, lambda: _whm_api_request(server, function, params, timeout))
+    else:
+        result = _whm_api_request(server, function, params, timeout)
+    
+    if ttl and "error" not in result:
+        # المستدعي الأول يأخذ نفس النسخة المجمدة حتى يكون السلوك واحداً مع/بدون كاش
+        result = _api_cache_put(cache_key, ttl, result)
+    if function in API_CACHE_INVALIDATING_FUNCTIONS:
+        # مسح أي قراءة تمت أثناء تنفيذ العملية
+        clear_api_cache(server)
+    return result
+
+def _invalidate_for_call(server, function, params):
+    """مسح الكاش والفهارس التي تتأثر بدالة WHM تغير بيانات الحسابات"""
+    if function in API_CACHE_INVALIDATING_FUNCTIONS:
+        clear_api_cache(server)
+        invalidate_account_table()
+    if function in ("createacct", "removeacct") or (function == "modifyacct" and "DNS" in params):
+        invalidate_account_domain_index()
+        invalidate_domain_search_index()
+    if function == "removeacct" or (function == "modifyacct" and "DNS" in params):
+        invalidate_mailbox_index()
+
+def _whm_api_request(server, function, params, timeout):
+    """تنفيذ طلب WHM API فعلياً (بدون كاش) مع تسجيل المقاييس"""
+    if not circuit_allows_request(server):
+        return {"error": CIRCUIT_OPEN_ERROR}
+    
+    start = time.time()
+    result = _send_whm_request(server, function, params, timeout)
+    record_api_call(server, function, time.time() - start, "error" in result)
+    return result
+
+def _send_whm_request(server, function, params, timeout):
+    """إرسال طلب WHM API ومعالجة الاستجابة"""
     try:
         BASE_URL = f"https://{server['ip']}:2087/json-api"
-        HEADERS = {"Authorization": f"WHM root:{server['token']}"}
         url = f"{BASE_URL}/{function}?api.version=1"
         
         logging.info(f"Calling WHM API: {function} on {server['ip']}")
-        response = requests.get(url, headers=HEADERS, params=params, verify=False, timeout=timeout)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = _api_http_get(server, url, params, timeout, function)
         
         # التحقق من وجود رسالة خطأ في الاستجابة
         if 'error' in result:
@@ -93,34 +522,448 @@ def whm_api_call(server, function, params=None, timeout=30):
 
 
 
-def test_server_connection(server):
-    """اختبار الاتصال بالسيرفر"""
-    result = whm_api_call(server, "version")
-    if "error" not in result:
-        version = result.get("data", {}).get("version", "Unknown")
-        logging.info(f"Server {server['ip']} is online - WHM Version: {version}")
-        return True
+# === تجميع استدعاءات WHM في طلب batch واحد ===
+# عدد الأوامر في كل طلب batch (الأوامر ترسل في رابط GET فلا يجب أن يطول كثيراً)
+WHM_BATCH_SIZE = 50
+WHM_BATCH_TIMEOUT = 120
+
+def _batch_command(function, params):
+    """صيغة الأمر داخل batch: function?param=value&..."""
+    return f"{function}?{urlencode(params)}" if params else function
+
+def _send_whm_batch_request(server, commands, timeout):
+    """إرسال طلب batch واحد - يرجع الاستجابة كاملة حتى عند فشل أحد الأوامر"""
+    if not circuit_allows_request(server):
+        return {"error": CIRCUIT_OPEN_ERROR}
+    
+    url = f"https://{server['ip']}:2087/json-api/batch?api.version=1"
+    start = time.time()
+    try:
+        logging.info(f"Calling WHM API: batch ({len(commands)} commands) on {server['ip']}")
+        result = _api_http_get(server, url, {"command": commands}, timeout, "batch")
+    except requests.exceptions.Timeout:
+        logging.error(f"Timeout error connecting to {server['ip']}")
+        result = {"error": "Connection timeout"}
+    except requests.exceptions.ConnectionError:
+        logging.error(f"Connection error to {server['ip']}")
+        result = {"error": "Connection failed"}
+    except Exception as e:
+        logging.error(f"Error calling WHM API batch: {str(e)}")
+        result = {"error": str(e)}
+    failed = "error" in result or result.get("metadata", {}).get("result") == 0
+    record_api_call(server, "batch", time.time() - start, failed)
+    return result
+
+def _batch_command_result(result):
+    """نتيجة أمر واحد من batch بنفس صيغة whm_api_call (خطأ الأمر يتحول لـ error)"""
+    if not isinstance(result, dict):
+        return {"error": "Invalid response format"}
+    metadata = result.get("metadata", {})
+    if metadata.get("result") == 0:
+        return {"error": metadata.get("reason", "Unknown error")}
+    return result
+
+def whm_batch_call(server, calls, batch_size=WHM_BATCH_SIZE, timeout=WHM_BATCH_TIMEOUT):
+    """تنفيذ عدة استدعاءات WHM على سيرفر واحد في طلبات batch قليلة
+    
+    calls قائمة (function, params) والنتائج ترجع بنفس الترتيب وبنفس صيغة whm_api_call.
+    WHM يوقف الـ batch عند أول أمر فاشل، فالأوامر التي لم تنفذ بعده ترسل في الطلب التالي.
+    إذا كان batch غير مدعوم على السيرفر يتم تنفيذ الاستدعاءات واحداً تلو الآخر.
+    """
+    results = [None] * len(calls)
+    key = capability_key("batch")
+    # مسح الكاش والفهارس مرة واحدة لكل نوع أمر
+    for function, params in {(f, "DNS" in (p or {})): (f, p or {}) for f, p in calls}.values():
+        _invalidate_for_call(server, function, params)
+    
+    remaining = list(range(len(calls)))
+    while remaining and get_server_capability(server, key) is not False:
+        chunk = remaining[:batch_size]
+        response = _send_whm_batch_request(
+            server, [_batch_command(*calls[i]) for i in chunk], timeout)
+        command_results = response.get("data", {}).get("result") if isinstance(response.get("data"), dict) else None
+        
+        if not command_results:
+            error = response.get("error") or response.get("metadata", {}).get("reason", "Invalid response format")
+            if _is_unsupported_error({"error": error}):
+                set_server_capability(server, key, False)
+                break
+            if "error" in response:
+                # خطأ اتصال: لم يصل أي أمر للسيرفر
+                for i in chunk:
+                    results[i] = {"error": error}
+                remaining = remaining[len(chunk):]
+            else:
+                # فشل من WHM بدون نتائج: الأمر الأول هو الفاشل والباقي لم ينفذ بعد
+                results[chunk[0]] = {"error": error}
+                remaining = remaining[1:]
+            continue
+        
+        set_server_capability(server, key, True)
+        for i, command_result in zip(chunk, command_results):
+            results[i] = _batch_command_result(command_result)
+        remaining = remaining[min(len(command_results), len(chunk)):]
+    
+    # السيرفر لا يدعم batch: استدعاء كل دالة على حدة بالتوازي مع حد للسيرفر
+    fallback = run_api_calls_parallel([("whm", server, function, params) for function, params in (calls[i] for i in remaining)],
+                                      BULK_PER_SERVER_LIMIT)
+    for i, result in zip(remaining, fallback):
+        results[i] = result
+    
+    for function, params in calls:
+        if function in API_CACHE_INVALIDATING_FUNCTIONS:
+            # مسح أي قراءة تمت أثناء تنفيذ العمليات
+            clear_api_cache(server)
+            break
+    return results
+
+# === خريطة حالة السيرفرات (liveness) ===
+# مدة صلاحية نتيجة الفحص بالثواني، ومهلة الاتصال/القراءة لطلب الفحص
+LIVENESS_CACHE_SECONDS = 60
+LIVENESS_CONNECT_TIMEOUT = 3
+LIVENESS_READ_TIMEOUT = 10
+
+_server_liveness = {}
+_server_liveness_lock = threading.Lock()
+
+# نسخة WHM لكل سيرفر في الذاكرة: {ip: (version, fetched_at)} - الفشل يُحفظ كـ None لمدة أقصر
+SERVER_VERSION_CACHE_SECONDS = 3600
+_server_versions = {}
+_server_versions_lock = threading.Lock()
+
+def probe_server(server):
+    """فحص السيرفر فعلياً وتسجيل الحالة وزمن الاستجابة (RTT)"""
+    start = time.time()
+    result = whm_api_call(server, "version", timeout=(LIVENESS_CONNECT_TIMEOUT, LIVENESS_READ_TIMEOUT), use_cache=False)
+    rtt = time.time() - start
+    
+    online = "error" not in result
+    entry = {
+        "online": online,
+        "rtt": rtt if online else None,
+        "version": result.get("data", {}).get("version", "Unknown") if online else None,
+        "error": result.get("error") if not online else None,
+        "checked_at": time.time()
+    }
+    with _server_liveness_lock:
+        _server_liveness[server['ip']] = entry
+    if online and entry["version"] != "Unknown":
+        with _server_versions_lock:
+            _server_versions[server['ip']] = (entry["version"], entry["checked_at"])
+    
+    if online:
+        logging.info(f"Server {server['ip']} is online - WHM Version: {entry['version']} (RTT {rtt * 1000:.0f}ms)")
     else:
         logging.error(f"Server {server['ip']} is offline or unreachable")
-        return False
+    return entry
 
-def list_accounts(server):
-    """جلب قائمة الحسابات الأساسية"""
-    data = whm_api_call(server, "listaccts")
+def _get_cached_liveness(server, max_age):
+    """جلب نتيجة الفحص المحفوظة إذا كانت حديثة"""
+    with _server_liveness_lock:
+        entry = _server_liveness.get(server['ip'])
+    if entry and time.time() - entry["checked_at"] < max_age:
+        return entry
+    return None
+
+def get_server_liveness(servers, max_age=LIVENESS_CACHE_SECONDS):
+    """فحص جميع السيرفرات بالتوازي وإرجاع {name: {online, rtt, version, ...}}"""
+    liveness = {}
+    stale = {}
+    for name, server in servers.items():
+        entry = _get_cached_liveness(server, max_age)
+        if entry:
+            liveness[name] = entry
+        else:
+            stale[name] = server
+    
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            futures = {executor.submit(probe_server, server): name for name, server in stale.items()}
+            for future in as_completed(futures):
+                liveness[futures[future]] = future.result()
+    
+    # نفس ترتيب السيرفرات في الإعدادات
+    return {name: liveness[name] for name in servers}
+
+def clear_server_liveness():
+    """مسح نتائج فحص السيرفرات المحفوظة"""
+    with _server_liveness_lock:
+        _server_liveness.clear()
+
+def test_server_connection(server):
+    """اختبار الاتصال بالسيرفر (يستخدم نتيجة الفحص الحديثة إن وجدت)"""
+    entry = _get_cached_liveness(server, LIVENESS_CACHE_SECONDS)
+    if entry is None:
+        entry = probe_server(server)
+    return entry["online"]
+
+# === سجل قدرات السيرفرات (أي دوال API مدعومة لكل نسخة WHM) ===
+CAPABILITIES_FILE = "whm_capabilities.json"
+# أجزاء من رسائل الخطأ التي تعني أن الدالة غير موجودة (وليس خطأ مؤقت)
+UNSUPPORTED_ERROR_MARKERS = (
+    "unknown app", "unknown function", "could not find function", "could not find the function",
+    "failed to load module", "no such function", "404 client error",
+)
+
+_server_capabilities = None
+_server_capabilities_lock = threading.Lock()
+
+def _load_capabilities():
+    """تحميل سجل القدرات من الملف (مرة واحدة)"""
+    global _server_capabilities
+    if _server_capabilities is None:
+        try:
+            with open(CAPABILITIES_FILE, 'r', encoding='utf-8') as f:
+                _server_capabilities = json.load(f)
+        except (OSError, ValueError):
+            _server_capabilities = {}
+    return _server_capabilities
+
+def _save_capabilities():
+    """حفظ سجل القدرات في الملف"""
+    try:
+        with open(CAPABILITIES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(_server_capabilities, f, indent=2, ensure_ascii=False)
+    except OSError as e:
+        logging.warning(f"Could not save capabilities file: {str(e)}")
+
+def _server_version(server):
+    """نسخة WHM للسيرفر (من نتيجة الفحص أو كاش النسخ، وإلا طلب version واحد يُحفظ مع TTL)"""
+    with _server_liveness_lock:
+        entry = _server_liveness.get(server['ip'])
+    if entry and entry.get("version") and entry["version"] != "Unknown":
+        return entry["version"]
+    with _server_versions_lock:
+        cached = _server_versions.get(server['ip'])
+    if cached:
+        version, fetched_at = cached
+        max_age = SERVER_VERSION_CACHE_SECONDS if version else LIVENESS_CACHE_SECONDS
+        if time.time() - fetched_at < max_age:
+            return version
+    result = whm_api_call(server, "version", use_cache=False)
+    version = result.get("data", {}).get("version") if "error" not in result else None
+    with _server_versions_lock:
+        _server_versions[server['ip']] = (version, time.time())
+    return version
+
+def _server_capability_entry(server, version):
+    """سجل قدرات السيرفر - يتم تصفيره عند تغير نسخة WHM (يجب استدعاؤها داخل القفل)"""
+    capabilities = _load_capabilities()
+    entry = capabilities.get(server['ip'])
+    if version and (entry is None or entry.get("version") != version):
+        entry = {"version": version, "functions": {}}
+        capabilities[server['ip']] = entry
+    return entry
+
+def capability_key(function, module=None, variant=None):
+    """اسم القدرة: whm:function أو cpanel:Module::function مع المتغير (#variant) إن وجد"""
+    key = f"cpanel:{module}::{function}" if module else f"whm:{function}"
+    return f"{key}#{variant}" if variant else key
+
+def get_server_capability(server, key):
+    """True/False إذا كانت القدرة معروفة، None إذا لم تُجرب بعد"""
+    # النسخة قد تحتاج طلب WHM، فتُجلب خارج القفل حتى لا يوقف سيرفر بطيء باقي الخيوط
+    version = _server_version(server)
+    with _server_capabilities_lock:
+        entry = _server_capability_entry(server, version)
+        return entry["functions"].get(key) if entry else None
+
+def set_server_capability(server, key, supported):
+    """تسجيل نتيجة تجربة دالة على السيرفر"""
+    version = _server_version(server)
+    with _server_capabilities_lock:
+        entry = _server_capability_entry(server, version)
+        if entry is None or entry["functions"].get(key) == supported:
+            return
+        entry["functions"][key] = supported
+        _save_capabilities()
+    logging.info(f"Capability {key} on {server['ip']}: {'supported' if supported else 'unsupported'}")
+
+def clear_server_capabilities(server=None):
+    """مسح سجل القدرات لسيرفر واحد أو للكل"""
+    with _server_capabilities_lock:
+        capabilities = _load_capabilities()
+        if server is None:
+            capabilities.clear()
+        else:
+            capabilities.pop(server['ip'], None)
+        _save_capabilities()
+
+def _is_unsupported_error(result):
+    """هل الخطأ يعني أن الدالة غير مدعومة على هذا السيرفر؟"""
+    errors = [result.get("error")]
+    if isinstance(result.get("result"), dict):
+        errors.extend(result["result"].get("errors") or [])
+    if isinstance(result.get("cpanelresult"), dict):
+        errors.append(result["cpanelresult"].get("error"))
+    text = " ".join(str(e) for e in errors if e).lower()
+    return any(marker in text for marker in UNSUPPORTED_ERROR_MARKERS)
+
+def _learn_capability(server, key, result, is_error):
+    """تحديث سجل القدرات من نتيجة الاستدعاء (الأخطاء المؤقتة لا تغير شيئاً)"""
+    if not is_error:
+        set_server_capability(server, key, True)
+    elif _is_unsupported_error(result):
+        set_server_capability(server, key, False)
+
+def whm_api_call_capable(server, function, params=None, timeout=30, variant=None):
+    """استدعاء WHM API مع تخطي الدوال المعروف أنها غير مدعومة على السيرفر"""
+    key = capability_key(function, variant=variant)
+    if get_server_capability(server, key) is False:
+        return {"error": f"{function} is not supported on this server", "unsupported": True}
+    result = whm_api_call(server, function, params, timeout)
+    _learn_capability(server, key, result, "error" in result)
+    return result
+
+def cpanel_api_call_capable(server, cpanel_user, module, function, params=None, variant=None):
+    """استدعاء cPanel API مع تخطي الدوال المعروف أنها غير مدعومة على السيرفر"""
+    key = capability_key(function, module, variant)
+    if get_server_capability(server, key) is False:
+        return {"error": f"{module}::{function} is not supported on this server", "unsupported": True}
+    result = cpanel_api_call(server, cpanel_user, module, function, params)
+    _learn_capability(server, key, result, _is_cpanel_error(result))
+    return result
+
+def run_server_command(server, command):
+    """تنفيذ أمر على السيرفر عبر exec ثم shell - يرجع (output, method) أو (None, None)"""
+    for method in ("exec", "shell"):
+        result = whm_api_call_capable(server, method, {"command": command})
+        if "error" not in result:
+            data = result.get("data", "")
+            output = data.get("output", "") if isinstance(data, dict) else data
+            return output or "", method
+    return None, None
+
+# === تحديد الأعمدة المطلوبة من السيرفر (api.columns) ===
+# الأعمدة التي تحتاجها أغلب دوال البحث والتقارير من listaccts
+ACCOUNT_SUMMARY_FIELDS = ("user", "domain", "suspended", "plan", "diskused", "unix_startdate")
+# الأعمدة التي تستخدمها list_email_accounts من Email::list_pops
+EMAIL_ACCOUNT_FIELDS = ("email", "user", "domain", "diskused", "diskquota", "suspended")
+
+def _column_letter(index):
+    """a, b, ... z, aa, ab ... (تسمية WHM API 1 للأعمدة والفلاتر)"""
+    letters = string.ascii_lowercase
+    if index < len(letters):
+        return letters[index]
+    return letters[index // len(letters) - 1] + letters[index % len(letters)]
+
+def whm_columns_params(fields):
+    """معاملات WHM API 1 لإرجاع أعمدة محددة فقط"""
+    if not fields:
+        return {}
+    params = {"api.columns.enable": 1}
+    for i, field in enumerate(fields):
+        params[f"api.columns.{_column_letter(i)}"] = field
+    return params
+
+def uapi_columns_params(fields):
+    """معاملات UAPI لإرجاع أعمدة محددة فقط"""
+    if not fields:
+        return {}
+    params = {"api.columns": 1}
+    for i, field in enumerate(fields, 1):
+        params[f"api.columns_{i}"] = field
+    return params
+
+def list_accounts(server, fields=None, use_cache=True):
+    """جلب قائمة الحسابات الأساسية (fields لطلب أعمدة محددة فقط)"""
+    data = whm_api_call(server, "listaccts", whm_columns_params(fields), use_cache=use_cache)
     if "error" in data:
         return []
     return data.get("data", {}).get("acct", [])
 
+def list_accounts_checked(server, fields=None, use_cache=True):
+    """مثل list_accounts لكن يرجع (accounts, error) ليميز بين سيرفر بدون حسابات وفشل الطلب"""
+    data = whm_api_call(server, "listaccts", whm_columns_params(fields), use_cache=use_cache)
+    if "error" in data:
+        return [], data["error"]
+    return data.get("data", {}).get("acct", []), None
+
+# === الفلترة على السيرفر (api.filter) ===
+def whm_filter_params(filters):
+    """معاملات WHM API 1 للفلترة على السيرفر - filters: [(field, type, value), ...]"""
+    if not filters:
+        return {}
+    params = {"api.filter.enable": 1}
+    for i, (field, filter_type, value) in enumerate(filters):
+        letter = _column_letter(i)
+        params[f"api.filter.{letter}.field"] = field
+        params[f"api.filter.{letter}.type"] = filter_type
+        params[f"api.filter.{letter}.arg0"] = value
+    return params
 
+def find_accounts(server, domain=None, user=None, domain_contains=None, plan=None, suspended=None, fields=None):
+    """البحث عن الحسابات مع تنفيذ الفلترة على السيرفر بدلاً من تحميل كل الحسابات"""
+    filters = []
+    if domain:
+        filters.append(("domain", "eq", domain.lower()))
+    if user:
+        filters.append(("user", "eq", user))
+    if domain_contains:
+        filters.append(("domain", "contains", domain_contains.lower()))
+    if plan:
+        filters.append(("plan", "contains", plan))
+    if suspended is not None:
+        filters.append(("suspended", "eq", 1 if suspended else 0))
+    
+    params = whm_filter_params(filters)
+    params.update(whm_columns_params(fields))
+    data = whm_api_call(server, "listaccts", params)
+    if "error" in data:
+        return []
+    
+    # تحقق محلي (السيرفرات القديمة قد تتجاهل api.filter)
+    matches = []
+    for acct in data.get("data", {}).get("acct", []):
+        acct_domain = acct.get("domain", "").lower()
+        if domain and acct_domain != domain.lower():
+            continue
+        if user and acct.get("user") != user:
+            continue
+        if domain_contains and domain_contains.lower() not in acct_domain:
+            continue
+        if plan and acct.get("plan", "").lower() != plan.lower():
+            continue
+        if suspended is not None and bool(int(acct.get("suspended", 0) or 0)) != bool(suspended):
+            continue
+        matches.append(acct)
+    return matches
 
 def cpanel_api_call(server, user, module, function, params=None, timeout=30):
     """استدعاء cPanel API مباشرة (كما كان في السكريبت القديم)"""
     if params is None:
         params = {}
     
+    if module == "Email" and function in MAILBOX_INDEX_INVALIDATING_FUNCTIONS:
+        invalidate_mailbox_index()
+    if function.startswith(SINGLE_FLIGHT_READ_PREFIXES):
+        flight_key = ("cpanel", user, module) + _api_cache_key(server, function, params)
+        return _single_flight(flight_key, lambda: _cpanel_api_request(server, user, module, function, params, timeout))
+    return _cpanel_api_request(server, user, module, function, params, timeout)
+
+def _cpanel_api_request(server, user, module, function, params, timeout):
+    """تنفيذ طلب cPanel API فعلياً مع تسجيل المقاييس"""
+    if not circuit_allows_request(server):
+        return {"error": CIRCUIT_OPEN_ERROR}
+    
+    start = time.time()
+    result = _send_cpanel_request(server, user, module, function, params, timeout)
+    record_api_call(server, f"{module}::{function}", time.time() - start, _is_cpanel_error(result))
+    return result
+
+def _is_cpanel_error(result):
+    """هل استجابة cPanel تحتوي على خطأ؟ (UAPI أو API2)"""
+    if "error" in result:
+        return True
+    if isinstance(result.get("result"), dict) and result["result"].get("status") == 0:
+        return True
+    event = result.get("cpanelresult", {}).get("event", {}) if isinstance(result.get("cpanelresult"), dict) else {}
+    return event.get("result") == 0
+
+def _send_cpanel_request(server, user, module, function, params, timeout):
+    """إرسال طلب cPanel API"""
     try:
         BASE_URL = f"https://{server['ip']}:2087/json-api/cpanel"
-        HEADERS = {"Authorization": f"WHM root:{server['token']}"}
         
         api_params = {
             "cpanel_jsonapi_user": user,
@@ -133,560 +976,392 @@ def cpanel_api_call(server, user, module, function, params=None, timeout=30):
         api_params.update(params)
         
         logging.info(f"Calling cPanel API: {module}::{function} for user {user}")
-        response = requests.get(BASE_URL, headers=HEADERS, params=api_params, verify=False, timeout=timeout)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = _api_http_get(server, BASE_URL, api_params, timeout, f"{module}::{function}")
         return result
         
     except Exception as e:
         logging.error(f"Error calling cPanel API: {str(e)}")
         return {"error": str(e)}
 
-def list_all_domains(server):
-    """جلب جميع الدومينات (الرئيسية + الصب دومين) من السيرفر"""
+# === عميل asyncio لاستدعاءات API المتوازية ===
+# الحد الأقصى للطلبات المتزامنة لكل سيرفر (أقل من حجم الـ pool حتى لا تنتظر الاتصالات)
+ASYNC_PER_SERVER_LIMIT = 8
+ASYNC_MAX_WORKERS = 64
+
+_async_api_executor = None
+_async_api_executor_lock = threading.Lock()
+
+def _get_async_api_executor():
+    """جلب الـ executor المشترك لاستدعاءات asyncio"""
+    global _async_api_executor
+    with _async_api_executor_lock:
+        if _async_api_executor is None:
+            _async_api_executor = ThreadPoolExecutor(max_workers=ASYNC_MAX_WORKERS, thread_name_prefix="whm-async")
+        return _async_api_executor
+
+def _get_server_semaphore(limiter, server):
+    """جلب Semaphore خاص بالسيرفر داخل نفس الـ event loop"""
+    if limiter is None:
+        return None
+    semaphore = limiter.get(server['ip'])
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limiter.get('_limit', ASYNC_PER_SERVER_LIMIT))
+        limiter[server['ip']] = semaphore
+    return semaphore
+
+async def _run_api_call_async(func, args, server, timeout, limiter):
+    """تشغيل استدعاء API متزامن داخل asyncio مع حد للسيرفر ومهلة"""
+    loop = asyncio.get_running_loop()
+    semaphore = _get_server_semaphore(limiter, server)
+    # المهلة قد تكون (connect, read) كما في requests
+    total_timeout = sum(timeout) if isinstance(timeout, tuple) else timeout
+    
+    async def _call():
+        return await asyncio.wait_for(
+            loop.run_in_executor(_get_async_api_executor(), func, *args), total_timeout + 5)
+    
     try:
-        # جلب الدومينات الرئيسية
-        main_domains = []
-        accounts = list_accounts(server)
-        for acct in accounts:
-            main_domains.append({
-                "domain": acct["domain"],
-                "user": acct["user"],
-                "type": "main",
-                "server": server
-            })
-        
-        # جلب الصب دومين باستخدام cPanel API
-        subdomains = []
-        try:
-            # محاولة جلب الصب دومين من جميع الحسابات
-            if accounts:
-                print(f"      🔍 Checking subdomains for {len(accounts)} accounts...")
-                for i, acct in enumerate(accounts, 1):
-                    try:
-                        print(f"         📋 Checking account {i}/{len(accounts)}: {acct['user']}")
-                        result = cpanel_api_call(server, acct["user"], "SubDomain", "listsubdomains")
-                        
-                        if result and "data" in result:
-                            print(f"         ✅ Found {len(result['data'])} subdomains for {acct['user']}")
-                            for subdomain in result["data"]:
-                                subdomains.append({
-                                    "domain": subdomain["domain"],
-                                    "user": acct["user"],
-                                    "type": "subdomain",
-                                    "server": server
-                                })
-                        elif result and "error" in result:
-                            print(f"         ⚠️  API error for {acct['user']}: {result['error']}")
-                        else:
-                            print(f"         ℹ️  No subdomains found for {acct['user']}")
-                    except Exception as e:
-                        print(f"         ❌ Error checking {acct['user']}: {e}")
-                        continue
-        except Exception as e:
-            print(f"      ❌ Error in subdomain loading: {e}")
-        
-        # محاولة استخدام WHM API كبديل لجلب الصب دومين
-        if not subdomains:
-            print(f"      🔍 Trying WHM API as alternative...")
-            try:
-                whm_result = whm_api_call(server, "get_domain_info")
-                if whm_result and "data" in whm_result:
-                    print(f"         📊 WHM API returned {len(whm_result['data'])} items")
-                    # يمكن إضافة معالجة إضافية هنا
-            except Exception as e:
-                print(f"         ❌ WHM API also failed: {e}")
-        
-        # محاولة البحث في الدومينات الرئيسية للبحث عن الصب دومين
-        if not subdomains:
-            print(f"      🔍 Searching main domains for subdomain patterns...")
-            for acct in accounts:
-                domain = acct["domain"]
-                # البحث عن أنماط الصب دومين
-                if "." in domain and domain.count(".") > 1:
-                    print(f"         🔍 Found potential subdomain: {domain}")
-                    subdomains.append({
-                        "domain": domain,
-                        "user": acct["user"],
-                        "type": "subdomain",
-                        "server": server
-                    })
-        
-        # محاولة جلب الصب دومين باستخدام طرق أخرى
-        if not subdomains:
-            print(f"      🔍 Trying alternative methods for subdomains...")
-            for acct in accounts:
-                try:
-                    # محاولة 1: SubDomain::listsubdomains
-                    result1 = cpanel_api_call(server, acct["user"], "SubDomain", "listsubdomains")
-                    if result1 and "data" in result1 and result1["data"]:
-                        print(f"         ✅ Method 1 (SubDomain::listsubdomains) found {len(result1['data'])} subdomains for {acct['user']}")
-                        for subdomain in result1["data"]:
-                            subdomains.append({
-                                "domain": subdomain["domain"],
-                                "user": acct["user"],
-                                "type": "subdomain",
-                                "server": server
-                            })
-                        continue
-                    
-                    # محاولة 2: SubDomain::list
-                    result2 = cpanel_api_call(server, acct["user"], "SubDomain", "list")
-                    if result2 and "data" in result2 and result2["data"]:
-                        print(f"         ✅ Method 2 (SubDomain::list) found {len(result2['data'])} subdomains for {acct['user']}")
-                        for subdomain in result2["data"]:
-                            subdomains.append({
-                                "domain": subdomain["domain"],
-                                "user": acct["user"],
-                                "type": "subdomain",
-                                "server": server
-                            })
-                        continue
-                    
-                    # محاولة 3: Addon::listaddondomains
-                    result3 = cpanel_api_call(server, acct["user"], "Addon", "listaddondomains")
-                    if result3 and "data" in result3 and result3["data"]:
-                        print(f"         ✅ Method 3 (Addon::listaddondomains) found {len(result3['data'])} addon domains for {acct['user']}")
-                        for addon in result3["data"]:
-                            subdomains.append({
-                                "domain": addon["domain"],
-                                "user": acct["user"],
-                                "type": "addon",
-                                "server": server
-                            })
-                        continue
-                    
-                    # محاولة 4: Park::listparkeddomains
-                    result4 = cpanel_api_call(server, acct["user"], "Park", "listparkeddomains")
-                    if result4 and "data" in result4 and result4["data"]:
-                        print(f"         ✅ Method 4 (Park::listparkeddomains) found {len(result4['data'])} parked domains for {acct['user']}")
-                        for parked in result4["data"]:
-                            subdomains.append({
-                                "domain": parked["domain"],
-                                "user": acct["user"],
-                                "type": "parked",
-                                "server": server
-                            })
-                        continue
-                    
-                    print(f"         ℹ️  No subdomains found for {acct['user']} using any method")
-                    
-                except Exception as e:
-                    print(f"         ❌ Error checking {acct['user']}: {e}")
-                    continue
-        
-        # محاولة خاصة للبحث في egypetoo.com
-        egypetoo_accounts = [acct for acct in accounts if "egypetoo.com" in acct["domain"]]
-        if egypetoo_accounts:
-            print(f"      🔍 Found egypetoo.com account, checking for subdomains...")
-            for acct in egypetoo_accounts:
-                print(f"         📋 Checking account: {acct['user']} ({acct['domain']})")
-                try:
-                    # محاولة جلب الصب دومين من egypetoo.com
-                    print(f"         🔍 Trying SubDomain::listsubdomains...")
-                    result = cpanel_api_call(server, acct["user"], "SubDomain", "listsubdomains")
-                    print(f"         📤 API Response: {result}")
-                    
-                    if result and "data" in result and result["data"]:
-                        print(f"         ✅ Found {len(result['data'])} subdomains in egypetoo.com:")
-                        for subdomain in result["data"]:
-                            print(f"            - {subdomain['domain']}")
-                            subdomains.append({
-                                "domain": subdomain["domain"],
-                                "user": acct["user"],
-                                "type": "subdomain",
-                                "server": server
-                            })
-                    elif result and "error" in result:
-                        print(f"         ⚠️  SubDomain API error: {result['error']}")
-                    else:
-                        print(f"         ℹ️  No subdomains found in SubDomain API")
-                    
-                    # محاولة جلب Addon domains
-                    print(f"         🔍 Trying Addon::listaddondomains...")
-                    addon_result = cpanel_api_call(server, acct["user"], "Addon", "listaddondomains")
-                    print(f"         📤 Addon API Response: {addon_result}")
-                    
-                    if addon_result and "data" in addon_result and addon_result["data"]:
-                        print(f"         ✅ Found {len(addon_result['data'])} addon domains in egypetoo.com:")
-                        for addon in addon_result["data"]:
-                            print(f"            - {addon['domain']}")
-                            subdomains.append({
-                                "domain": addon["domain"],
-                                "user": acct["user"],
-                                "type": "addon",
-                                "server": server
-                            })
-                    elif addon_result and "error" in addon_result:
-                        print(f"         ⚠️  Addon API error: {addon_result['error']}")
-                    else:
-                        print(f"         ℹ️  No addon domains found")
-                    
-                    # محاولة استخدام WHM API لجلب معلومات الحساب
-                    print(f"         🔍 Trying WHM API for account details...")
-                    whm_result = whm_api_call(server, "getacct", {"user": acct["user"]})
-                    if whm_result and "data" in whm_result:
-                        account_data = whm_result["data"]
-                        print(f"         📊 Account details: {account_data}")
-                        
-                        # البحث عن الصب دومين في معلومات الحساب
-                        if "subdomains" in account_data:
-                            print(f"         ✅ Found subdomains in account data: {account_data['subdomains']}")
-                            for subdomain in account_data["subdomains"]:
-                                subdomains.append({
-                                    "domain": subdomain,
-                                    "user": acct["user"],
-                                    "type": "subdomain",
-                                    "server": server
-                                })
-                        
-                        # البحث عن addon domains في معلومات الحساب
-                        if "addondomains" in account_data:
-                            print(f"         ✅ Found addon domains in account data: {account_data['addondomains']}")
-                            for addon in account_data["addondomains"]:
-                                subdomains.append({
-                                    "domain": addon,
-                                    "user": acct["user"],
-                                    "type": "addon",
-                                    "server": server
-                                })
-                    
-                    # محاولة استخدام WHM API لجلب جميع الدومينات
-                    print(f"         🔍 Trying WHM API for all domains...")
-                    all_domains_result = whm_api_call(server, "listaccts")
-                    if all_domains_result and "data" in all_domains_result:
-                        all_accounts = all_domains_result["data"]["acct"]
-                        for acc in all_accounts:
-                            if acc["user"] == acct["user"]:
-                                print(f"         📊 Account info from WHM: {acc}")
-                                
-                                # البحث في child_nodes
-                                if "child_nodes" in acc and acc["child_nodes"]:
-                                    print(f"         ✅ Found child nodes: {acc['child_nodes']}")
-                                    for child in acc["child_nodes"]:
-                                        if isinstance(child, dict) and "domain" in child:
-                                            subdomains.append({
-                                                "domain": child["domain"],
-                                                "user": acct["user"],
-                                                "type": "subdomain",
-                                                "server": server
-                                            })
-                                        elif isinstance(child, str):
-                                            subdomains.append({
-                                                "domain": child,
-                                                "user": acct["user"],
-                                                "type": "subdomain",
-                                                "server": server
-                                            })
-                                
-                                # محاولة استخدام get_domain_info
-                                print(f"         🔍 Trying get_domain_info for {acct['user']}...")
-                                try:
-                                    domain_info_result = whm_api_call(server, "get_domain_info", {"domain": acct["domain"]})
-                                    if domain_info_result and "data" in domain_info_result:
-                                        domain_data = domain_info_result["data"]
-                                        print(f"         📊 Domain info: {domain_data}")
-                                        
-                                        # البحث في domains array
-                                        if "domains" in domain_data and isinstance(domain_data["domains"], list):
-                                            print(f"         🔍 Found {len(domain_data['domains'])} domains in domain_info")
-                                            for domain_info in domain_data["domains"]:
-                                                if isinstance(domain_info, dict) and "domain" in domain_info:
-                                                    domain_name = domain_info["domain"]
-                                                    domain_type = domain_info.get("domain_type", "unknown")
-                                                    domain_user = domain_info.get("user", acct["user"])
-                                                    
-                                                    # تجاهل الدومين الأساسي
-                                                    if domain_name != acct["domain"]:
-                                                        print(f"         ✅ Found {domain_type} domain: {domain_name}")
-                                                        subdomains.append({
-                                                            "domain": domain_name,
-                                                            "user": domain_user,
-                                                            "type": domain_type,
-                                                            "server": server
-                                                        })
-                                        
-                                        # البحث عن الصب دومين في domain_info (fallback)
-                                        if "subdomains" in domain_data:
-                                            print(f"         ✅ Found subdomains in domain_info: {domain_data['subdomains']}")
-                                            for subdomain in domain_data["subdomains"]:
-                                                subdomains.append({
-                                                    "domain": subdomain,
-                                                    "user": acct["user"],
-                                                    "type": "subdomain",
-                                                    "server": server
-                                                })
-                                        
-                                        # البحث عن addon domains في domain_info (fallback)
-                                        if "addondomains" in domain_data:
-                                            print(f"         ✅ Found addon domains in domain_info: {domain_data['addondomains']}")
-                                            for addon in domain_data["addondomains"]:
-                                                subdomains.append({
-                                                    "domain": addon,
-                                                    "user": acct["user"],
-                                                    "type": "addon",
-                                                    "server": server
-                                                })
-                                except Exception as e:
-                                    print(f"         ❌ get_domain_info failed: {e}")
-                                
-                                break
-                            
-                except Exception as e:
-                    print(f"         ❌ Error checking egypetoo.com: {e}")
+        if semaphore is None:
+            return await _call()
+        async with semaphore:
+            return await _call()
+    except asyncio.TimeoutError:
+        logging.error(f"Timeout error connecting to {server['ip']}")
+        return {"error": "Connection timeout"}
+    except Exception as e:
+        logging.error(f"Error in async API call: {str(e)}")
+        return {"error": str(e)}
+
+async def async_whm_api_call(server, function, params=None, timeout=30, limiter=None):
+    """نسخة asyncio من whm_api_call بنفس صيغة الأخطاء"""
+    return await _run_api_call_async(whm_api_call, (server, function, params, timeout), server, timeout, limiter)
+
+async def async_cpanel_api_call(server, user, module, function, params=None, timeout=30, limiter=None):
+    """نسخة asyncio من cpanel_api_call بنفس صيغة الأخطاء"""
+    return await _run_api_call_async(cpanel_api_call, (server, user, module, function, params, timeout), server, timeout, limiter)
+
+def new_api_limiter(per_server_limit=ASYNC_PER_SERVER_LIMIT):
+    """إنشاء محدد طلبات لكل سيرفر (يُستخدم داخل event loop واحد)"""
+    return {'_limit': per_server_limit}
+
+async def async_api_calls(calls, per_server_limit=ASYNC_PER_SERVER_LIMIT):
+    """تنفيذ قائمة استدعاءات بالتوازي وإرجاع النتائج بنفس الترتيب
+
+    كل عنصر في calls إما:
+        ("whm", server, function, params)
+        ("cpanel", server, user, module, function, params)
+    """
+    limiter = new_api_limiter(per_server_limit)
+    tasks = []
+    for call in calls:
+        if call[0] == "whm":
+            _, server, function, params = call
+            tasks.append(async_whm_api_call(server, function, params, limiter=limiter))
+        elif call[0] == "cpanel":
+            _, server, user, module, function, params = call
+            tasks.append(async_cpanel_api_call(server, user, module, function, params, limiter=limiter))
         else:
-            print(f"      ℹ️  No egypetoo.com account found")
+            raise ValueError(f"Unknown API call type: {call[0]}")
+    return await asyncio.gather(*tasks)
+
+def run_api_calls_parallel(calls, per_server_limit=ASYNC_PER_SERVER_LIMIT):
+    """غلاف متزامن لـ async_api_calls لاستخدامه من دوال القوائم الحالية"""
+    if not calls:
+        return []
+    return asyncio.run(async_api_calls(calls, per_server_limit))
+
+# أنواع الدومينات كما يرجعها get_domain_info وما يقابلها داخل السكريبتات
+DOMAIN_INFO_TYPES = {"main": "main", "sub": "subdomain", "addon": "addon", "parked": "parked"}
+
+def _domain_entry(server, domain, user, domain_type, parent_domain=""):
+    """صيغة موحدة لعنصر الدومين في نتائج list_all_domains"""
+    return DomainRecord(server, domain, user, domain_type, parent_domain)
+
+def list_domains_via_domain_info(server):
+    """جلب كل دومينات السيرفر (main/sub/addon/parked) في طلب واحد عبر get_domain_info - None إذا لم يكن مدعوماً"""
+    result = whm_api_call(server, "get_domain_info")
+    if "error" in result:
+        logging.warning(f"get_domain_info unavailable on {server['ip']}: {result['error']}")
+        return None
+    
+    domains = []
+    for item in (result.get("data") or {}).get("domains") or []:
+        domain_type = DOMAIN_INFO_TYPES.get(item.get("domain_type"), item.get("domain_type", "unknown"))
+        domains.append(_domain_entry(server, item["domain"], item.get("user", ""), domain_type, item.get("parent_domain", "")))
+    return domains
+
+def _list_domains_per_account(server, accounts=None):
+    """الطريقة الاحتياطية: دومينات كل حساب عبر DomainInfo::list_domains (طلب لكل حساب)"""
+    if accounts is None:
+        accounts = list_accounts(server, fields=("user", "domain"))
+    domains = [_domain_entry(server, acct["domain"], acct["user"], "main", acct["domain"]) for acct in accounts]
+    main_by_user = {acct["user"]: acct["domain"] for acct in accounts}
+    
+    print(f"      🔍 Checking domains for {len(accounts)} accounts...")
+    for domain_info in list_account_domains_parallel(server, list(main_by_user)):
+        parent = main_by_user[domain_info["user"]]
+        domains.append(_domain_entry(server, domain_info["domain"], domain_info["user"], domain_info["type"], parent))
+    return domains
+
+def list_all_domains(server):
+    """جلب جميع الدومينات (الرئيسية + الصب دومين + addon + parked) من السيرفر"""
+    try:
+        all_domains = list_domains_via_domain_info(server)
+        if all_domains is None:
+            print("      ⚠️  get_domain_info not available, falling back to per-account listing...")
+            all_domains = _list_domains_per_account(server)
         
-        all_domains = main_domains + subdomains
-        print(f"      📊 Found {len(main_domains)} main domains + {len(subdomains)} subdomains")
+        main_count = sum(1 for d in all_domains if d["type"] == "main")
+        print(f"      📊 Found {main_count} main domains + {len(all_domains) - main_count} other domains")
         return all_domains
         
     except Exception as e:
         logging.error(f"Error listing domains: {str(e)}")
         return []
 
-def find_server_by_domain(domain, servers, include_subdomains=True, search_mode="smart"):
+def _choose_server_result(found_servers, label):
+    """اختيار سيرفر عند وجود النتيجة على أكثر من سيرفر - found_servers: [(server, info, name), ...]"""
+    print(f"🔍 {label} found on multiple servers:")
+    for i, (server, info, name) in enumerate(found_servers, 1):
+        status = "online" if test_server_connection(server) else "offline"
+        print(f"   {i}. Server {name} ({server['ip']}) - {status}")
+    
+    # اختيار تلقائي للسيرفر الأول
+    auto_selected = found_servers[0]
+    print(f"✅ Auto-selected: Server {auto_selected[2]} (option 1)")
+    
+    # السماح للمستخدم باختيار السيرفر
+    try:
+        choice = input(f"\n🌐 Choose server (1-{len(found_servers)}) or press Enter for auto-selected: ").strip()
+        if choice:
+            choice_idx = int(choice) - 1
+            if 0 <= choice_idx < len(found_servers):
+                selected = found_servers[choice_idx]
+                print(f"✅ Selected: Server {selected[2]}")
+                return selected
+    except (ValueError, IndexError):
+        pass
+    
+    # استخدام الاختيار التلقائي
+    print(f"✅ Using auto-selected: Server {auto_selected[2]}")
+    return auto_selected
+
+def find_server_by_domain_in_inventory(domain, servers, main_only=False):
+    """البحث عن الدومين في المخزون المحلي - يرجع None إذا لم يكن المخزون حديثاً لكل السيرفرات"""
+    column = "accounts_at" if main_only else "domains_at"
+    if not inventory_covers(servers, column):
+        return None
+    
+    fresh = get_fresh_inventory_servers(servers, column)
+    found_servers = []
+    # الدومينات الرئيسية فقط من جدول accounts حتى تطابق حداثتها عمود accounts_at
+    rows = inventory_find_account(domain) if main_only else inventory_find_domain(domain)
+    for row in rows:
+        if row["server_name"] not in fresh:
+            continue
+        server = servers[row["server_name"]]
+        if main_only or row["type"] == "main":
+            info = {key: row[key] for key in ("user", "domain", "plan", "email", "suspended", "diskused", "unix_startdate")}
+        else:
+            info = {"domain": row["domain"], "user": row["user"], "type": row["type"], "server": server}
+        found_servers.append((server, info, row["server_name"]))
+    
+    print(f"🗄️  Using local inventory ({len(found_servers)} match(es))")
+    if not found_servers:
+        print("❌ Domain not found on any server!")
+        return None, None, None
+    if len(found_servers) == 1:
+        server, info, name = found_servers[0]
+        print(f"✅ Found {domain} on Server {name}")
+        print(f"   👤 cPanel user: {info['user']}")
+        return found_servers[0]
+    return _choose_server_result(found_servers, "Domain")
+
+def find_server_by_domain(domain, servers, include_subdomains=True, search_mode="smart", first_match=False):
     """البحث عن السيرفر الذي يحتوي على الدومين مع خيارات بحث متقدمة"""
     print(f"🔍 Searching for domain: {domain}...")
     
+    # المخزون المحلي أولاً إذا كان حديثاً
+    inventory_result = find_server_by_domain_in_inventory(domain, servers, main_only=(search_mode == "fast"))
+    if inventory_result is not None:
+        return inventory_result
+    
     if search_mode == "fast":
         print("🚀 Using fast search...")
-        return find_server_by_domain_fast(domain, servers)
+        return find_server_by_domain_fast(domain, servers, first_match)
     elif search_mode == "smart":
         print("🧠 Using smart search...")
-        return find_server_by_domain_smart(domain, servers)
+        return find_server_by_domain_smart(domain, servers, first_match)
     elif search_mode == "full":
         print("🔍 Using full search...")
-        return find_server_by_domain_full(domain, servers)
+        return find_server_by_domain_full(domain, servers, first_match)
     else:
         print("🧠 Using smart search (default)...")
-        return find_server_by_domain_smart(domain, servers)
+        return find_server_by_domain_smart(domain, servers, first_match)
 
-def find_server_by_domain_fast(domain, servers):
-    """البحث السريع في الدومينات الرئيسية فقط"""
-    print("🔍 Searching across {} servers...".format(len(servers)))
-    print("   📋 Searching main domains only (faster)...")
+def search_servers_concurrently(servers, check_func, first_match=False):
+    """تشغيل check_func(name, server, stop_event) على كل السيرفرات المتصلة بالتوازي
     
-    found_servers = []
+    يرجع قائمة [(server, info, name), ...] بترتيب السيرفرات، ومع first_match يتم
+    إلغاء باقي العمل بمجرد أول نتيجة.
+    """
+    online_servers = get_online_servers(servers)
+    if not online_servers:
+        return []
     
-    for i, (name, server) in enumerate(servers.items(), 1):
-        print(f"   📡 Checking Server {name} ({i}/{len(servers)})...")
-        
-        if test_server_connection(server):
+    print(f"   📡 Querying {len(online_servers)} online server(s) concurrently...")
+    stop_event = threading.Event()
+    matches = {}
+    executor = ThreadPoolExecutor(max_workers=len(online_servers))
+    try:
+        futures = {
+            executor.submit(check_func, name, server, stop_event): name
+            for name, server in online_servers.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
             try:
-                print(f"      🔍 Loading main domains from Server {name}...")
-                accounts = list_accounts(server)
-                
-                for acct in accounts:
-                    if acct["domain"].lower() == domain.lower():
-                        print(f"      ✅ Found {domain} as main domain on Server {name}!")
-                        found_servers.append((server, acct, name))
-                        break
-                        
+                info = future.result()
             except Exception as e:
-                print(f"      ⚠️  Error loading domains from Server {name}: {e}")
+                print(f"      ⚠️  Error searching Server {name}: {e}")
+                continue
+            if info is None:
                 continue
+            matches[name] = (online_servers[name], info, name)
+            if first_match:
+                # إيقاف باقي السيرفرات بدون انتظارها
+                stop_event.set()
+                break
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=not first_match, cancel_futures=True)
+    
+    return [matches[name] for name in online_servers if name in matches]
+
+def find_server_by_domain_fast(domain, servers, first_match=False):
+    """البحث السريع في الدومينات الرئيسية فقط"""
+    print("🔍 Searching across {} servers...".format(len(servers)))
+    print("   📋 Searching main domains only (faster)...")
+    
+    def check_server(name, server, stop_event):
+        for acct in find_accounts(server, domain=domain, fields=ACCOUNT_SUMMARY_FIELDS + ("email", "disklimit")):
+            if acct["domain"].lower() == domain.lower():
+                print(f"      ✅ Found {domain} as main domain on Server {name}!")
+                return acct
+        return None
+    
+    found_servers = search_servers_concurrently(servers, check_server, first_match)
     
     if found_servers:
         print(f"      📊 Found {len(found_servers)} server(s) with domain: {domain}")
         
         if len(found_servers) == 1:
             server, acct, name = found_servers[0]
-            print(f"      📊 Processing single server result: {name} - Status: online")
             print(f"✅ Found {domain} as main domain on Server {name}")
             print(f"   👤 cPanel user: {acct['user']}")
-            print(f"      📤 Returning result: ({server}, {acct}, {name})")
             return server, acct, name
-        else:
-            # عرض خيارات السيرفرات
-            print(f"🔍 Domain found on multiple servers:")
-            for i, (server, acct, name) in enumerate(found_servers, 1):
-                status = "online" if test_server_connection(server) else "offline"
-                print(f"   {i}. Server {name} ({server['ip']}) - {status}")
-            
-            # اختيار تلقائي للسيرفر الأول
-            auto_selected = found_servers[0]
-            print(f"✅ Auto-selected: Server {auto_selected[2]} (option 1)")
-            
-            # السماح للمستخدم باختيار السيرفر
-            try:
-                choice = input(f"\n🌐 Choose server (1-{len(found_servers)}) or press Enter for auto-selected: ").strip()
-                if choice:
-                    choice_idx = int(choice) - 1
-                    if 0 <= choice_idx < len(found_servers):
-                        selected = found_servers[choice_idx]
-                        print(f"✅ Selected: Server {selected[2]}")
-                        return selected
-            except (ValueError, IndexError):
-                pass
-            
-            # استخدام الاختيار التلقائي
-            print(f"✅ Using auto-selected: Server {auto_selected[2]}")
-            return auto_selected
+        return _choose_server_result(found_servers, "Domain")
     
     print("🔍 Fast search result: None")
     return None, None, None
 
-def find_server_by_domain_smart(domain, servers):
+def find_server_by_domain_smart(domain, servers, first_match=False):
     """البحث الذكي: الدومينات الرئيسية أولاً، ثم الصب دومين إذا لزم الأمر"""
     # محاولة البحث السريع أولاً
-    result = find_server_by_domain_fast(domain, servers)
+    result = find_server_by_domain_fast(domain, servers, first_match)
     if result[0] is not None:
         return result
     
     # إذا لم يتم العثور عليه، البحث في الصب دومين
     print("   🔍 Main domain not found, searching subdomains...")
-    return find_server_by_domain_full(domain, servers)
+    return find_server_by_domain_full(domain, servers, first_match)
 
-def find_server_by_domain_full(domain, servers):
+def find_server_by_domain_full(domain, servers, first_match=False):
     """البحث الكامل في جميع الدومينات والصب دومين"""
     print("🔍 Searching across {} servers...".format(len(servers)))
     print("   📋 Searching all domains + subdomains...")
     
-    found_servers = []
+    def check_server(name, server, stop_event):
+        for domain_info in list_all_domains(server):
+            if domain_info["domain"].lower() == domain.lower():
+                print(f"      ✅ Found {domain} as {domain_info['type']} domain on Server {name}!")
+                return domain_info
+        return None
     
-    for i, (name, server) in enumerate(servers.items(), 1):
-        print(f"   📡 Checking Server {name} ({i}/{len(servers)})...")
-        
-        if test_server_connection(server):
-            try:
-                print(f"      🔍 Loading all domains from Server {name}...")
-                all_domains = list_all_domains(server)
-                
-                for domain_info in all_domains:
-                    if domain_info["domain"].lower() == domain.lower():
-                        print(f"      ✅ Found {domain} as {domain_info['type']} domain on Server {name}!")
-                        found_servers.append((server, domain_info, name))
-                        break
-                        
-            except Exception as e:
-                print(f"      ⚠️  Error loading domains from Server {name}: {e}")
-                continue
+    found_servers = search_servers_concurrently(servers, check_server, first_match)
     
     if found_servers:
         print(f"      📊 Found {len(found_servers)} server(s) with domain: {domain}")
         
-        if len(found_servers) == 1:
-            server, domain_info, name = found_servers[0]
-            print(f"      📊 Processing single server result: {name} - Status: online")
-            print(f"✅ Found {domain} as {domain_info['type']} domain on Server {name}")
-            print(f"   👤 cPanel user: {domain_info['user']}")
-            return server, domain_info, name
-        else:
-            # عرض خيارات السيرفرات
-            print(f"🔍 Domain found on multiple servers:")
-            for i, (server, domain_info, name) in enumerate(found_servers, 1):
-                status = "online" if test_server_connection(server) else "offline"
-                print(f"   {i}. Server {name} ({s['ip']}) - {status}")
-            
-            # اختيار تلقائي للسيرفر الأول
-            auto_selected = found_servers[0]
-            print(f"✅ Auto-selected: Server {auto_selected[2]} (option 1)")
-            
-            # السماح للمستخدم باختيار السيرفر
-            try:
-                choice = input(f"\n🌐 Choose server (1-{len(found_servers)}) or press Enter for auto-selected: ").strip()
-                if choice:
-                    choice_idx = int(choice) - 1
-                    if 0 <= choice_idx < len(found_servers):
-                        selected = found_servers[choice_idx]
-                        print(f"✅ Selected: Server {selected[2]}")
-                        return selected
-            except (ValueError, IndexError):
-                pass
-            
-            # استخدام الاختيار التلقائي
-            print(f"✅ Using auto-selected: Server {auto_selected[2]}")
-            return auto_selected
+        if len(found_servers) == 1:
+            server, domain_info, name = found_servers[0]
+            print(f"✅ Found {domain} as {domain_info['type']} domain on Server {name}")
+            print(f"   👤 cPanel user: {domain_info['user']}")
+            return server, domain_info, name
+        return _choose_server_result(found_servers, "Domain")
     
     print("❌ Domain not found on any server!")
     return None, None, None
 
-def find_server_by_email(email_address, servers):
-    """البحث عن الإيميل في جميع السيرفرات"""
+def find_server_by_email(email_address, servers, first_match=False, use_index=False):
+    """البحث عن الإيميل في جميع السيرفرات (بحث مباشر، أو عبر فهرس الإيميلات مع use_index)"""
     print("🔍 Searching for email across {} servers...".format(len(servers)))
     print("   📧 Searching for email: {}".format(email_address))
     
-    found_servers = []
+    # فهرس الإيميلات (من المخزون أو list_pops) يفيد عند البحث المتكرر في نفس الجلسة
+    if use_index:
+        found_servers = [
+            (entry["server"], {"user": entry["user"], "domain": entry["domain"]}, entry["server_name"])
+            for entry in lookup_mailbox(email_address, servers)
+        ]
+        print(f"   🗂️  Using email index ({len(found_servers)} match(es))")
+    else:
+        found_servers = []
     
-    for i, (name, server) in enumerate(servers.items(), 1):
-        print(f"   📡 Checking Server {name} ({i}/{len(servers)})...")
-        
-        if test_server_connection(server):
-            try:
-                print(f"      🔍 Loading accounts from Server {name}...")
-                accounts = list_accounts(server)
-                
-                for acct in accounts:
-                    if acct["domain"].lower() == email_address.split("@")[1].lower():
-                        print(f"      ✅ Found domain {acct['domain']} on Server {name}!")
-                        
-                        # البحث عن الإيميل في هذا الحساب
-                        print(f"      🔍 Checking email accounts in {acct['user']}...")
-                        try:
-                            emails = list_email_accounts(server, acct['user'], acct['domain'])
-                            for email in emails:
-                                if email.get("email", "").lower() == email_address.lower():
-                                    print(f"      🎯 Found email {email_address} on Server {name}!")
-                                    found_servers.append((server, acct, name))
-                                    break
-                        except Exception as e:
-                            print(f"      ⚠️  Error checking emails: {e}")
-                            continue
-                        
-                        if found_servers:
-                            break
-                        
-            except Exception as e:
-                print(f"      ⚠️  Error loading accounts from Server {name}: {e}")
+    # الإيميل قد يكون أُنشئ بعد بناء الفهرس: البحث المباشر قبل إرجاع "غير موجود"
+    if use_index and found_servers:
+        if len(found_servers) == 1 or first_match:
+            print(f"✅ Found email {email_address} on Server {found_servers[0][2]}")
+            print(f"   👤 cPanel user: {found_servers[0][1]['user']}")
+            return found_servers[0]
+        return _choose_server_result(found_servers, "Email")
+    if use_index:
+        print("   🔄 Not in email index, searching servers directly...")
+    
+    email_domain = email_address.split("@")[1].lower()
+    
+    def check_server(name, server, stop_event):
+        for acct in find_accounts(server, domain=email_domain, fields=("user", "domain")):
+            if stop_event.is_set():
+                return None
+            if acct["domain"].lower() != email_domain:
                 continue
+            print(f"      ✅ Found domain {acct['domain']} on Server {name}, checking {acct['user']}...")
+            for email in list_email_accounts(server, acct['user'], acct['domain']):
+                if email.get("email", "").lower() == email_address.lower():
+                    print(f"      🎯 Found email {email_address} on Server {name}!")
+                    return acct
+        return None
+    
+    found_servers = search_servers_concurrently(servers, check_server, first_match)
     
     if found_servers:
         print(f"      📊 Found {len(found_servers)} server(s) with email: {email_address}")
         
         if len(found_servers) == 1:
             server, acct, name = found_servers[0]
-            print(f"      📊 Processing single server result: {name} - Status: online")
             print(f"✅ Found email {email_address} on Server {name}")
             print(f"   👤 cPanel user: {acct['user']}")
             return server, acct, name
-        else:
-            # عرض خيارات السيرفرات
-            print(f"🔍 Email found on multiple servers:")
-            for i, (server, acct, name) in enumerate(found_servers, 1):
-                status = "online" if test_server_connection(server) else "offline"
-                print(f"   {i}. Server {name} ({server['ip']}) - {status}")
-            
-            # اختيار تلقائي للسيرفر الأول
-            auto_selected = found_servers[0]
-            print(f"✅ Auto-selected: Server {auto_selected[2]} (option 1)")
-            
-            # السماح للمستخدم باختيار السيرفر
-            try:
-                choice = input(f"\n🌐 Choose server (1-{len(found_servers)}) or press Enter for auto-selected: ").strip()
-                if choice:
-                    choice_idx = int(choice) - 1
-                    if 0 <= choice_idx < len(found_servers):
-                        selected = found_servers[choice_idx]
-                        print(f"✅ Selected: Server {selected[2]}")
-                        return selected
-            except (ValueError, IndexError):
-                pass
-            
-            # استخدام الاختيار التلقائي
-            print(f"✅ Using auto-selected: Server {auto_selected[2]}")
-            return auto_selected
+        return _choose_server_result(found_servers, "Email")
     
     print("❌ Email not found on any server!")
     return None, None, None
 
-def get_online_servers(servers):
+def get_online_servers(servers, max_age=LIVENESS_CACHE_SECONDS):
     """الحصول على السيرفرات المتصلة"""
-    online_servers = {}
-    for name, server in servers.items():
-        if test_server_connection(server):
-            online_servers[name] = server
+    liveness = get_server_liveness(servers, max_age)
+    online_servers = {name: server for name, server in servers.items() if liveness[name]["online"]}
     
     if not online_servers:
         print("❌ No online servers available!")
@@ -694,13 +1369,17 @@ def get_online_servers(servers):
     
     return online_servers
 
-def display_server_status(servers):
-    """عرض حالة جميع السيرفرات"""
+def display_server_status(servers, max_age=0):
+    """عرض حالة جميع السيرفرات (فحص متوازي مع زمن الاستجابة)"""
     print("\n🔍 Server Status Check:")
     print("-" * 50)
+    liveness = get_server_liveness(servers, max_age)
     for name, server in servers.items():
-        status = "🟢 Online" if test_server_connection(server) else "🔴 Offline"
-        print(f"Server {name} ({server['ip']}): {status}")
+        entry = liveness[name]
+        if entry["online"]:
+            print(f"Server {name} ({server['ip']}): 🟢 Online ({entry['rtt'] * 1000:.0f}ms)")
+        else:
+            print(f"Server {name} ({server['ip']}): 🔴 Offline")
 
 def list_all_available_domains(servers):
     """عرض جميع الدومينات المتاحة (أساسية + subdomains)"""
@@ -709,6 +1388,7 @@ def list_all_available_domains(servers):
     
     total_domains = 0
     total_subdomains = 0
+    total_other = 0
     
     for name, server in servers.items():
         if test_server_connection(server):
@@ -723,8 +1403,9 @@ def list_all_available_domains(servers):
                     continue
                 
                 # فصل الدومينات الأساسية عن الـ subdomains
-                main_domains = [d for d in all_domains if d["type"] == "main_domain"]
+                main_domains = [d for d in all_domains if d["type"] == "main"]
                 subdomains = [d for d in all_domains if d["type"] == "subdomain"]
+                other_domains = [d for d in all_domains if d["type"] not in ("main", "subdomain")]
                 
                 # عرض الدومينات الأساسية
                 if main_domains:
@@ -737,12 +1418,17 @@ def list_all_available_domains(servers):
                 if subdomains:
                     print(f"   🔗 Subdomains ({len(subdomains)}):")
                     for i, domain_info in enumerate(subdomains, 1):
-                        parent = domain_info['parent_domain']
-                        sub = domain_info['subdomain_name']
-                        print(f"      {i}. {sub}.{parent} (User: {domain_info['user']})")
+                        print(f"      {i}. {domain_info['domain']} (User: {domain_info['user']})")
                         total_subdomains += 1
                 
-                if not main_domains and not subdomains:
+                # عرض الـ addon و parked
+                if other_domains:
+                    print(f"   🧩 Addon / Parked Domains ({len(other_domains)}):")
+                    for i, domain_info in enumerate(other_domains, 1):
+                        print(f"      {i}. {domain_info['domain']} ({domain_info['type']}, User: {domain_info['user']})")
+                        total_other += 1
+                
+                if not all_domains:
                     print("   ⚠️  No domains found on this server")
                     
             except Exception as e:
@@ -753,34 +1439,16 @@ def list_all_available_domains(servers):
     print(f"\n📊 Summary:")
     print(f"   🌐 Total Main Domains: {total_domains}")
     print(f"   🔗 Total Subdomains: {total_subdomains}")
-    print(f"   📈 Total Domains: {total_domains + total_subdomains}")
+    print(f"   🧩 Total Addon / Parked: {total_other}")
+    print(f"   📈 Total Domains: {total_domains + total_subdomains + total_other}")
 
 def search_domains_by_keyword(servers, keyword):
     """البحث عن دومينات تحتوي على كلمة معينة"""
     print(f"\n🔍 Searching for domains containing: '{keyword}'")
     print("=" * 80)
     
-    found_domains = []
-    
-    for name, server in servers.items():
-        if test_server_connection(server):
-            try:
-                all_domains = list_all_domains(server)
-                
-                for domain_info in all_domains:
-                    if keyword.lower() in domain_info["domain"].lower():
-                        found_domains.append({
-                            "server": name,
-                            "server_ip": server["ip"],
-                            "domain": domain_info["domain"],
-                            "user": domain_info["user"],
-                            "type": domain_info["type"],
-                            "parent_domain": domain_info.get("parent_domain", ""),
-                            "subdomain_name": domain_info.get("subdomain_name", "")
-                        })
-                        
-            except Exception as e:
-                print(f"⚠️  Error searching Server {name}: {e}")
+    # فهرس trigram (من المخزون أو get_domain_info) بدلاً من إعادة تحميل كل الدومينات
+    found_domains = search_domain_index(servers, keyword)
     
     if not found_domains:
         print(f"❌ No domains found containing '{keyword}'")
@@ -791,16 +1459,178 @@ def search_domains_by_keyword(servers, keyword):
     
     for i, domain_info in enumerate(found_domains, 1):
         domain_type = domain_info["type"]
-        if domain_type == "subdomain":
-            print(f"{i}. {domain_info['domain']} (Subdomain)")
-            print(f"   📍 Parent: {domain_info['parent_domain']}")
-        else:
+        if domain_type == "main":
             print(f"{i}. {domain_info['domain']} (Main Domain)")
+        else:
+            print(f"{i}. {domain_info['domain']} ({domain_type.capitalize()})")
+            if domain_info.get('parent_domain'):
+                print(f"   📍 Parent: {domain_info['parent_domain']}")
         
         print(f"   🖥️  Server: {domain_info['server']} ({domain_info['server_ip']})")
         print(f"   👤 User: {domain_info['user']}")
         print()
 
+# === منفذ العمليات الجماعية (bulk) بالتوازي مع حد لكل سيرفر ===
+# عدد العمليات المتزامنة لكل سيرفر، والفاصل بالثواني بين أسطر معدل التنفيذ
+BULK_PER_SERVER_LIMIT = 4
+BULK_PROGRESS_INTERVAL = 2.0
+
+def bulk_result(target, status, **details):
+    """صيغة موحدة لنتيجة عنصر واحد في العمليات الجماعية (تُصدّر كما هي عبر export_bulk_results)"""
+    result = {
+        "domain": target.get("domain", ""),
+        "user": target.get("user") or "N/A",
+        "server": target.get("server_name") or "N/A",
+        "status": status
+    }
+    result.update(details)
+    return result
+
+def print_bulk_result(done, total, result):
+    """الطباعة الافتراضية لكل نتيجة في run_bulk_operation"""
+    icon = "✅" if result["status"] == "Success" else "❌"
+    error = f": {result['error']}" if result.get("error") else ""
+    print(f"[{done}/{total}] {icon} {result['domain']} ({result['user']}) - {result['status']}{error}")
+
+def run_bulk_operation(targets, action, per_server_limit=BULK_PER_SERVER_LIMIT, on_result=None, batch_size=None):
+    """تنفيذ action(target) لكل الأهداف بالتوازي مع حد أقصى للعمليات المتزامنة على كل سيرفر
+    
+    كل هدف dict فيه domain و user و server و server_name، والهدف بدون server يُسجل
+    بحالته (Not Found افتراضياً) بدون تنفيذ. action يرجع dict النتيجة (bulk_result) وأي استثناء يتحول
+    لنتيجة Error. on_result(done, total, result) يُستدعى من الخيط الرئيسي لكل نتيجة،
+    والنتائج ترجع بنفس ترتيب الأهداف.
+    
+    مع batch_size يستقبل action قائمة أهداف من نفس السيرفر (حتى batch_size) ويرجع قائمة
+    نتائجها بنفس الترتيب (لاستخدام whm_batch_call).
+    """
+    on_result = on_result or print_bulk_result
+    total = len(targets)
+    results = [None] * total
+    done = 0
+    
+    def _finish(i, result):
+        nonlocal done
+        results[i] = result
+        done += 1
+        on_result(done, total, result)
+    
+    pending = [i for i, target in enumerate(targets) if target.get("server") is not None]
+    if pending:
+        server_count = len({targets[i].get("server_name") or targets[i]["server"]["ip"] for i in pending})
+        print(f"⚡ Running {len(pending)} operation(s) on {server_count} server(s), up to {per_server_limit} at a time per server...")
+    for i, target in enumerate(targets):
+        if target.get("server") is None:
+            _finish(i, bulk_result(target, target.get("status", "Not Found"), error=target.get("error", "Account not found")))
+    
+    # منفذ مستقل لكل سيرفر: الحد لكل سيرفر ثابت ولا يؤخر سيرفر بطيء باقي السيرفرات
+    groups = {}
+    for i in pending:
+        groups.setdefault(targets[i].get("server_name") or targets[i]["server"]["ip"], []).append(i)
+    
+    executors = {}
+    futures = {}
+    started = time.time()
+    for name, indexes in groups.items():
+        server = targets[indexes[0]]["server"]
+        workers = max(1, min(per_server_limit, int(server.get("pool_size", API_POOL_MAXSIZE))))
+        executors[name] = ThreadPoolExecutor(max_workers=workers)
+        if batch_size:
+            for start in range(0, len(indexes), batch_size):
+                batch = indexes[start:start + batch_size]
+                futures[executors[name].submit(action, [targets[i] for i in batch])] = batch
+        else:
+            for i in indexes:
+                futures[executors[name].submit(action, targets[i])] = [i]
+    
+    last_report = started
+    try:
+        for future in as_completed(futures):
+            indexes = futures[future]
+            try:
+                batch_results = future.result() if batch_size else [future.result()]
+            except Exception as e:
+                logging.error(f"Bulk operation failed for {targets[indexes[0]].get('domain', '')}: {str(e)}")
+                batch_results = [bulk_result(targets[i], "Error", error=str(e)) for i in indexes]
+            for i, result in zip(indexes, batch_results):
+                _finish(i, result)
+            
+            # معدل التنفيذ المباشر
+            now = time.time()
+            if now - last_report >= BULK_PROGRESS_INTERVAL and done < total:
+                rate = (done - (total - len(pending))) / (now - started)
+                print(f"   📈 {done}/{total} done - {rate:.1f} ops/s - ETA {(total - done) / rate:.0f}s")
+                last_report = now
+    except KeyboardInterrupt:
+        print("\n⚠️  Bulk operation interrupted, cancelling pending operations...")
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = bulk_result(targets[i], "Cancelled")
+    
+    elapsed = time.time() - started
+    if pending:
+        print(f"⏱️  {len(pending)} operation(s) in {elapsed:.1f}s ({len(pending) / max(elapsed, 0.001):.1f} ops/s)")
+    return results
+
+# === سجل العمليات الدائم (journal) لاستئناف العمليات الطويلة ===
+# ملفات JSONL للإضافة فقط: كل حدث يُكتب على القرص (fsync) قبل المتابعة
+JOURNALS_DIR = "journals"
+JOURNAL_FILE_MODE = 0o600
+
+def journal_path(prefix):
+    """مسار سجل جديد باسم prefix ووقت البدء داخل مجلد journals"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return os.path.join(JOURNALS_DIR, f"{prefix}_{timestamp}.jsonl")
+
+def find_journals(prefix):
+    """كل السجلات التي تبدأ بـ prefix (الأقدم أولاً)"""
+    if not os.path.isdir(JOURNALS_DIR):
+        return []
+    names = sorted(name for name in os.listdir(JOURNALS_DIR) if name.startswith(prefix + "_") and name.endswith(".jsonl"))
+    return [os.path.join(JOURNALS_DIR, name) for name in names]
+
+def open_journal(path):
+    """فتح سجل للإضافة (ينشئه بصلاحيات 0600 لأنه قد يحتوي بيانات حساسة)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, JOURNAL_FILE_MODE)
+    return {"path": path, "fd": fd, "lock": threading.Lock()}
+
+def append_journal(journal, *events):
+    """إضافة حدث أو أكثر للسجل في كتابة واحدة مع fsync - آمن بين الخيوط"""
+    now = time.time()
+    data = "".join(json.dumps(dict(event, ts=now), ensure_ascii=False) + "\n" for event in events).encode("utf-8")
+    with journal["lock"]:
+        # عملية ما زالت تعمل بعد إغلاق السجل (مثلاً بعد Ctrl+C): الحدث لا يُسجل ويبقى معلقاً للاستئناف
+        if journal["fd"] is None:
+            logging.warning(f"Journal {journal['path']} already closed, dropping {len(events)} event(s)")
+            return
+        os.write(journal["fd"], data)
+        os.fsync(journal["fd"])
+
+def close_journal(journal):
+    """إغلاق ملف السجل"""
+    with journal["lock"]:
+        if journal["fd"] is not None:
+            os.close(journal["fd"])
+            journal["fd"] = None
+
+def read_journal(path):
+    """قراءة أحداث السجل - السطر الأخير غير المكتمل (انقطاع أثناء الكتابة) يتم تجاهله"""
+    events = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignoring truncated journal line in {path}")
+    except FileNotFoundError:
+        pass
+    return events
+
 # === دوال مساعدة ===
 def confirm_action(message):
     """تأكيد العملية"""
@@ -984,9 +1814,9 @@ def check_basic_health(server, server_name):
     except:
         print("❌ Error accessing accounts")
     
-    # فحص خدمة WHM
+    # فحص خدمة WHM (بدون كاش حتى لا يظهر سيرفر متوقف كأنه يعمل)
     try:
-        version_result = whm_api_call(server, "version")
+        version_result = whm_api_call(server, "version", use_cache=False)
         if "error" not in version_result:
             version = version_result.get("data", {}).get("version", "Unknown")
             print(f"✅ WHM service: Running (Version: {version})")
@@ -1035,72 +1865,1061 @@ def handle_script_error(e, script_name):
     print("3. Check servers_config.py file")
     print("4. Review log files for details")
 
+# === سجلات مضغوطة للدومينات والإيميلات والحسابات (__slots__) ===
+_interned_servers = {}
+_interned_servers_lock = threading.Lock()
+
+def intern_server(server):
+    """مرجع واحد مشترك لكل سيرفر (حسب IP والتوكن) بدلاً من نسخة في كل سجل"""
+    key = (server['ip'], server.get('token'))
+    with _interned_servers_lock:
+        return _interned_servers.setdefault(key, server)
+
+def _intern(value):
+    """توحيد النصوص المتكررة (المستخدم، النوع، الدومين الأب) في الذاكرة"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class _Record:
+    """أساس السجلات المضغوطة: حقول __slots__ مع قراءة بأسلوب dict للتوافق مع الكود الحالي"""
+    __slots__ = ()
+    _fields = ()
+    
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __contains__(self, key):
+        return key in self._fields
+    
+    def __iter__(self):
+        return iter(self._fields)
+    
+    def __len__(self):
+        return len(self._fields)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+    
+    def keys(self):
+        return self._fields
+    
+    def items(self):
+        return [(key, getattr(self, key)) for key in self._fields]
+    
+    def to_dict(self):
+        return dict(self.items())
+    
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class DomainRecord(_Record):
+    """دومين واحد (main/subdomain/addon/parked) كما ترجعه list_all_domains"""
+    __slots__ = ("domain", "user", "type", "parent_domain", "server", "server_name")
+    _fields = ("domain", "user", "type", "parent_domain", "subdomain_name", "server")
+    
+    def __init__(self, server, domain, user, domain_type, parent_domain="", server_name=""):
+        self.domain = domain
+        self.user = _intern(user)
+        self.type = _intern(domain_type)
+        self.parent_domain = _intern(parent_domain)
+        self.server = intern_server(server)
+        self.server_name = _intern(server_name)
+    
+    @property
+    def subdomain_name(self):
+        """اسم الصب دومين بدون الدومين الأب (فارغ لغير الصب دومين)"""
+        if self.type == "subdomain" and self.parent_domain and self.domain.endswith("." + self.parent_domain):
+            return self.domain[:-len(self.parent_domain) - 1]
+        return ""
+
+class MailboxRecord(_Record):
+    """إيميل واحد كما ترجعه list_email_accounts"""
+    __slots__ = ("email", "domain", "user", "diskused", "diskquota", "suspended", "server_name")
+    _fields = ("email", "domain", "user", "diskused", "diskquota", "suspended", "login")
+    
+    def __init__(self, email, domain, user, diskused=0, diskquota=0, suspended=False, server_name=""):
+        self.email = email
+        self.domain = _intern(domain)
+        self.user = _intern(user)
+        self.diskused = diskused
+        self.diskquota = diskquota
+        self.suspended = suspended
+        self.server_name = _intern(server_name)
+    
+    @property
+    def login(self):
+        """اسم الدخول (user@domain)"""
+        return f"{self.user}@{self.domain}"
+
+class AccountRecord(_Record):
+    """حساب cPanel في فهرس الدومينات (السيرفر + المستخدم + الدومين الرئيسي)"""
+    __slots__ = ("server", "server_name", "user", "domain")
+    _fields = __slots__
+    
+    def __init__(self, server, server_name, user, domain):
+        self.server = intern_server(server)
+        self.server_name = _intern(server_name)
+        self.user = _intern(user)
+        self.domain = domain
+
 # === دوال إدارة الإيميل ===
-def list_email_accounts(server, cpanel_user, domain=None):
+def _clean_email_accounts(result, cpanel_user, domain=None):
+    """تنظيف استجابة Email::list_pops وتحويلها لقائمة إيميلات"""
+    if "error" in result:
+        logging.error(f"Error fetching email accounts for {cpanel_user}: {result['error']}")
+        return []
+        
+    # استخراج البيانات من الاستجابة
+    if "result" in result and "data" in result["result"]:
+        emails = result["result"]["data"]
+        
+        # التحقق من نوع البيانات وتنظيفها
+        if isinstance(emails, list):
+            # تنظيف وتنسيق البيانات
+            cleaned_emails = []
+            for email in emails:
+                if isinstance(email, dict):
+                    # إضافة معلومات إضافية وتنظيف البيانات
+                    # معالجة أفضل للبيانات الرقمية
+                    try:
+                        diskused = email.get("diskused", 0)
+                        diskquota = email.get("diskquota", 0)
+                        
+                        # تحويل إلى أرقام مع معالجة الأخطاء
+                        diskused = float(diskused) if diskused and str(diskused).replace('.', '').replace('-', '').isdigit() else 0
+                        diskquota = float(diskquota) if diskquota and str(diskquota).replace('.', '').replace('-', '').isdigit() else 0
+                        
+                        # إذا كانت الحصة 0، استخدم القيمة الافتراضية
+                        if diskquota == 0:
+                            diskquota = 1024 * 1024 * 1024  # 1GB بالبايت (Unlimited)
+                            
+                    except (ValueError, TypeError):
+                        diskused = 0
+                        diskquota = 1024 * 1024 * 1024  # 1GB بالبايت (Unlimited)
+                    
+                    cleaned_email = MailboxRecord(
+                        email=email.get("email", "").strip(),
+                        domain=email.get("domain", domain),
+                        user=email.get("user", ""),
+                        diskused=diskused,
+                        diskquota=diskquota,
+                        suspended=bool(email.get("suspended", 0))
+                    )
+                    
+                    # إضافة فقط إذا كان الإيميل صالحاً
+                    if cleaned_email.email and "@" in cleaned_email.email:
+                        cleaned_emails.append(cleaned_email)
+                        
+            return cleaned_emails
+        else:
+            logging.warning(f"Unexpected data format for {cpanel_user}'s emails")
+            return []
+    
+    logging.warning(f"No email data found for {cpanel_user}")
+    return []
+
+def list_email_accounts(server, cpanel_user, domain=None, fields=EMAIL_ACCOUNT_FIELDS):
     """جلب قائمة الإيميلات مع معالجة أفضل للبيانات والأخطاء"""
     try:
         params = {"include_disk_usage": 1}  # طلب معلومات الديسك
+        params.update(uapi_columns_params(fields))
         if domain:
             params["domain"] = domain
             
         result = cpanel_api_call(server, cpanel_user, "Email", "list_pops", params)
+        return _clean_email_accounts(result, cpanel_user, domain)
         
-        if "error" in result:
-            logging.error(f"Error fetching email accounts for {cpanel_user}: {result['error']}")
-            return []
-            
-        # استخراج البيانات من الاستجابة
-        if "result" in result and "data" in result["result"]:
-            emails = result["result"]["data"]
-            
-            # التحقق من نوع البيانات وتنظيفها
-            if isinstance(emails, list):
-                # تنظيف وتنسيق البيانات
-                cleaned_emails = []
-                for email in emails:
-                    if isinstance(email, dict):
-                        # إضافة معلومات إضافية وتنظيف البيانات
-                        # معالجة أفضل للبيانات الرقمية
-                        try:
-                            diskused = email.get("diskused", 0)
-                            diskquota = email.get("diskquota", 0)
-                            
-                            # تحويل إلى أرقام مع معالجة الأخطاء
-                            diskused = float(diskused) if diskused and str(diskused).replace('.', '').replace('-', '').isdigit() else 0
-                            diskquota = float(diskquota) if diskquota and str(diskquota).replace('.', '').replace('-', '').isdigit() else 0
-                            
-                            # إذا كانت الحصة 0، استخدم القيمة الافتراضية
-                            if diskquota == 0:
-                                diskquota = 1024 * 1024 * 1024  # 1GB بالبايت (Unlimited)
-                                
-                        except (ValueError, TypeError):
-                            diskused = 0
-                            diskquota = 1024 * 1024 * 1024  # 1GB بالبايت (Unlimited)
-                        
-                        cleaned_email = {
-                            "email": email.get("email", "").strip(),
-                            "domain": email.get("domain", domain),
-                            "user": email.get("user", ""),
-                            "diskused": diskused,
-                            "diskquota": diskquota,
-                            "suspended": bool(email.get("suspended", 0)),
-                            "login": f"{email.get('user', '')}@{email.get('domain', domain)}"
-                        }
-                        
-                        # إضافة فقط إذا كان الإيميل صالحاً
-                        if cleaned_email["email"] and "@" in cleaned_email["email"]:
-                            cleaned_emails.append(cleaned_email)
-                            
-                return cleaned_emails
+    except Exception as e:
+        logging.error(f"Error listing email accounts for {cpanel_user}: {str(e)}")
+        return []
+
+def list_email_accounts_parallel(server, cpanel_users, per_server_limit=ASYNC_PER_SERVER_LIMIT, failed_users=None):
+    """جلب إيميلات عدة حسابات على نفس السيرفر بالتوازي - يرجع {user: [emails]}
+
+    إذا تم تمرير failed_users (set) تضاف إليها الحسابات التي فشل جلبها بدلاً من اعتبارها بدون إيميلات.
+    """
+    params = {"include_disk_usage": 1}
+    params.update(uapi_columns_params(EMAIL_ACCOUNT_FIELDS))
+    results = run_api_calls_parallel(
+        [("cpanel", server, user, "Email", "list_pops", params) for user in cpanel_users],
+        per_server_limit
+    )
+    emails_by_user = {}
+    for user, result in zip(cpanel_users, results):
+        if failed_users is not None and _is_cpanel_error(result):
+            failed_users.add(user)
+        try:
+            emails_by_user[user] = _clean_email_accounts(result, user)
+        except Exception as e:
+            logging.error(f"Error listing email accounts for {user}: {str(e)}")
+            emails_by_user[user] = []
+            if failed_users is not None:
+                failed_users.add(user)
+    return emails_by_user
+
+
+# === جلب متوازي من السيرفرات مع تتبع السيرفرات الفاشلة (للفهارس) ===
+def fetch_from_servers(servers, fetch):
+    """تشغيل fetch(server) -> (data, error) لكل سيرفر بالتوازي - يرجع (results, failed) حيث failed {name: error}"""
+    results, failed = {}, {}
+    if not servers:
+        return results, failed
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        futures = {executor.submit(fetch, server): name for name, server in servers.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                data, error = future.result()
+            except Exception as e:
+                data, error = None, str(e)
+            if error:
+                failed[name] = error
             else:
-                logging.warning(f"Unexpected data format for {cpanel_user}'s emails")
-                return []
+                results[name] = data
+    return results, failed
+
+def report_failed_servers(failed, what):
+    """طباعة السيرفرات التي فشل تحميل بياناتها (تُستبعد من الفهرس ويعاد جلبها في البحث التالي)"""
+    for name, error in failed.items():
+        print(f"⚠️  Server {name}: could not load {what} ({error}) - will retry on next lookup")
+        logging.warning(f"Could not load {what} from server {name}: {error}")
+
+def _index_needs_rebuild(current, servers, max_age):
+    """هل الفهرس غير موجود أو لسيرفرات مختلفة أو انتهت صلاحيته؟"""
+    return (current is None or current["servers"] != tuple(servers)
+            or time.time() - current["built_at"] > max_age)
+
+# === فهرس الدومينات للجلسة (domain → server, user) ===
+# مدة صلاحية الفهرس بالثواني قبل إعادة بنائه
+DOMAIN_INDEX_MAX_AGE = 900
+
+_account_domain_index = None
+_account_domain_index_lock = threading.Lock()
+
+def _add_account_domains(current, servers, target_servers):
+    """إضافة حسابات السيرفرات للفهرس عبر listaccts بالتوازي - السيرفرات الفاشلة تُحفظ في failed"""
+    results, failed = fetch_from_servers(target_servers, lambda server: list_accounts_checked(server, ("user", "domain")))
+    # نفس ترتيب السيرفرات في الإعدادات
+    for name in target_servers:
+        for acct in results.get(name, []):
+            current["index"].setdefault(acct["domain"].lower(), []).append(
+                AccountRecord(servers[name], name, acct["user"], acct["domain"]))
+    current["failed"] = failed
+    report_failed_servers(failed, "accounts")
+    logging.info(f"Domain index loaded {len(results)} servers: {len(current['index'])} domains")
+
+def _build_account_domain_index(servers):
+    """بناء الفهرس: استدعاء listaccts واحد لكل سيرفر (بالتوازي) أو من المخزون إذا كان حديثاً"""
+    online_servers = get_online_servers(servers)
+    current = {"built_at": time.time(), "servers": tuple(servers), "index": {}, "failed": {}}
+    
+    fresh = get_fresh_inventory_servers(online_servers, "accounts_at") if online_servers else set()
+    if online_servers and all(name in fresh for name in online_servers):
+        for row in _inventory_query("SELECT server_name, user, domain FROM accounts"):
+            if row["server_name"] in online_servers:
+                current["index"].setdefault(row["domain"].lower(), []).append(
+                    AccountRecord(servers[row["server_name"]], row["server_name"], row["user"], row["domain"]))
+        logging.info(f"Domain index built from inventory: {len(current['index'])} domains")
+    elif online_servers:
+        _add_account_domains(current, servers, online_servers)
+    return current
+
+def get_account_domain_index(servers, max_age=DOMAIN_INDEX_MAX_AGE):
+    """جلب فهرس الدومينات للجلسة (يُبنى مرة واحدة ويعاد استخدامه، والسيرفرات الفاشلة يعاد جلبها)"""
+    global _account_domain_index
+    with _account_domain_index_lock:
+        current = _account_domain_index
+        if _index_needs_rebuild(current, servers, max_age):
+            current = _build_account_domain_index(servers)
+            _account_domain_index = current
+        elif current["failed"]:
+            _add_account_domains(current, servers, {name: servers[name] for name in current["failed"]})
+        return current["index"]
+
+def get_account_domain_index_failures(servers):
+    """السيرفرات التي فشل تحميلها في آخر بناء للفهرس - {name: error}"""
+    with _account_domain_index_lock:
+        current = _account_domain_index
+        return dict(current["failed"]) if current and current["servers"] == tuple(servers) else {}
+
+def lookup_account_domain(domain, servers):
+    """البحث عن الدومين الرئيسي في الفهرس - يرجع قائمة {server, server_name, user, domain}"""
+    return [entry.to_dict() for entry in get_account_domain_index(servers).get(domain.lower(), [])]
+
+def invalidate_account_domain_index():
+    """مسح الفهرس (بعد إنشاء أو حذف حساب)"""
+    global _account_domain_index
+    with _account_domain_index_lock:
+        _account_domain_index = None
+
+# === فهرس الإيميلات للسيرفرات (email → server, user, domain) ===
+# مدة صلاحية الفهرس بالثواني، ودوال Email التي تغير قائمة الإيميلات
+MAILBOX_INDEX_MAX_AGE = 600
+MAILBOX_INDEX_INVALIDATING_FUNCTIONS = {"add_pop", "delete_pop"}
+
+_mailbox_index = None
+_mailbox_index_lock = threading.Lock()
+
+def _fetch_server_mailboxes(server):
+    """جلب كل إيميلات السيرفر: list_pops لكل حساب بالتوازي - يرجع ([(user, email), ...], error)"""
+    accounts, error = list_accounts_checked(server, ("user", "domain"))
+    if error:
+        return [], error
+    failed_users = set()
+    emails_by_user = list_email_accounts_parallel(server, [acct["user"] for acct in accounts], failed_users=failed_users)
+    if failed_users:
+        print(f"⚠️  {server['ip']}: could not list emails for {len(failed_users)} account(s)")
+    return [(user, email) for user, emails in emails_by_user.items() for email in emails], None
+
+def _add_mailbox_entry(current, server_name, user, email):
+    """كل عنصر في الفهرس هو (المستخدم، سجل الإيميل) واسم السيرفر محفوظ داخل السجل"""
+    email.server_name = sys.intern(server_name)
+    current["index"].setdefault(email.email.lower(), []).append((sys.intern(user), email))
+
+def _add_server_mailboxes(current, target_servers):
+    """إضافة إيميلات السيرفرات للفهرس عبر list_pops - السيرفرات الفاشلة تُحفظ في failed"""
+    print(f"📧 Building email index from {len(target_servers)} server(s)...")
+    results, failed = fetch_from_servers(target_servers, _fetch_server_mailboxes)
+    # نفس ترتيب السيرفرات في الإعدادات
+    for name in target_servers:
+        for user, email in results.get(name, []):
+            _add_mailbox_entry(current, name, user, email)
+    current["failed"] = failed
+    # المفاتيح مرتبة للبحث بالبادئة عبر bisect
+    current["keys"] = sorted(current["index"])
+    report_failed_servers(failed, "email accounts")
+    logging.info(f"Mailbox index loaded {len(results)} servers: {len(current['index'])} emails")
+
+def _build_mailbox_index(servers):
+    """بناء فهرس الإيميلات من المخزون إذا كان حديثاً أو من list_pops مباشرة"""
+    online_servers = get_online_servers(servers)
+    current = {"built_at": time.time(), "servers": tuple(servers), "index": {}, "keys": [], "failed": {}}
+    
+    fresh = get_fresh_inventory_servers(online_servers, "mailboxes_at") if online_servers else set()
+    if online_servers and all(name in fresh for name in online_servers):
+        for row in _inventory_query("SELECT * FROM mailboxes"):
+            if row["server_name"] in online_servers:
+                _add_mailbox_entry(current, row["server_name"], row["user"], MailboxRecord(
+                    row["email"], row["domain"], row["email"].split("@")[0], row["diskused"], row["diskquota"],
+                    bool(row["suspended"])
+                ))
+        current["keys"] = sorted(current["index"])
+        logging.info(f"Mailbox index built from inventory: {len(current['index'])} emails")
+    elif online_servers:
+        _add_server_mailboxes(current, online_servers)
+    return current
+
+def get_mailbox_index(servers, max_age=MAILBOX_INDEX_MAX_AGE):
+    """جلب فهرس الإيميلات (يُبنى مرة واحدة ويعاد استخدامه حتى انتهاء صلاحيته، والسيرفرات الفاشلة يعاد جلبها)"""
+    global _mailbox_index
+    with _mailbox_index_lock:
+        current = _mailbox_index
+        if _index_needs_rebuild(current, servers, max_age):
+            current = _build_mailbox_index(servers)
+            _mailbox_index = current
+        elif current["failed"]:
+            _add_server_mailboxes(current, {name: servers[name] for name in current["failed"]})
+        return current
+
+def _mailbox_match(servers, user, email):
+    """تحويل عنصر الفهرس إلى {server, server_name, user, domain, email}"""
+    return {
+        'server': servers[email.server_name],
+        'server_name': email.server_name,
+        'user': user,
+        'domain': email.domain or email.email.lower().split("@")[-1],
+        'email': email
+    }
+
+def lookup_mailbox(email_address, servers):
+    """البحث عن إيميل بالضبط - يرجع قائمة {server, server_name, user, domain, email}"""
+    entries = get_mailbox_index(servers)["index"].get(email_address.strip().lower(), [])
+    return [_mailbox_match(servers, user, email) for user, email in entries]
+
+def lookup_mailbox_prefix(prefix, servers, limit=50):
+    """البحث عن الإيميلات التي تبدأ بـ prefix - يرجع قائمة مرتبة بالإيميل"""
+    current = get_mailbox_index(servers)
+    keys = current["keys"]
+    prefix = prefix.strip().lower()
+    matches = []
+    for key in keys[bisect.bisect_left(keys, prefix):]:
+        if not key.startswith(prefix) or len(matches) >= limit:
+            break
+        matches.extend(_mailbox_match(servers, user, email) for user, email in current["index"][key])
+    return matches
+
+def invalidate_mailbox_index():
+    """مسح فهرس الإيميلات (بعد إضافة أو حذف إيميل)"""
+    global _mailbox_index
+    with _mailbox_index_lock:
+        _mailbox_index = None
+
+# === فهرس البحث في الدومينات (trigram) ===
+# مدة صلاحية الفهرس بالثواني، وأقصى عدد نتائج في البحث التفاعلي
+DOMAIN_SEARCH_INDEX_MAX_AGE = 900
+DOMAIN_SEARCH_MAX_RESULTS = 200
+DOMAIN_WILDCARD_CHARS = "*?["
+
+_domain_search_index = None
+_domain_search_index_lock = threading.Lock()
+
+def _trigrams(text):
+    """كل المقاطع الثلاثية في النص"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _pattern_literals(pattern):
+    """الأجزاء الثابتة في نمط wildcard (بدون * و ? و [...])"""
+    return [part for part in re.split(r"\[[^\]]*\]|[*?]+", pattern) if part]
+
+def _fetch_server_domains(server):
+    """كل دومينات السيرفر (get_domain_info أو لكل حساب كبديل) - يرجع (domains, error)"""
+    domains = list_domains_via_domain_info(server)
+    if domains is not None:
+        return domains, None
+    accounts, error = list_accounts_checked(server, ("user", "domain"))
+    if error:
+        return [], error
+    return _list_domains_per_account(server, accounts), None
+
+def _add_search_entries(current, entries):
+    """إضافة عناصر للفهرس مع تحديث قوائم الـ trigrams (كمصفوفات array لتوفير الذاكرة)"""
+    postings = current["postings"]
+    for entry_id, entry in enumerate(entries, len(current["entries"])):
+        for gram in _trigrams(entry.domain):
+            postings.setdefault(gram, array("I")).append(entry_id)
+    current["entries"].extend(entries)
+
+def _add_server_domains(current, target_servers):
+    """إضافة دومينات السيرفرات للفهرس بالتوازي - السيرفرات الفاشلة تُحفظ في failed"""
+    results, failed = fetch_from_servers(target_servers, _fetch_server_domains)
+    # نفس ترتيب السيرفرات في الإعدادات
+    _add_search_entries(current, [
+        DomainRecord(target_servers[name], domain_info["domain"].lower(), domain_info["user"],
+                     domain_info["type"], domain_info.get("parent_domain", ""), name)
+        for name in target_servers for domain_info in results.get(name, [])
+    ])
+    current["failed"] = failed
+    report_failed_servers(failed, "domains")
+
+def _build_domain_search_index(servers):
+    """بناء فهرس trigram لكل دومينات السيرفرات (main + sub + addon + parked)"""
+    online_servers = get_online_servers(servers)
+    current = {"built_at": time.time(), "servers": tuple(servers), "entries": [], "postings": {}, "failed": {}}
+    
+    fresh = get_fresh_inventory_servers(online_servers, "domains_at") if online_servers else set()
+    if online_servers and all(name in fresh for name in online_servers):
+        _add_search_entries(current, [
+            DomainRecord(servers[row["server_name"]], row["domain"], row["user"], row["type"], server_name=row["server_name"])
+            for row in _inventory_query("SELECT server_name, domain, user, type FROM domains")
+            if row["server_name"] in online_servers
+        ])
+    elif online_servers:
+        _add_server_domains(current, online_servers)
+    
+    logging.info(f"Domain search index built: {len(current['entries'])} domains, {len(current['postings'])} trigrams")
+    return current
+
+def get_domain_search_index(servers, max_age=DOMAIN_SEARCH_INDEX_MAX_AGE):
+    """جلب فهرس البحث (يُبنى مرة واحدة ويعاد استخدامه حتى انتهاء صلاحيته، والسيرفرات الفاشلة يعاد جلبها)"""
+    global _domain_search_index
+    with _domain_search_index_lock:
+        current = _domain_search_index
+        if _index_needs_rebuild(current, servers, max_age):
+            current = _build_domain_search_index(servers)
+            _domain_search_index = current
+        elif current["failed"]:
+            _add_server_domains(current, {name: servers[name] for name in current["failed"]})
+        return current
+
+def _candidate_entry_ids(current, literals):
+    """المرشحون من تقاطع قوائم الـ trigrams - None إذا لا يوجد جزء ثابت بطول 3 أو أكثر"""
+    grams = set()
+    for literal in literals:
+        grams |= _trigrams(literal)
+    if not grams:
+        return None
+    
+    # البدء بأقصر قائمة لتقليل حجم التقاطع
+    lists = sorted((current["postings"].get(gram, []) for gram in grams), key=len)
+    candidates = set(lists[0])
+    for ids in lists[1:]:
+        if not candidates:
+            break
+        candidates.intersection_update(ids)
+    return sorted(candidates)
+
+def search_domain_index(servers, query, limit=None):
+    """بحث substring أو wildcard (* ? [..]) في فهرس الدومينات - يرجع قائمة نسخ من العناصر"""
+    current = get_domain_search_index(servers)
+    query = query.strip().lower()
+    is_pattern = any(char in query for char in DOMAIN_WILDCARD_CHARS)
+    literals = _pattern_literals(query) if is_pattern else [query]
+    
+    candidate_ids = _candidate_entry_ids(current, literals)
+    if candidate_ids is None:
+        candidate_ids = range(len(current["entries"]))
+    
+    results = []
+    for entry_id in candidate_ids:
+        entry = current["entries"][entry_id]
+        if query in entry.domain or (is_pattern and fnmatch(entry.domain, query)):
+            results.append({"server": entry.server_name, "domain": entry.domain, "user": entry.user,
+                            "type": entry.type, "parent_domain": entry.parent_domain, "server_ip": entry.server["ip"]})
+            if limit and len(results) >= limit:
+                break
+    return results
+
+def invalidate_domain_search_index():
+    """مسح فهرس البحث (بعد إنشاء أو حذف حساب)"""
+    global _domain_search_index
+    with _domain_search_index_lock:
+        _domain_search_index = None
+
+def interactive_domain_search(servers):
+    """بحث تفاعلي متكرر في الدومينات بدون إعادة تحميلها من السيرفرات"""
+    print("\n🔎 Interactive Domain Search")
+    print("=" * 60)
+    print("💡 Type part of a domain or a wildcard pattern (e.g. shop*.com), Enter to finish")
+    get_domain_search_index(servers)
+    
+    while True:
+        query = input("\n🔎 Search: ").strip()
+        if not query:
+            break
+        start = time.time()
+        results = search_domain_index(servers, query, limit=DOMAIN_SEARCH_MAX_RESULTS)
+        elapsed_ms = (time.time() - start) * 1000
         
-        logging.warning(f"No email data found for {cpanel_user}")
+        print(f"✅ {len(results)} result(s) in {elapsed_ms:.1f}ms" + (" (limit reached)" if len(results) >= DOMAIN_SEARCH_MAX_RESULTS else ""))
+        for i, entry in enumerate(results[:50], 1):
+            print(f"   {i}. {entry['domain']} ({entry['type']}) - User: {entry['user']} - Server {entry['server']}")
+        if len(results) > 50:
+            print(f"   ... and {len(results) - 50} more")
+
+# === جدول الحسابات العمودي (عمود لكل حقل) ===
+# مدة صلاحية الجدول بالثواني، والأعمدة النصية والرقمية فيه
+ACCOUNT_TABLE_MAX_AGE = 300
+ACCOUNT_TABLE_TEXT_COLUMNS = ("server", "user", "domain", "plan", "email")
+
+_account_table = None
+_account_table_lock = threading.Lock()
+
+def parse_disk_mb(value):
+    """تحويل diskused من listaccts (مثل 150M أو 1.2G) إلى ميجابايت"""
+    text = str(value or "0").strip().upper()
+    multiplier = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024 * 1024}.get(text[-1:], None)
+    try:
+        return float(text[:-1]) * multiplier if multiplier else float(text)
+    except ValueError:
+        return 0.0
+
+def table_column_from(values, dtype):
+    """عمود مكتوب النوع: مصفوفة numpy أو قائمة Python"""
+    return np.array(values, dtype=dtype) if np is not None else list(values)
+
+def table_compare(column, op, value):
+    """مقارنة عمود كامل بقيمة - يرجع قناع (mask)"""
+    if np is not None:
+        return op(column, value)
+    return [op(item, value) for item in column]
+
+def table_mask_and(*masks):
+    """دمج عدة أقنعة بـ AND"""
+    result = masks[0]
+    for mask in masks[1:]:
+        result = result & mask if np is not None else [a and b for a, b in zip(result, mask)]
+    return result
+
+def table_weighted_sum(terms, size):
+    """مجموع (وزن × قناع) لكل صف - يستخدم لحساب نقاط الخطر"""
+    if np is not None:
+        total = np.zeros(size, dtype=np.int64)
+        for weight, mask in terms:
+            total += weight * np.asarray(mask, dtype=np.int64)
+        return total
+    total = [0] * size
+    for weight, mask in terms:
+        total = [t + weight * bool(m) for t, m in zip(total, mask)]
+    return total
+
+def table_indices(mask):
+    """أرقام الصفوف التي يحققها القناع"""
+    if np is not None:
+        return np.flatnonzero(mask).tolist()
+    return [i for i, flag in enumerate(mask) if flag]
+
+def build_account_table(server_accounts):
+    """بناء الجدول من [(server_name, accounts), ...] - يتم تحويل الأنواع مرة واحدة فقط"""
+    rows = [(name, acct) for name, accounts in server_accounts for acct in accounts]
+    table = {"size": len(rows)}
+    for column in ACCOUNT_TABLE_TEXT_COLUMNS:
+        if column == "server":
+            values = [name for name, _ in rows]
+        else:
+            values = [str(acct.get(column) or "") for _, acct in rows]
+        table[column] = table_column_from(values, object)
+    table["plan_lower"] = table_column_from([plan.lower() for plan in table["plan"]], object)
+    table["domain_lower"] = table_column_from([domain.lower() for domain in table["domain"]], object)
+    table["suspended"] = table_column_from([str(acct.get("suspended", 0)) == "1" for _, acct in rows], bool)
+    table["diskused_mb"] = table_column_from([parse_disk_mb(acct.get("diskused")) for _, acct in rows], float)
+    table["startdate"] = table_column_from([int(acct.get("unix_startdate") or 0) for _, acct in rows], "int64")
+    return table
+
+def _load_account_table_servers(current, target_servers):
+    """جلب حسابات السيرفرات بالتوازي وإعادة بناء الجدول - السيرفرات الفاشلة تُحفظ في failed"""
+    results, failed = fetch_from_servers(
+        target_servers, lambda server: list_accounts_checked(server, ACCOUNT_SUMMARY_FIELDS + ("email",)))
+    current["results"].update(results)
+    current["failed"] = failed
+    report_failed_servers(failed, "accounts")
+    current["table"] = build_account_table([(name, current["results"].get(name, [])) for name in current["online"]])
+
+def get_account_table(servers, max_age=ACCOUNT_TABLE_MAX_AGE):
+    """جدول حسابات كل السيرفرات المتصلة (من المخزون إذا كان حديثاً أو listaccts بالتوازي)"""
+    global _account_table
+    with _account_table_lock:
+        current = _account_table
+        if _index_needs_rebuild(current, servers, max_age):
+            online_servers = get_online_servers(servers)
+            current = {"built_at": time.time(), "servers": tuple(servers), "online": tuple(online_servers),
+                       "results": {}, "failed": {}}
+            fresh = get_fresh_inventory_servers(online_servers, "accounts_at") if online_servers else set()
+            if online_servers and all(name in fresh for name in online_servers):
+                for row in _inventory_query("SELECT * FROM accounts"):
+                    if row["server_name"] in online_servers:
+                        current["results"].setdefault(row["server_name"], []).append(dict(row))
+                current["table"] = build_account_table([(name, current["results"].get(name, [])) for name in online_servers])
+            else:
+                _load_account_table_servers(current, online_servers)
+            _account_table = current
+            logging.info(f"Account table built: {current['table']['size']} accounts (numpy: {np is not None})")
+        elif current["failed"]:
+            _load_account_table_servers(current, {name: servers[name] for name in current["failed"]})
+        # السيرفرات الفاشلة ليست ضمن الجدول - لا تُعد متصلة حتى لا تظهر بصفر حسابات
+        return current["table"], tuple(name for name in current["online"] if name not in current["failed"])
+
+def get_account_table_failures(servers):
+    """السيرفرات المتصلة التي فشل جلب حساباتها في آخر بناء للجدول - {name: error}"""
+    with _account_table_lock:
+        current = _account_table
+        return dict(current["failed"]) if current and current["servers"] == tuple(servers) else {}
+
+def filter_account_table(table, date_from=None, date_to=None, min_disk_mb=None, plan=None, suspended=None):
+    """فلترة متجهة على الجدول - يرجع قناع الصفوف المطابقة"""
+    masks = [table_column_from([True] * table["size"], bool)]
+    if date_from is not None:
+        masks.append(table_compare(table["startdate"], operator.ge, int(date_from.timestamp())))
+    if date_to is not None:
+        masks.append(table_compare(table["startdate"], operator.le, int(date_to.timestamp())))
+    if min_disk_mb is not None:
+        masks.append(table_compare(table["diskused_mb"], operator.ge, float(min_disk_mb)))
+    if plan:
+        masks.append(table_compare(table["plan_lower"], operator.eq, plan.lower()))
+    if suspended is not None:
+        masks.append(table_compare(table["suspended"], operator.eq, bool(suspended)))
+    return table_mask_and(*masks)
+
+def count_account_table(table, columns, mask=None):
+    """عدد الصفوف لكل قيمة (أو مجموعة قيم) من الأعمدة - group by"""
+    indices = table_indices(mask) if mask is not None else range(table["size"])
+    if isinstance(columns, str):
+        columns = (columns,)
+    if np is not None:
+        keys = zip(*(table[column][indices].tolist() for column in columns))
+    else:
+        keys = zip(*([table[column][i] for i in indices] for column in columns))
+    counts = Counter(keys)
+    return {key[0] if len(columns) == 1 else key: count for key, count in counts.items()}
+
+def account_table_row(table, index):
+    """صف واحد من الجدول بصيغة قاموس مثل listaccts"""
+    return {
+        "server": table["server"][index],
+        "user": table["user"][index],
+        "domain": table["domain"][index],
+        "plan": table["plan"][index],
+        "email": table["email"][index],
+        "suspended": int(table["suspended"][index]),
+        "diskused": float(table["diskused_mb"][index]),
+        "unix_startdate": int(table["startdate"][index]),
+    }
+
+def invalidate_account_table():
+    """مسح جدول الحسابات (بعد تعديل أو تعليق أو حذف حساب)"""
+    global _account_table
+    with _account_table_lock:
+        _account_table = None
+
+# === مخزون السيرفرات المحلي (SQLite) ===
+# ملف قاعدة البيانات ومدة صلاحية البيانات قبل الرجوع للبحث المباشر
+INVENTORY_DB_FILE = "whm_inventory.db"
+INVENTORY_MAX_AGE = 3600
+
+_INVENTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    server_name TEXT NOT NULL,
+    user TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    plan TEXT,
+    email TEXT,
+    suspended INTEGER DEFAULT 0,
+    diskused TEXT,
+    unix_startdate INTEGER,
+    PRIMARY KEY (server_name, user)
+);
+CREATE TABLE IF NOT EXISTS domains (
+    server_name TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    user TEXT NOT NULL,
+    type TEXT NOT NULL,
+    PRIMARY KEY (server_name, domain)
+);
+CREATE TABLE IF NOT EXISTS mailboxes (
+    server_name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    user TEXT NOT NULL,
+    domain TEXT,
+    diskused REAL,
+    diskquota REAL,
+    suspended INTEGER DEFAULT 0,
+    PRIMARY KEY (server_name, email)
+);
+CREATE TABLE IF NOT EXISTS refreshes (
+    server_name TEXT PRIMARY KEY,
+    server_ip TEXT,
+    accounts_at REAL,
+    domains_at REAL,
+    mailboxes_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_accounts_domain ON accounts(domain);
+CREATE INDEX IF NOT EXISTS idx_accounts_user ON accounts(user);
+CREATE INDEX IF NOT EXISTS idx_domains_domain ON domains(domain);
+CREATE INDEX IF NOT EXISTS idx_domains_user ON domains(server_name, user);
+CREATE INDEX IF NOT EXISTS idx_mailboxes_email ON mailboxes(email);
+CREATE INDEX IF NOT EXISTS idx_mailboxes_user ON mailboxes(server_name, user);
+"""
+
+_inventory_lock = threading.Lock()
+
+def open_inventory(db_file=None):
+    """فتح قاعدة بيانات المخزون وإنشاء الجداول إذا لم تكن موجودة"""
+    conn = sqlite3.connect(db_file or INVENTORY_DB_FILE, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_INVENTORY_SCHEMA)
+    return conn
+
+def list_account_domains(server, cpanel_user):
+    """جلب دومينات حساب واحد (addon/parked/sub) عبر DomainInfo::list_domains"""
+    return _parse_account_domains(
+        cpanel_api_call(server, cpanel_user, "DomainInfo", "list_domains"), server, cpanel_user)
+
+def list_account_domains_parallel(server, cpanel_users, per_server_limit=ASYNC_PER_SERVER_LIMIT, failed_users=None):
+    """جلب دومينات عدة حسابات بالتوازي - يرجع قائمة واحدة بنفس صيغة list_all_domains
+
+    إذا تم تمرير failed_users (set) تضاف إليها الحسابات التي فشل جلب دوميناتها.
+    """
+    results = run_api_calls_parallel(
+        [("cpanel", server, user, "DomainInfo", "list_domains", None) for user in cpanel_users],
+        per_server_limit
+    )
+    domains = []
+    for user, result in zip(cpanel_users, results):
+        if failed_users is not None and _is_cpanel_error(result):
+            failed_users.add(user)
+            continue
+        domains.extend(_parse_account_domains(result, server, user))
+    return domains
+
+def _parse_account_domains(result, server, cpanel_user):
+    """تحويل استجابة DomainInfo::list_domains لقائمة دومينات"""
+    if "error" in result:
+        logging.error(f"Error fetching domains for {cpanel_user}: {result['error']}")
         return []
-        
-    except Exception as e:
-        logging.error(f"Error listing email accounts for {cpanel_user}: {str(e)}")
+    data = result.get("result", {}).get("data") or {}
+    parent = data.get("main_domain") or ""
+    domains = []
+    for key, domain_type in (("addon_domains", "addon"), ("parked_domains", "parked"), ("sub_domains", "subdomain")):
+        for domain in data.get(key) or []:
+            domains.append(DomainRecord(server, domain, cpanel_user, domain_type, parent))
+    return domains
+
+def _account_signature(acct):
+    """البصمة المستخدمة لاكتشاف تغيّر الحساب بين تحديثين"""
+    return (int(acct.get("unix_startdate", 0) or 0), int(acct.get("suspended", 0) or 0), str(acct.get("diskused", "")))
+
+def _fetch_server_inventory(server_name, server, include_domains, include_mailboxes, incremental, db_file=None):
+    """جلب بيانات سيرفر واحد من الـ API (بدون كتابة في قاعدة البيانات)
+
+    في الوضع التدريجي تتم مقارنة listaccts بالنسخة المحفوظة، ولا تُجلب تفاصيل
+    الدومينات والإيميلات إلا للحسابات الجديدة أو المتغيرة.
+    """
+    # المقارنة تحتاج القائمة الحالية فعلاً وليس نسخة الكاش
+    accounts = list_accounts(server, fields=ACCOUNT_SUMMARY_FIELDS + ("email",), use_cache=not incremental)
+    users = [acct["user"] for acct in accounts]
+    fetched = {"accounts": accounts, "domains": None, "mailboxes": None,
+               "domain_users": None, "mailbox_users": None,
+               "changed_users": None, "removed_users": set(), "failed_users": set()}
+    
+    domain_users = mailbox_users = None
+    snapshot = {row["user"]: row for row in _inventory_query(
+        "SELECT user, unix_startdate, suspended, diskused FROM accounts WHERE server_name = ?",
+        (server_name,), db_file)}
+    if incremental:
+        refresh = _inventory_query("SELECT * FROM refreshes WHERE server_name = ? AND server_ip = ?",
+                                   (server_name, server['ip']), db_file)
+        if snapshot and refresh:
+            changed = {acct["user"] for acct in accounts
+                       if acct["user"] not in snapshot or _account_signature(acct) != _account_signature(snapshot[acct["user"]])}
+            fetched["changed_users"] = changed
+            fetched["removed_users"] = set(snapshot) - set(users)
+            # التفاصيل التي لم تُجلب من قبل تحتاج تحديثاً كاملاً
+            if refresh[0]["domains_at"]:
+                domain_users = changed
+            if refresh[0]["mailboxes_at"]:
+                mailbox_users = changed
+            logging.info(f"Incremental refresh for {server_name}: {len(changed)} changed, "
+                         f"{len(fetched['removed_users'])} removed of {len(accounts)} accounts")
+    
+    if include_domains:
+        if domain_users is None:
+            fetched["domains"] = list_all_domains(server)
+        else:
+            fetched["domains"] = list_account_domains_parallel(
+                server, [u for u in users if u in domain_users], failed_users=fetched["failed_users"])
+        fetched["domain_users"] = domain_users
+    
+    if include_mailboxes:
+        detail_users = users if mailbox_users is None else [u for u in users if u in mailbox_users]
+        emails_by_user = list_email_accounts_parallel(server, detail_users, failed_users=fetched["failed_users"])
+        fetched["mailboxes"] = [(user, email) for user, emails in emails_by_user.items() for email in emails]
+        fetched["mailbox_users"] = mailbox_users
+    
+    # الحسابات التي فشل جلب تفاصيلها تحتفظ ببصمتها القديمة حتى يُعاد جلبها في التحديث التالي
+    failed = fetched["failed_users"]
+    if failed:
+        logging.warning(f"Inventory details failed for {len(failed)} account(s) on {server_name}, will retry next refresh")
+        fetched["accounts"] = [_retry_signature(acct, snapshot.get(acct["user"])) if acct["user"] in failed else acct
+                               for acct in accounts]
+    
+    return fetched
+
+def _retry_signature(acct, old_row):
+    """نسخة من الحساب ببصمته القديمة (أو ببصمة لا تطابق أبداً إذا كان جديداً)"""
+    if old_row is None:
+        return dict(acct, diskused="")
+    return dict(acct, unix_startdate=old_row["unix_startdate"], suspended=old_row["suspended"], diskused=old_row["diskused"])
+
+def _delete_user_rows(conn, table, server_name, users):
+    """حذف صفوف مجموعة مستخدمين من جدول للسيرفر"""
+    conn.executemany(f"DELETE FROM {table} WHERE server_name = ? AND user = ?",
+                     [(server_name, user) for user in users])
+
+def _write_server_inventory(conn, server_name, server, fetched):
+    """كتابة بيانات سيرفر واحد في قاعدة البيانات (كاملة أو تدريجية)"""
+    now = time.time()
+    accounts = fetched["accounts"]
+    removed = fetched["removed_users"]
+    failed = fetched["failed_users"]
+    
+    conn.execute("DELETE FROM accounts WHERE server_name = ?", (server_name,))
+    conn.executemany(
+        "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(server_name, acct["user"], acct["domain"].lower(), acct.get("plan"), acct.get("email"),
+          int(acct.get("suspended", 0) or 0), str(acct.get("diskused", "")), int(acct.get("unix_startdate", 0) or 0))
+         for acct in accounts]
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO refreshes (server_name, server_ip) VALUES (?, ?)", (server_name, server['ip']))
+    conn.execute("UPDATE refreshes SET server_ip = ?, accounts_at = ? WHERE server_name = ?",
+                 (server['ip'], now, server_name))
+    
+    if fetched["domains"] is not None:
+        if fetched["domain_users"] is None:
+            conn.execute("DELETE FROM domains WHERE server_name = ?", (server_name,))
+        else:
+            conn.execute("DELETE FROM domains WHERE server_name = ? AND type = 'main'", (server_name,))
+            _delete_user_rows(conn, "domains", server_name, (fetched["domain_users"] - failed) | removed)
+        rows = [(server_name, acct["domain"].lower(), acct["user"], "main") for acct in accounts]
+        rows += [(server_name, d["domain"].lower(), d["user"], d["type"]) for d in fetched["domains"] if d["type"] != "main"]
+        conn.executemany("INSERT OR IGNORE INTO domains VALUES (?, ?, ?, ?)", rows)
+        conn.execute("UPDATE refreshes SET domains_at = ? WHERE server_name = ?", (now, server_name))
+    
+    if fetched["mailboxes"] is not None:
+        if fetched["mailbox_users"] is None:
+            # الإبقاء على إيميلات الحسابات التي فشل جلبها هذه المرة
+            kept = sorted(failed)
+            conn.execute(f"DELETE FROM mailboxes WHERE server_name = ? AND user NOT IN ({', '.join('?' * len(kept))})",
+                         (server_name, *kept))
+        else:
+            _delete_user_rows(conn, "mailboxes", server_name, (fetched["mailbox_users"] - failed) | removed)
+        conn.executemany(
+            "INSERT OR REPLACE INTO mailboxes VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(server_name, email["email"].lower(), user, email.get("domain"), email.get("diskused", 0),
+              email.get("diskquota", 0), int(bool(email.get("suspended")))) for user, email in fetched["mailboxes"]]
+        )
+        conn.execute("UPDATE refreshes SET mailboxes_at = ? WHERE server_name = ?", (now, server_name))
+
+def refresh_inventory(servers, include_domains=True, include_mailboxes=False, incremental=False, db_file=None):
+    """تحديث المخزون المحلي من جميع السيرفرات المتصلة (جلب متوازي، كامل أو تدريجي)"""
+    mode = "incremental" if incremental else "full"
+    print(f"\n🗄️  Refreshing fleet inventory ({mode})...")
+    online_servers = get_online_servers(servers)
+    if not online_servers:
+        return False
+    
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=len(online_servers)) as executor:
+        futures = {
+            executor.submit(_fetch_server_inventory, name, server, include_domains,
+                            include_mailboxes, incremental, db_file): name
+            for name, server in online_servers.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                fetched[name] = future.result()
+                changed_users = fetched[name]["changed_users"]
+                changed = f", {len(changed_users)} changed" if changed_users is not None else ""
+                print(f"   ✅ Server {name}: {len(fetched[name]['accounts'])} accounts loaded{changed}")
+            except Exception as e:
+                logging.error(f"Error refreshing inventory for server {name}: {str(e)}")
+                print(f"   ❌ Server {name}: {e}")
+    
+    with _inventory_lock:
+        conn = open_inventory(db_file)
+        try:
+            with conn:
+                for name, server_data in fetched.items():
+                    # عدم مسح بيانات سيرفر رد بقائمة فارغة بسبب خطأ مؤقت
+                    if not server_data["accounts"]:
+                        continue
+                    _write_server_inventory(conn, name, online_servers[name], server_data)
+        finally:
+            conn.close()
+    
+    logging.info(f"Inventory refreshed ({mode}) for {len(fetched)} servers")
+    print(f"✅ Inventory updated for {len(fetched)} server(s)")
+    return True
+
+def _inventory_query(sql, params=(), db_file=None):
+    """تنفيذ استعلام على المخزون وإرجاع قائمة dicts (فارغة إذا لم يوجد المخزون)"""
+    path = db_file or INVENTORY_DB_FILE
+    if not os.path.exists(path):
+        return []
+    try:
+        conn = open_inventory(path)
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.error(f"Inventory query failed: {str(e)}")
         return []
 
+def get_fresh_inventory_servers(servers, column="accounts_at", max_age=INVENTORY_MAX_AGE, db_file=None):
+    """أسماء السيرفرات التي تم تحديث بياناتها خلال المدة المحددة"""
+    if column not in ("accounts_at", "domains_at", "mailboxes_at"):
+        raise ValueError(f"Unknown refresh column: {column}")
+    rows = _inventory_query(f"SELECT server_name, server_ip, {column} AS refreshed_at FROM refreshes", db_file=db_file)
+    cutoff = time.time() - max_age
+    fresh = set()
+    for row in rows:
+        server = servers.get(row["server_name"])
+        if server and server['ip'] == row["server_ip"] and (row["refreshed_at"] or 0) >= cutoff:
+            fresh.add(row["server_name"])
+    return fresh
+
+def inventory_covers(servers, column="accounts_at", max_age=INVENTORY_MAX_AGE, db_file=None):
+    """هل المخزون حديث لجميع السيرفرات المتصلة؟"""
+    fresh = get_fresh_inventory_servers(servers, column, max_age, db_file)
+    return bool(fresh) and all(name in fresh for name in get_online_servers(servers))
+
+def inventory_find_domain(domain, db_file=None):
+    """البحث عن دومين (رئيسي أو فرعي) في المخزون"""
+    return _inventory_query(
+        """SELECT d.server_name, d.domain, d.user, d.type, a.domain AS main_domain, a.plan, a.email,
+                  a.suspended, a.diskused, a.unix_startdate
+           FROM domains d LEFT JOIN accounts a ON a.server_name = d.server_name AND a.user = d.user
+           WHERE d.domain = ?""",
+        (domain.lower(),), db_file)
+
+def inventory_find_account(domain, db_file=None):
+    """البحث عن حساب بالدومين الرئيسي في المخزون"""
+    return _inventory_query("SELECT * FROM accounts WHERE domain = ?", (domain.lower(),), db_file)
+
+def inventory_find_email(email_address, db_file=None):
+    """البحث عن إيميل في المخزون"""
+    return _inventory_query("SELECT * FROM mailboxes WHERE email = ?", (email_address.lower(),), db_file)
 
+def inventory_search_domains(keyword, db_file=None):
+    """البحث عن دومينات تحتوي على كلمة معينة في المخزون"""
+    return _inventory_query(
+        "SELECT server_name, domain, user, type FROM domains WHERE domain LIKE ? ESCAPE '\\' ORDER BY domain",
+        ("%" + keyword.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",), db_file)
+
+def show_inventory_status(servers, db_file=None):
+    """عرض حالة المخزون المحلي لكل سيرفر"""
+    print("\n🗄️  Fleet Inventory Status:")
+    print("-" * 80)
+    refreshes = {row["server_name"]: row for row in _inventory_query("SELECT * FROM refreshes", db_file=db_file)}
+    counts = {row["server_name"]: row for row in _inventory_query(
+        """SELECT server_name,
+                  (SELECT COUNT(*) FROM accounts a WHERE a.server_name = r.server_name) AS accounts,
+                  (SELECT COUNT(*) FROM domains d WHERE d.server_name = r.server_name) AS domains,
+                  (SELECT COUNT(*) FROM mailboxes m WHERE m.server_name = r.server_name) AS mailboxes
+           FROM refreshes r""", db_file=db_file)}
+    
+    def _age(timestamp):
+        if not timestamp:
+            return "never"
+        minutes = int((time.time() - timestamp) / 60)
+        return f"{minutes} min ago" if minutes < 120 else f"{minutes // 60} h ago"
+    
+    for name in servers:
+        row = refreshes.get(name)
+        if not row:
+            print(f"Server {name}: ⚪ Not in inventory")
+            continue
+        count = counts.get(name, {})
+        print(f"Server {name}: {count.get('accounts', 0)} accounts, {count.get('domains', 0)} domains, "
+              f"{count.get('mailboxes', 0)} mailboxes")
+        print(f"   🕒 Accounts: {_age(row['accounts_at'])} | Domains: {_age(row['domains_at'])} | "
+              f"Mailboxes: {_age(row['mailboxes_at'])}")
+
+def inventory_management_menu(servers):
+    """قائمة إدارة المخزون المحلي"""
+    while True:
+        print(f"\n🗄️  Fleet Inventory (SQLite: {INVENTORY_DB_FILE})")
+        print("=" * 50)
+        print("1. 📊 Show inventory status")
+        print("2. 🔄 Refresh accounts + domains")
+        print("3. 📧 Refresh accounts + domains + mailboxes (slower)")
+        print("4. ⚡ Incremental refresh (changed accounts only)")
+        print("0. 🔙 Back")
+        
+        choice = input("\nChoose option: ").strip()
+        if choice == "1":
+            show_inventory_status(servers)
+        elif choice == "2":
+            refresh_inventory(servers)
+        elif choice == "3":
+            refresh_inventory(servers, include_mailboxes=True)
+        elif choice == "4":
+            refresh_inventory(servers, include_mailboxes=True, incremental=True)
+        elif choice == "0":
+            break
+        else:
+            print("❌ Invalid option")
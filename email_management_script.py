@@ -8,6 +8,7 @@ import re
 import random
 from datetime import datetime
 import time
+import operator
 
 # استيراد الدوال المشتركة
 from common_functions import *
@@ -189,20 +190,21 @@ def get_email_usage(server, cpanel_user, email):
         
         for module, function in apis_to_try:
             try:
+                # الـ APIs المعروف أنها غير مدعومة على السيرفر يتم تخطيها بدون طلب
                 if function == "list_pops_with_disk":
                     # استخدام list_pops مع معلومات الديسك
-                    result = cpanel_api_call(server, cpanel_user, "Email", "list_pops", {"include_disk_usage": 1})
+                    result = cpanel_api_call_capable(server, cpanel_user, "Email", "list_pops", {"include_disk_usage": 1}, variant="include_disk_usage")
                 elif function == "getquotas":
-                    result = cpanel_api_call(server, cpanel_user, module, function, {})
+                    result = cpanel_api_call_capable(server, cpanel_user, module, function, {})
                 elif function == "get_disk_usage" and module == "Fileman":
                     # استخدام Fileman للحصول على استخدام الديسك
                     email_user = email.split('@')[0]
-                    result = cpanel_api_call(server, cpanel_user, module, function, {"dir": f"mail/{email.split('@')[1]}/{email_user}"})
+                    result = cpanel_api_call_capable(server, cpanel_user, module, function, {"dir": f"mail/{email.split('@')[1]}/{email_user}"})
                 elif function == "get_pop_statistics":
                     # احصائيات الإيميل
-                    result = cpanel_api_call(server, cpanel_user, module, function, {"account": email})
+                    result = cpanel_api_call_capable(server, cpanel_user, module, function, {"account": email})
                 else:
-                    result = cpanel_api_call(server, cpanel_user, module, function, params)
+                    result = cpanel_api_call_capable(server, cpanel_user, module, function, params)
                 
                 if "error" not in result and "result" in result:
                     if function == "list_pops_with_disk":
@@ -327,6 +329,158 @@ def get_email_usage(server, cpanel_user, email):
         logging.error(f"Error getting email usage: {str(e)}")
         return {"quota": "Unknown", "used": "Unknown", "usage_percent": "N/A"}
 
+# === تغيير كلمات المرور الجماعي مع سجل قابل للاستئناف ===
+PASSWORD_JOURNAL_PREFIX = "password_rotation"
+
+def _replay_password_journal(events):
+    """إعادة بناء حالة التدوير من أحداث السجل"""
+    state = {"header": None, "planned": {}, "applied": set(), "skipped": {}, "errors": {}, "completed": False}
+    for event in events:
+        kind = event.get("event")
+        if kind == "started":
+            state["header"] = event
+        elif kind == "planned":
+            state["planned"][event["email"]] = event["password"]
+        elif kind == "applied":
+            state["applied"].add(event["email"])
+            state["errors"].pop(event["email"], None)
+        elif kind == "failed":
+            state["errors"][event["email"]] = event.get("error", "Unknown error")
+        elif kind == "skipped":
+            # فشل نهائي (الإيميل لم يعد موجوداً) - لا يُعاد في الاستئناف
+            state["skipped"][event["email"]] = event.get("error", "Skipped")
+            state["errors"].pop(event["email"], None)
+        elif kind == "completed":
+            state["completed"] = True
+    return state
+
+def _find_resumable_password_journal(server, cpanel_user, domain):
+    """آخر سجل تدوير غير مكتمل لنفس الدومين والحساب والسيرفر - يرجع (path, state) أو (None, None)"""
+    for path in reversed(find_journals(f"{PASSWORD_JOURNAL_PREFIX}_{domain.lower()}")):
+        state = _replay_password_journal(read_journal(path))
+        header = state["header"]
+        if (header and not state["completed"] and header.get("server") == server["ip"]
+                and header.get("user") == cpanel_user):
+            return path, state
+    return None, None
+
+def _password_journal_pending(state):
+    """الإيميلات المخططة التي لم تُطبق ولم تُتخطى نهائياً"""
+    return [address for address in state["planned"] if address not in state["applied"] and address not in state["skipped"]]
+
+def _skip_missing_mailboxes(journal, state, server, cpanel_user, addresses):
+    """تسجيل الإيميلات التي لم تعد موجودة على الحساب كحدث skipped نهائي
+
+    إذا فشل جلب قائمة الإيميلات لا يتم تخطي شيء وتبقى قابلة للاستئناف.
+    """
+    if not addresses:
+        return
+    failed_users = set()
+    mailboxes = list_email_accounts_parallel(server, [cpanel_user], failed_users=failed_users)
+    if failed_users:
+        logging.warning(f"Could not list mailboxes for {cpanel_user}, keeping {len(addresses)} password(s) pending")
+        return
+    existing = {mailbox.email.lower() for mailbox in mailboxes.get(cpanel_user, [])}
+    missing = [address for address in addresses if address.lower() not in existing]
+    if not missing:
+        return
+    append_journal(journal, *({"event": "skipped", "email": address, "error": "Mailbox no longer exists"}
+                              for address in missing))
+    for address in missing:
+        state["skipped"][address] = "Mailbox no longer exists"
+        state["errors"].pop(address, None)
+        print(f"⏭️  {address}: mailbox no longer exists - skipped")
+
+def rotate_email_passwords(server, server_name, cpanel_user, domain, emails):
+    """توليد كلمات مرور جديدة لكل الإيميلات مع سجل دائم يسمح بالاستئناف - يرجع بيانات التصدير
+    
+    كل كلمة مرور تُسجل في السجل قبل تطبيقها، وكل تطبيق ناجح أو فاشل يُسجل بعده.
+    إعادة التشغيل بعد الانقطاع تكمل من نفس السجل بنفس كلمات المرور المخططة.
+    الإيميلات المحذوفة تُسجل كـ skipped، والسجل يكتمل عندما تكون كل الإيميلات مطبقة أو متخطاة.
+    """
+    path, state = _find_resumable_password_journal(server, cpanel_user, domain)
+    if path:
+        remaining = len(_password_journal_pending(state))
+        print(f"\n📒 Unfinished password rotation found for {domain}: "
+              f"{len(state['applied'])}/{len(state['planned'])} applied ({path})")
+        if not confirm_action(f"Resume it ({remaining} remaining) instead of starting a new rotation?"):
+            path = None
+    
+    journal = open_journal(path or journal_path(f"{PASSWORD_JOURNAL_PREFIX}_{domain.lower()}"))
+    try:
+        if not path:
+            # تسجيل الخطة كاملة قبل أي تغيير
+            state = _replay_password_journal([])
+            for email in emails:
+                if email.get("email"):
+                    state["planned"][email["email"]] = generate_password(12)
+            append_journal(journal, {"event": "started", "server": server["ip"], "server_name": server_name,
+                                     "user": cpanel_user, "domain": domain},
+                           *({"event": "planned", "email": address, "password": password}
+                             for address, password in state["planned"].items()))
+            print(f"📒 Journal: {journal['path']}")
+        else:
+            # الإيميلات التي حُذفت منذ التشغيل السابق لا تُعاد محاولتها
+            _skip_missing_mailboxes(journal, state, server, cpanel_user, _password_journal_pending(state))
+        
+        targets = [
+            {"domain": domain, "user": cpanel_user, "server": server, "server_name": server_name,
+             "email": address, "password": state["planned"][address]}
+            for address in _password_journal_pending(state)
+        ]
+        
+        def apply_password(target):
+            result = change_email_password(server, cpanel_user, target["email"], target["password"])
+            if result["success"]:
+                append_journal(journal, {"event": "applied", "email": target["email"]})
+                return bulk_result(target, "Success", email=target["email"])
+            append_journal(journal, {"event": "failed", "email": target["email"], "error": result["error"]})
+            return bulk_result(target, "Failed", email=target["email"], error=result["error"])
+        
+        def show_result(done, total, result):
+            if result["status"] == "Success":
+                print("=" * 50)
+                print(f"📧 Email Address: {result['email']}")
+                print(f"🌐 Domain: {domain}")
+                print(f"🔑 New Password: {state['planned'][result['email']]}")
+                print(f"💻 Webmail URL: https://webmail.{domain}")
+                print("=" * 50)
+            else:
+                print(f"❌ {result['email']}: {result['status']} - {result.get('error', 'not applied')}")
+        
+        print(f"\n🔄 Changing passwords for {len(targets)} email(s)...")
+        for result in run_bulk_operation(targets, apply_password, on_result=show_result):
+            if result["status"] == "Success":
+                state["applied"].add(result["email"])
+                state["errors"].pop(result["email"], None)
+            else:
+                state["errors"][result["email"]] = result.get("error", result["status"])
+        
+        # الفشل بسبب حذف الإيميل أثناء التشغيل نهائي ولا يمنع اكتمال السجل
+        _skip_missing_mailboxes(journal, state, server, cpanel_user, list(state["errors"]))
+        pending = _password_journal_pending(state)
+        if not pending:
+            append_journal(journal, {"event": "completed"})
+        else:
+            print(f"\n🔁 {len(pending)} password(s) not applied - "
+                  f"run this option again for {domain} to resume from {journal['path']}")
+    finally:
+        close_journal(journal)
+    
+    # بيانات التصدير تشمل ما طُبق في التشغيلات السابقة من نفس السجل
+    passwords_data = []
+    for address, password in state["planned"].items():
+        applied = address in state["applied"]
+        passwords_data.append({
+            "Email": address,
+            "Domain": domain,
+            "New Password": password if applied else "FAILED",
+            "Webmail URL": f"https://webmail.{domain}",
+            "Status": ("Success" if applied else f"Skipped: {state['skipped'][address]}" if address in state["skipped"]
+                       else f"Failed: {state['errors'].get(address, 'Not applied')}")
+        })
+    return passwords_data
+
 # === دوال إدارة الإيميل المتقدمة ===
 def create_single_email(servers):
     """إنشاء إيميل واحد"""
@@ -647,18 +801,38 @@ def change_email_passwords(servers):
     search_type = input("Choose search type (1-2, default 1): ").strip()
     
     if search_type == "2":
-        # البحث بالإيميل مباشرة
-        email_address = input("📧 Enter full email address: ").strip()
-        if not email_address or "@" not in email_address:
+        # البحث بالإيميل مباشرة (أو ببداية الإيميل) عبر فهرس الإيميلات
+        email_address = input("📧 Enter full email address (or its beginning): ").strip()
+        if not email_address:
             print("❌ Invalid email address format")
             return
+        
+        matches = []
+        if "@" not in email_address or not lookup_mailbox(email_address, servers):
+            matches = lookup_mailbox_prefix(email_address, servers, limit=20)
+            # عنوان كامل غير موجود في الفهرس: يتم البحث عنه مباشرة في السيرفرات
+            if not matches and "@" not in email_address:
+                print(f"❌ No emails found starting with '{email_address}'")
+                return
+        if matches:
+            print(f"\n📋 Emails starting with '{email_address}':")
+            for i, entry in enumerate(matches, 1):
+                print(f"   {i}. {entry['email']['email']} (Server {entry['server_name']}, User: {entry['user']})")
+            try:
+                choice_idx = int(input(f"Choose email (1-{len(matches)}): ").strip()) - 1
+                if not 0 <= choice_idx < len(matches):
+                    raise ValueError
+            except ValueError:
+                print("❌ Invalid choice")
+                return
+            email_address = matches[choice_idx]['email']['email']
             
         domain = email_address.split("@")[1]
         print(f"🌐 Extracted domain: {domain}")
         
         # البحث عن السيرفر
         print(f"\n🔍 Searching for email: {email_address}...")
-        server, acct, server_name = find_server_by_email(email_address, servers)
+        server, acct, server_name = find_server_by_email(email_address, servers, use_index=True)
         
         if not server:
             print("❌ Email not found on any server!")
@@ -669,25 +843,6 @@ def change_email_passwords(servers):
         print(f"📋 Domain: {domain}")
         print(f"👤 cPanel User: {cpanel_user}")
         
-        # البحث عن الإيميل في قائمة الإيميلات
-        print(f"📧 Loading email accounts...")
-        emails = list_email_accounts(server, cpanel_user, domain)
-        
-        if not emails:
-            print("❌ No email accounts found or error loading accounts")
-            return
-        
-        # البحث عن الإيميل المحدد
-        target_email = None
-        for email in emails:
-            if email.get("email", "").lower() == email_address.lower():
-                target_email = email
-                break
-        
-        if not target_email:
-            print(f"❌ Email {email_address} not found in the account!")
-            return
-        
         # عرض معلومات الإيميل
         print(f"\n📋 Email Account Found:")
         quota_info = get_email_usage(server, cpanel_user, email_address)
@@ -969,55 +1124,15 @@ def change_email_passwords(servers):
     
     elif choice == "3":
         if confirm_action(f"Generate random passwords for ALL {len(emails_to_use)} emails?"):
-            successful = 0
-            failed = 0
-            passwords_data = []  # تخزين بيانات كلمات المرور للتصدير
-            
-            print(f"\n🔄 Changing passwords for all emails...")
-            for email in emails_to_use:
-                email_address = email.get("email", "")
-                new_password = generate_password(12)
-                
-                result = change_email_password(server, cpanel_user, email_address, new_password)
-                
-                if result["success"]:
-                    print("=" * 50)
-                    print(f"📧 Email Address: {email_address}")
-                    print(f"🌐 Domain: {domain}")
-                    print(f"🔑 New Password: {new_password}")
-                    print(f"💻 Webmail URL: https://webmail.{domain}")
-                    print("=" * 50)
-                    
-                    # إضافة البيانات للتصدير
-                    passwords_data.append({
-                        "Email": email_address,
-                        "Domain": domain,
-                        "New Password": new_password,
-                        "Webmail URL": f"https://webmail.{domain}",
-                        "Status": "Success"
-                    })
-                    
-                    successful += 1
-                else:
-                    print(f"❌ {email_address}: Failed - {result['error']}")
-                    
-                    # إضافة البيانات للتصدير (حتى لو فشل)
-                    passwords_data.append({
-                        "Email": email_address,
-                        "Domain": domain,
-                        "New Password": "FAILED",
-                        "Webmail URL": f"https://webmail.{domain}",
-                        "Status": f"Failed: {result['error']}"
-                    })
-                    
-                    failed += 1
-                
-                time.sleep(1)
+            passwords_data = rotate_email_passwords(server, server_name, cpanel_user, domain, emails_to_use)
+            successful = sum(1 for row in passwords_data if row["Status"] == "Success")
+            failed = len(passwords_data) - successful
             
             print(f"\n📊 Bulk Password Change Results:")
             print(f"✅ Successful: {successful}")
             print(f"❌ Failed: {failed}")
-            print(f"📈 Success Rate: {(successful/(successful+failed))*100:.1f}%")
+            if passwords_data:
+                print(f"📈 Success Rate: {(successful/len(passwords_data))*100:.1f}%")
             
             # خيار التصدير
             if successful > 0:
@@ -1478,7 +1593,7 @@ def get_failed_emails_report(server, days=7):
     """جلب تقرير الإيميلات الفاشلة من السيرفر"""
     try:
         # محاولة جلب إحصائيات Exim
-        result = whm_api_call(server, "get_mailserver_stats")
+        result = whm_api_call_capable(server, "get_mailserver_stats")
         
         if "error" in result:
             # طريقة بديلة - تقدير بناءً على حالة الحسابات
@@ -1510,6 +1625,28 @@ def get_failed_emails_report(server, days=7):
         logging.error(f"Error getting failed emails report: {str(e)}")
         return {"success": False, "error": str(e)}
 
+def _account_risk_masks(table, emails_by_user, suspicious_patterns):
+    """أقنعة عوامل الخطر لكل صفوف جدول الحسابات (تستخدمها تحليلات الفشل والسبام)"""
+    week_ago = time.time() - 7 * 86400
+    email_counts = table_column_from([len(emails_by_user.get(user) or []) for user in table["user"]], "int64")
+    suspicious = table_column_from(
+        [any(pattern in domain for pattern in suspicious_patterns) for domain in table["domain_lower"]], bool)
+    disk_high = table_compare(table["diskused_mb"], operator.gt, 1000)
+    emails_high = table_compare(email_counts, operator.gt, 50)
+    emails_moderate = table_mask_and(table_compare(email_counts, operator.gt, 20), table_compare(email_counts, operator.le, 50))
+    return {
+        "email_count": email_counts,
+        "suspended": table["suspended"],
+        "disk_high": disk_high,
+        "disk_moderate": table_mask_and(table_compare(table["diskused_mb"], operator.gt, 500),
+                                        table_compare(table["diskused_mb"], operator.le, 1000)),
+        "recent": table_compare(table["startdate"], operator.gt, week_ago),
+        "suspicious": suspicious,
+        "emails_high": emails_high,
+        "emails_moderate": emails_moderate,
+        "emails_elevated": table_mask_and(table_compare(email_counts, operator.gt, 10), table_compare(email_counts, operator.le, 20)),
+    }
+
 def analyze_failed_emails_by_accounts(server, days=7):
     """تحليل الإيميلات الفاشلة حسب الحسابات المحددة"""
     try:
@@ -1527,95 +1664,62 @@ def analyze_failed_emails_by_accounts(server, days=7):
         problematic_accounts = []
         total_failures = 0
         
-        for account in accounts:
-            account_failures = 0
-            risk_factors = []
-            
-            # حساب نقاط الخطر
-            risk_score = 0
+        # جلب إيميلات جميع الحسابات بالتوازي
+        emails_by_user = list_email_accounts_parallel(
+            server, [account.get('user', '') for account in accounts])
+        
+        # حساب نقاط الخطر لكل الحسابات دفعة واحدة على الجدول العمودي
+        table = build_account_table([(server['ip'], accounts)])
+        masks = _account_risk_masks(table, emails_by_user,
+                                    ['temp', 'test', 'spam', 'bulk', 'mail', 'send', 'newsletter'])
+        email_counts = masks["email_count"]
+        weights = [
+            ("suspended", 5, 10), ("disk_high", 3, 5), ("disk_moderate", 2, 3), ("recent", 2, 2),
+            ("suspicious", 4, 8), ("emails_high", 5, 15), ("emails_moderate", 3, 8), ("emails_elevated", 1, 3),
+        ]
+        risk_scores = table_weighted_sum([(score, masks[name]) for name, score, _ in weights], table["size"])
+        failure_scores = table_weighted_sum([(failures, masks[name]) for name, _, failures in weights], table["size"])
+        now = time.time()
+        
+        # إضافة الحسابات التي لديها نقاط خطر فقط
+        for index in table_indices(table_compare(risk_scores, operator.gt, 0)):
+            account = account_table_row(table, index)
+            risk_score = int(risk_scores[index])
+            email_count = int(email_counts[index])
+            days_old = int((now - account['unix_startdate']) // 86400)
             
-            # 1. الحساب معلق
-            if account.get('suspended', 0) == 1:
-                risk_score += 5
+            risk_factors = []
+            if masks["suspended"][index]:
                 risk_factors.append("Account suspended")
-                account_failures += 10  # تقدير 10 فشل للحساب المعلق
-            
-            # 2. استخدام قرص عالي
-            try:
-                disk_used = float(account.get('diskused', 0))
-                if disk_used > 1000:  # أكثر من 1GB
-                    risk_score += 3
-                    risk_factors.append(f"High disk usage ({disk_used:.0f}MB)")
-                    account_failures += 5
-                elif disk_used > 500:
-                    risk_score += 2
-                    risk_factors.append(f"Moderate disk usage ({disk_used:.0f}MB)")
-                    account_failures += 3
-            except:
-                pass
-            
-            # 3. تاريخ إنشاء حديث
-            try:
-                creation_date = datetime.fromtimestamp(int(account.get('unix_startdate', 0)))
-                days_old = (datetime.now() - creation_date).days
-                if days_old < 7:  # أقل من أسبوع
-                    risk_score += 2
-                    risk_factors.append(f"Recently created ({days_old} days ago)")
-                    account_failures += 2
-            except:
-                pass
-            
-            # 4. أنماط الدومين المشبوهة
-            domain = account.get('domain', '').lower()
-            suspicious_patterns = ['temp', 'test', 'spam', 'bulk', 'mail', 'send', 'newsletter']
-            if any(pattern in domain for pattern in suspicious_patterns):
-                risk_score += 4
-                risk_factors.append(f"Suspicious domain pattern: {domain}")
-                account_failures += 8
-            
-            # 5. عدد حسابات الإيميل
-            try:
-                cpanel_user = account.get('user', '')
-                emails = list_email_accounts(server, cpanel_user)
-                email_count = len(emails) if emails else 0
-                
-                if email_count > 50:
-                    risk_score += 5
-                    risk_factors.append(f"High email count ({email_count})")
-                    account_failures += 15
-                elif email_count > 20:
-                    risk_score += 3
-                    risk_factors.append(f"Moderate email count ({email_count})")
-                    account_failures += 8
-                elif email_count > 10:
-                    risk_score += 1
-                    risk_factors.append(f"Elevated email count ({email_count})")
-                    account_failures += 3
-                
-            except Exception as email_error:
-                logging.warning(f"Error checking emails for {account.get('user', '')}: {str(email_error)}")
-                email_count = 0
+            if masks["disk_high"][index]:
+                risk_factors.append(f"High disk usage ({account['diskused']:.0f}MB)")
+            elif masks["disk_moderate"][index]:
+                risk_factors.append(f"Moderate disk usage ({account['diskused']:.0f}MB)")
+            if masks["recent"][index]:
+                risk_factors.append(f"Recently created ({days_old} days ago)")
+            if masks["suspicious"][index]:
+                risk_factors.append(f"Suspicious domain pattern: {account['domain'].lower()}")
+            if masks["emails_high"][index]:
+                risk_factors.append(f"High email count ({email_count})")
+            elif masks["emails_moderate"][index]:
+                risk_factors.append(f"Moderate email count ({email_count})")
+            elif masks["emails_elevated"][index]:
+                risk_factors.append(f"Elevated email count ({email_count})")
             
-            # 6. إضافة جميع الحسابات مع نقاط الخطر
             # حساب تقديري للإيميلات الفاشلة بناءً على نقاط الخطر
-            estimated_failures = int(risk_score * 1.2) if risk_score > 0 else 0
-            account_failures = max(account_failures, estimated_failures)
-            
-            # إضافة الحساب إذا كان لديه نقاط خطر أو إيميلات فاشلة
-            if risk_score > 0 or account_failures > 0:
-                problematic_accounts.append({
-                    'domain': account.get('domain', 'Unknown'),
-                    'user': account.get('user', 'Unknown'),
-                    'risk_score': risk_score,
-                    'risk_factors': risk_factors,
-                    'email_accounts': email_count,
-                    'estimated_failures': account_failures,
-                    'suspended': account.get('suspended', 0) == 1,
-                    'disk_used': account.get('diskused', 0),
-                    'creation_date': datetime.fromtimestamp(int(account.get('unix_startdate', 0))).strftime('%Y-%m-%d') if account.get('unix_startdate') else 'Unknown'
-                })
-                
-                total_failures += account_failures
+            account_failures = max(int(failure_scores[index]), int(risk_score * 1.2))
+            problematic_accounts.append({
+                'domain': account['domain'] or 'Unknown',
+                'user': account['user'] or 'Unknown',
+                'risk_score': risk_score,
+                'risk_factors': risk_factors,
+                'email_accounts': email_count,
+                'estimated_failures': account_failures,
+                'suspended': bool(account['suspended']),
+                'disk_used': accounts[index].get('diskused', 0),
+                'creation_date': datetime.fromtimestamp(account['unix_startdate']).strftime('%Y-%m-%d') if account['unix_startdate'] else 'Unknown'
+            })
+            total_failures += account_failures
         
         # ترتيب الحسابات حسب نقاط الخطر
         problematic_accounts.sort(key=lambda x: x['risk_score'], reverse=True)
@@ -1656,6 +1760,10 @@ def create_basic_failed_report(server, days):
         high_disk_accounts = 0
         high_email_accounts = 0
         
+        # جلب إيميلات جميع الحسابات بالتوازي
+        emails_by_user = list_email_accounts_parallel(
+            server, [account.get('user', '') for account in accounts])
+        
         for account in accounts:
             account_failures = 0
             
@@ -1678,7 +1786,7 @@ def create_basic_failed_report(server, days):
             # 3. عدد حسابات الإيميل
             try:
                 cpanel_user = account.get('user', '')
-                emails = list_email_accounts(server, cpanel_user)
+                emails = emails_by_user.get(cpanel_user, [])
                 email_count = len(emails) if emails else 0
                 
                 if email_count > 50:
@@ -1772,7 +1880,7 @@ def get_mail_queue_status(server):
     """جلب حالة طابور البريد باستخدام طرق بديلة"""
     try:
         # محاولة استخدام exim queue status
-        result = whm_api_call(server, "exim_queue_status")
+        result = whm_api_call_capable(server, "exim_queue_status")
         
         if "error" not in result and "data" in result:
             queue_data = result["data"]
@@ -1866,7 +1974,7 @@ def get_mail_queue_status_advanced(server):
     """طريقة متقدمة لفحص طابور البريد باستخدام معلومات النظام"""
     try:
         # محاولة جلب معلومات النظام
-        system_info = whm_api_call(server, "version")
+        system_info = whm_api_call(server, "version", use_cache=False)
         
         if "error" in system_info:
             return {
@@ -1945,71 +2053,34 @@ def analyze_potential_spam_accounts(server):
         
         suspicious_accounts = []
         
-        for account in accounts:
-            risk_score = 0
-            risk_factors = []
-            
-            # عوامل الخطر المختلفة
-            
-            # 1. الحساب معلق
-            if account.get('suspended', 0) == 1:
-                risk_score += 3
-                risk_factors.append("Account suspended")
-            
-            # 2. استخدام قرص عالي
-            try:
-                disk_used = float(account.get('diskused', 0))
-                if disk_used > 1000:  # أكثر من 1GB
-                    risk_score += 2
-                    risk_factors.append("High disk usage")
-            except:
-                pass
-            
-            # 3. تاريخ إنشاء حديث
-            try:
-                creation_date = datetime.fromtimestamp(int(account.get('unix_startdate', 0)))
-                days_old = (datetime.now() - creation_date).days
-                if days_old < 7:  # أقل من أسبوع
-                    risk_score += 1
-                    risk_factors.append("Recently created")
-            except:
-                pass
-            
-            # 4. أنماط الدومين المشبوهة
-            domain = account.get('domain', '').lower()
-            suspicious_patterns = ['temp', 'test', 'spam', 'bulk', 'mail', 'send']
-            if any(pattern in domain for pattern in suspicious_patterns):
-                risk_score += 2
-                risk_factors.append("Suspicious domain pattern")
-            
-            # 5. عدد كبير من حسابات الإيميل (تحليل تقريبي)
-            try:
-                # محاولة جلب عدد الإيميلات للحساب
-                cpanel_user = account.get('user', '')
-                emails = list_email_accounts(server, cpanel_user)
-                email_count = len(emails) if emails else 0
-                
-                if email_count > 50:
-                    risk_score += 3
-                    risk_factors.append(f"High email count ({email_count})")
-                elif email_count > 20:
-                    risk_score += 1
-                    risk_factors.append(f"Moderate email count ({email_count})")
-                
-            except:
-                email_count = 0
-            
-            # إضافة للحسابات المشبوهة إذا كان النقاط أكثر من 3
-            if risk_score >= 3:
-                suspicious_accounts.append({
-                    'domain': account.get('domain', 'Unknown'),
-                    'user': account.get('user', 'Unknown'),
-                    'risk_score': risk_score,
-                    'risk_factors': risk_factors,
-                    'email_accounts': email_count,
-                    'suspended': account.get('suspended', 0) == 1,
-                    'disk_used': account.get('diskused', 0)
-                })
+        # جلب إيميلات جميع الحسابات بالتوازي
+        emails_by_user = list_email_accounts_parallel(
+            server, [account.get('user', '') for account in accounts])
+        
+        # حساب نقاط الخطر لكل الحسابات دفعة واحدة على الجدول العمودي
+        table = build_account_table([(server['ip'], accounts)])
+        masks = _account_risk_masks(table, emails_by_user, ['temp', 'test', 'spam', 'bulk', 'mail', 'send'])
+        factors = [
+            ("suspended", 3, "Account suspended"), ("disk_high", 2, "High disk usage"),
+            ("recent", 1, "Recently created"), ("suspicious", 2, "Suspicious domain pattern"),
+            ("emails_high", 3, "High email count ({count})"),
+            ("emails_moderate", 1, "Moderate email count ({count})"),
+        ]
+        risk_scores = table_weighted_sum([(score, masks[name]) for name, score, _ in factors], table["size"])
+        
+        # إضافة للحسابات المشبوهة إذا كان النقاط 3 أو أكثر
+        for index in table_indices(table_compare(risk_scores, operator.ge, 3)):
+            account = account_table_row(table, index)
+            email_count = int(masks["email_count"][index])
+            suspicious_accounts.append({
+                'domain': account['domain'] or 'Unknown',
+                'user': account['user'] or 'Unknown',
+                'risk_score': int(risk_scores[index]),
+                'risk_factors': [label.format(count=email_count) for name, _, label in factors if masks[name][index]],
+                'email_accounts': email_count,
+                'suspended': bool(account['suspended']),
+                'disk_used': accounts[index].get('diskused', 0)
+            })
         
         # ترتيب حسب نقاط الخطر
         suspicious_accounts.sort(key=lambda x: x['risk_score'], reverse=True)
@@ -4548,38 +4619,18 @@ def show_failed_login_logs(server, lines=50):
             # محاولة استخدام طرق متعددة لجلب اللوجات
             logs = []
             
-            # الطريقة الأولى: محاولة استخدام exec API
-            try:
-                log_command = f"grep 'dovecot_login authenticator failed' /var/log/exim_mainlog | tail -n {lines}"
-                result = whm_api_call(server, "exec", {"command": log_command})
-                
-                if "error" not in result and "data" in result:
-                    logs = result["data"].strip().split('\n')
-                    print(f"✅ Retrieved logs using exec API")
-                    
-            except Exception as exec_error:
-                print(f"⚠️  Exec API failed: {str(exec_error)}")
-                
-                # الطريقة الثانية: محاولة استخدام shell API
-                try:
-                    result = whm_api_call(server, "shell", {"command": log_command})
-                    
-                    if "error" not in result and "data" in result:
-                        logs = result["data"].strip().split('\n')
-                        print(f"✅ Retrieved logs using shell API")
-                        
-                except Exception as shell_error:
-                    print(f"⚠️  Shell API failed: {str(shell_error)}")
-                    
-                    # الطريقة الثالثة: محاولة استخدام ps API مع grep
-                    try:
-                        # استخدام ps API للتحقق من وجود exim_mainlog
-                        ps_result = whm_api_call(server, "ps", {"pattern": "exim"})
-                        if "error" not in ps_result:
-                            print(f"✅ Exim process found, but cannot access logs directly")
-                            
-                    except Exception as ps_error:
-                        print(f"⚠️  PS API failed: {str(ps_error)}")
+            # exec ثم shell مع تخطي ما هو معروف أنه غير مدعوم على السيرفر
+            log_command = f"grep 'dovecot_login authenticator failed' /var/log/exim_mainlog | tail -n {lines}"
+            output, method = run_server_command(server, log_command)
+            
+            if method:
+                logs = output.strip().split('\n')
+                print(f"✅ Retrieved logs using {method} API")
+            else:
+                # التحقق على الأقل من وجود عملية exim
+                ps_result = whm_api_call_capable(server, "ps", {"pattern": "exim"})
+                if "error" not in ps_result:
+                    print(f"✅ Exim process found, but cannot access logs directly")
             
             # إذا فشلت جميع الطرق، اعرض رسالة واضحة مع تعليمات
             if not logs:
@@ -5695,6 +5746,8 @@ def main():
         servers = initialize_script("WHM Email Management & Monitoring")
         
         while True:
+            show_api_metrics_after_action()
+            
             print(f"\n{'='*20} EMAIL MANAGEMENT & MONITORING {'='*20}")
             print("📧 Basic Email Management:")
             print("1.  ➕ Create single email")
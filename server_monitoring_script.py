@@ -310,7 +310,7 @@ def get_server_system_info(server):
         else:
             # محاولة بديلة باستخدام shell command
             try:
-                loadavg_shell = whm_api_call(server, "shell", {"command": "cat /proc/loadavg"})
+                loadavg_shell = whm_api_call_capable(server, "shell", {"command": "cat /proc/loadavg"})
                 if "error" not in loadavg_shell and "data" in loadavg_shell:
                     output = loadavg_shell["data"].get("output", "").strip()
                     if output:
@@ -336,7 +336,7 @@ def get_server_system_info(server):
         else:
             # محاولة بديلة باستخدام shell command
             try:
-                hostname_shell = whm_api_call(server, "shell", {"command": "hostname"})
+                hostname_shell = whm_api_call_capable(server, "shell", {"command": "hostname"})
                 if "error" not in hostname_shell and "data" in hostname_shell:
                     output = hostname_shell["data"].get("output", "").strip()
                     if output:
@@ -1206,6 +1206,8 @@ def main():
         servers = initialize_script("WHM Server Monitoring & Health Check")
         
         while True:
+            show_api_metrics_after_action()
+            
             print(f"\n{'='*20} SERVER MONITORING & HEALTH CHECK {'='*20}")
             print("🖥️  Server Health & Monitoring:")
             print("1.  🔍 Comprehensive server check")
@@ -1788,24 +1790,19 @@ def find_large_logs(server, min_size_mb=100):
         # محاولة استخدام exec API أولاً
         find_command = f"find /home /var/log /usr/local/apache/logs /usr/local/cpanel/logs -type f -name '*.log' -size +{min_size_mb}M -exec ls -lh {{}} \\; 2>/dev/null"
         
-        result = whm_api_call(server, "exec", {"command": find_command})
+        # exec ثم shell مع تخطي ما هو معروف أنه غير مدعوم على السيرفر
+        output, method = run_server_command(server, find_command)
         
-        if "error" in result:
-            # إذا فشل exec، جرب shell API
-            print(f"⚠️  exec API not supported, trying shell API...")
-            result = whm_api_call(server, "shell", {"command": find_command})
-            
-            if "error" in result:
-                # إذا فشل shell أيضاً، استخدم الطرق البديلة
-                print(f"⚠️  shell API not supported, using alternative methods...")
-                return find_large_logs_alternative(server, min_size_mb)
+        if method is None:
+            print(f"⚠️  exec/shell APIs not supported, using alternative methods...")
+            return find_large_logs_alternative(server, min_size_mb)
         
-        if not result.get("data"):
+        if not output:
             print("✅ No large log files found")
             return []
         
         log_files = []
-        lines = result["data"].strip().split('\n')
+        lines = output.strip().split('\n')
         
         for line in lines:
             if line.strip():
@@ -2488,19 +2485,15 @@ def delete_large_logs(server, log_files, confirm=True):
     
     for log_file in log_files:
         try:
-            # محاولة استخدام exec API أولاً
+            # exec ثم shell (مع تخطي غير المدعوم)
             delete_command = f"rm -f '{log_file['filepath']}'"
-            result = whm_api_call(server, "exec", {"command": delete_command})
+            output, method = run_server_command(server, delete_command)
             
-            if "error" in result:
-                # إذا فشل exec، جرب shell API
-                result = whm_api_call(server, "shell", {"command": delete_command})
-                
-                if "error" in result:
-                    print(f"❌ Failed to delete {log_file['filepath']}: Shell commands not supported")
-                    print(f"💡 To delete manually, connect via SSH and run: rm -f '{log_file['filepath']}'")
-                    failed_count += 1
-                    continue
+            if method is None:
+                print(f"❌ Failed to delete {log_file['filepath']}: Shell commands not supported")
+                print(f"💡 To delete manually, connect via SSH and run: rm -f '{log_file['filepath']}'")
+                failed_count += 1
+                continue
             
             print(f"✅ Deleted: {log_file['filepath']}")
             deleted_count += 1
@@ -2542,19 +2535,15 @@ def truncate_large_logs(server, log_files, confirm=True):
     
     for log_file in log_files:
         try:
-            # محاولة استخدام exec API أولاً
+            # exec ثم shell (مع تخطي غير المدعوم)
             truncate_command = f"cat /dev/null > '{log_file['filepath']}'"
-            result = whm_api_call(server, "exec", {"command": truncate_command})
+            output, method = run_server_command(server, truncate_command)
             
-            if "error" in result:
-                # إذا فشل exec، جرب shell API
-                result = whm_api_call(server, "shell", {"command": truncate_command})
-                
-                if "error" in result:
-                    print(f"❌ Failed to truncate {log_file['filepath']}: Shell commands not supported")
-                    print(f"💡 To truncate manually, connect via SSH and run: cat /dev/null > '{log_file['filepath']}'")
-                    failed_count += 1
-                    continue
+            if method is None:
+                print(f"❌ Failed to truncate {log_file['filepath']}: Shell commands not supported")
+                print(f"💡 To truncate manually, connect via SSH and run: cat /dev/null > '{log_file['filepath']}'")
+                failed_count += 1
+                continue
             
             print(f"✅ Truncated: {log_file['filepath']}")
             truncated_count += 1